@@ -22,14 +22,14 @@ Usage:
 # Maint entry point
 
 # --- Standard Library & Third Party ---
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import hashlib
 import os
 from mysql.connector import IntegrityError
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from services.ebay.browse import search_products, get_product_details
+from services.ebay.browse import search_products, get_product_details, get_products_details_batch, get_cache_stats
 from schemas.notifications import NotificationPreferences
 
 # --- Schemas (Blueprint layer) ---
@@ -82,6 +82,14 @@ from shared.utils import validate_password
 
 # --- Database & Config ---
 from shared.db import get_connection
+from services.purchase_service import (
+    purchase_item, checkout_cart, PurchaseError, ensure_purchase_idempotency_table,
+)
+from services.order_history import get_orders_page, get_order_status_counts, ORDER_HISTORY_MAX_PAGE_SIZE
+from shared.point_ledger import ORDER_REFUND_REASON_PREFIX, record_point_change, ensure_point_ledger_schema
+from services.point_expiration import ensure_point_expiration_schema
+from services.point_balances import ensure_point_balance_schema, reconcile_point_balances
+from shared.etag import etag_from_parts, etag_from_rows, is_not_modified, not_modified_response, set_etag
 
 # --- Routers (Feature Modules) ---
 from profiles.driver_profile import router as driver_profile_router
@@ -91,10 +99,25 @@ from profiles.trusted_devices import router as trusted_devices_router
 from profiles.points import router as points_router 
 from users.admin_routes import router as admin_router
 from shared.scheduler import scheduler
+from services.ebay.error_log import api_error_aggregator, ensure_api_error_log_schema
+from users.email_queue import email_queue
 from bulk_upload.bulk_upload import router as bulk_upload_router
 
 
-from services.catalog.catalog_service import get_sponsor_catalog, add_to_catalog, remove_from_catalog
+from services.catalog.catalog_service import (
+    get_sponsor_catalog, add_to_catalog, remove_from_catalog,
+    parse_catalog_fields, get_sponsor_catalog_page, SPONSOR_CATALOG_MAX_PAGE_SIZE,
+    bulk_add_to_catalog, bulk_remove_from_catalog, bulk_set_catalog_visibility, bulk_reprice_catalog,
+)
+from schemas.catalog import (
+    BulkCatalogAddRequest, BulkCatalogItemIdsRequest, BulkCatalogVisibilityRequest,
+    BulkCatalogRepriceRequest, BulkCatalogResult, SponsorCatalogPage, CheckoutRequest,
+)
+from services.catalog.catalog_cache import bump_catalog_version, driver_catalog_cache, ensure_catalog_version_table
+from services.catalog.driver_catalog import (
+    get_driver_catalog_page, search_driver_catalog, ensure_catalog_search_index,
+    DRIVER_CATALOG_DEFAULT_PAGE_SIZE, DRIVER_CATALOG_MAX_PAGE_SIZE,
+)
 
 # --- App Initialization ---
 INACTIVITY_LIMIT_MINUTES = 30 # set inactivity to 30 min
@@ -124,6 +147,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 
@@ -267,41 +291,6 @@ def ensure_account_status_schema() -> None:
         conn.close()
 
 
-def repair_sponsor_driver_point_totals() -> None:
-    """
-    Rebuild SponsorDrivers.total_points from sponsor-scoped audit history.
-    This repairs historical cross-sponsor contamination where one sponsor update
-    incorrectly touched other sponsor rows for the same driver.
-    """
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True, buffered=True)
-    try:
-        cursor.execute(
-            """
-            UPDATE SponsorDrivers sd
-            LEFT JOIN (
-                SELECT
-                    sponsor_id AS sponsor_user_id,
-                    driver_id AS driver_user_id,
-                    COALESCE(SUM(points_changed), 0) AS calculated_total
-                FROM audit_log
-                WHERE category = 'point_change'
-                  AND sponsor_id IS NOT NULL
-                  AND driver_id IS NOT NULL
-                GROUP BY sponsor_id, driver_id
-            ) totals
-              ON totals.sponsor_user_id = sd.sponsor_user_id
-             AND totals.driver_user_id = sd.driver_user_id
-            SET sd.total_points = COALESCE(totals.calculated_total, 0)
-            WHERE sd.total_points <> COALESCE(totals.calculated_total, 0)
-            """
-        )
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
-
-
 def get_last_admin_status_actor(cursor, user_id: int, role: str) -> int | None:
     """
     Find the most recent admin that changed this account's status.
@@ -600,7 +589,14 @@ async def audit_user_actions(request: Request, call_next):
 def start_scheduler():
     ensure_account_status_schema()
     ensure_sponsor_user_links_table()
-    repair_sponsor_driver_point_totals()
+    ensure_api_error_log_schema()
+    ensure_catalog_version_table()
+    ensure_catalog_search_index()
+    ensure_purchase_idempotency_table()
+    ensure_point_ledger_schema()
+    ensure_point_expiration_schema()
+    ensure_point_balance_schema()
+    reconcile_point_balances()
     if not getattr(scheduler, "running", False):
         scheduler.start()
 
@@ -609,6 +605,8 @@ def start_scheduler():
 def stop_scheduler():
     if getattr(scheduler, "running", False):
         scheduler.shutdown(wait=False)
+    api_error_aggregator.shutdown()
+    email_queue.shutdown()
 
 # --- Security Helpers ---
 def check_inactivity(current_user: dict = Depends(get_current_user)):
@@ -762,7 +760,7 @@ def update_admin_profile(body: dict, current_user: dict = Depends(get_current_us
         conn.close()
 
 @app.get("/api/driver/sponsors")
-def get_driver_sponsors(current_user: dict = Depends(get_current_user)):
+def get_driver_sponsors(http_request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "driver":
         raise HTTPException(status_code=403, detail="Driver access required")
     conn = get_connection()
@@ -790,6 +788,10 @@ def get_driver_sponsors(current_user: dict = Depends(get_current_user)):
         sponsors = cursor.fetchall()
         for s in sponsors:
             s["total_points"] = int(s["total_points"] or 0)
+        etag = etag_from_rows(sponsors)
+        if is_not_modified(http_request, etag):
+            return not_modified_response(etag)
+        set_etag(response, etag)
         return {"sponsors": sponsors}
     finally:
         cursor.close()
@@ -840,7 +842,7 @@ def update_notification_preferences(
         conn.close()
 
 @app.get("/api/driver/notifications")
-def get_driver_notifications(current_user: dict = Depends(get_current_user)):
+def get_driver_notifications(http_request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     """Story 5431/5448: Return in-app notifications for the logged-in driver."""
     if current_user["role"] != "driver":
         raise HTTPException(status_code=403, detail="Driver access required")
@@ -858,9 +860,13 @@ def get_driver_notifications(current_user: dict = Depends(get_current_user)):
             (current_user["user_id"],)
         )
         rows = cursor.fetchall()
+        etag = etag_from_rows(rows)
+        if is_not_modified(http_request, etag):
+            return not_modified_response(etag)
         for r in rows:
             if r.get("created_at"):
                 r["created_at"] = r["created_at"].isoformat()
+        set_etag(response, etag)
         return {"notifications": rows}
     finally:
         cursor.close()
@@ -1390,6 +1396,27 @@ def ebay_product(item_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"eBay product fetch failed: {str(e)}")
 
+@app.post("/api/ebay/products/batch")
+def ebay_products_batch(body: dict, current_user: dict = Depends(get_current_user)):
+    """
+    Retrieve eBay details for many items at once.
+    Body: {"item_ids": [...]}. Returns partial results plus per-item errors.
+    """
+    item_ids = body.get("item_ids")
+    if not isinstance(item_ids, list) or not item_ids:
+        raise HTTPException(status_code=400, detail="item_ids must be a non-empty list")
+    sponsor_id = current_user["user_id"] if current_user["role"] == "sponsor" else None
+    try:
+        result = get_products_details_batch(item_ids, sponsor_id=sponsor_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return {
+        "products": result["products"],
+        "errors": result["errors"],
+        "requested": len(result["products"]) + len(result["errors"]),
+        "succeeded": len(result["products"]),
+    }
+
 @app.get("/api/sponsor/catalog")
 def sponsor_catalog(current_user: dict = Depends(get_current_user)):
     """
@@ -1478,6 +1505,8 @@ def publish_catalog(current_user=Depends(get_current_user)):
             """,
             (sponsor_id,)
         )
+        if cursor.rowcount:
+            bump_catalog_version(cursor, sponsor_id)
 
         conn.commit()
 
@@ -1486,6 +1515,61 @@ def publish_catalog(current_user=Depends(get_current_user)):
         cursor.close()
         conn.close()
         
+@app.get("/api/sponsor/catalog/items", response_model=SponsorCatalogPage)
+def sponsor_catalog_items(
+    fields: str | None = None,
+    limit: int = Query(100, ge=1, le=SPONSOR_CATALOG_MAX_PAGE_SIZE),
+    after: str | None = Query(None, alias="cursor"),
+    is_active: bool | None = None,
+    current_user=Depends(get_current_user),
+):
+    """
+    Paged sponsor catalog, newest first. fields is a comma-separated projection
+    (default: item_id,title,points_cost,stock_quantity,is_active,is_published).
+    """
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    try:
+        columns = parse_catalog_fields(fields)
+        return get_sponsor_catalog_page(current_user["user_id"], columns, limit, after=after, is_active=is_active)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.post("/api/sponsor/catalog/bulk-add", response_model=BulkCatalogResult)
+def bulk_add_products_to_catalog(body: BulkCatalogAddRequest, current_user=Depends(get_current_user)):
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    products = [item.model_dump() for item in body.items]
+    counts = bulk_add_to_catalog(current_user["user_id"], products)
+    return {"requested": len(products), "affected": counts["inserted"] + counts["updated"], **counts}
+
+
+@app.post("/api/sponsor/catalog/bulk-remove", response_model=BulkCatalogResult)
+def bulk_remove_products_from_catalog(body: BulkCatalogItemIdsRequest, current_user=Depends(get_current_user)):
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    affected = bulk_remove_from_catalog(current_user["user_id"], body.item_ids)
+    return {"requested": len(body.item_ids), "affected": affected}
+
+
+@app.post("/api/sponsor/catalog/bulk-visibility", response_model=BulkCatalogResult)
+def bulk_set_catalog_items_visibility(body: BulkCatalogVisibilityRequest, current_user=Depends(get_current_user)):
+    """Enable (is_active=true) or disable (is_active=false) many items at once."""
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    affected = bulk_set_catalog_visibility(current_user["user_id"], body.item_ids, body.is_active)
+    return {"requested": len(body.item_ids), "affected": affected}
+
+
+@app.post("/api/sponsor/catalog/bulk-reprice", response_model=BulkCatalogResult)
+def bulk_reprice_catalog_items(body: BulkCatalogRepriceRequest, current_user=Depends(get_current_user)):
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    prices = {entry.item_id: entry.points_cost for entry in body.items}
+    affected = bulk_reprice_catalog(current_user["user_id"], prices)
+    return {"requested": len(body.items), "affected": affected}
+
 # ==============================================================================
 # PROTECTED ENDPOINTS
 # ==============================================================================
@@ -1599,7 +1683,24 @@ def unsave_product(item_id: str, sponsor_user_id: int | None = None, current_use
 # ==============================================================================
 
 @app.get("/api/driver/catalog")
-def get_driver_catalog(sponsor_user_id: int | None = None, current_user: dict = Depends(get_current_user)):
+def get_driver_catalog(
+    http_request: Request,
+    response: Response,
+    sponsor_user_id: int | None = None,
+    limit: int | None = Query(None, ge=1, le=DRIVER_CATALOG_MAX_PAGE_SIZE),
+    after: str | None = Query(None, alias="cursor"),
+    sort: str = "title",
+    min_points: int | None = Query(None, ge=0),
+    max_points: int | None = Query(None, ge=0),
+    in_stock: bool = False,
+    saved_only: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Published catalog for the driver's sponsor.
+    Without paging/filter parameters the full list is returned (legacy clients);
+    otherwise one keyset page: {"current_points", "items", "next_cursor", "has_more", "sort"}.
+    """
     if current_user["role"] != "driver":
         raise HTTPException(status_code=403, detail="Driver access required")
     driver_id = current_user["user_id"]
@@ -1631,20 +1732,86 @@ def get_driver_catalog(sponsor_user_id: int | None = None, current_user: dict =
         row = cursor.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="No sponsor relationship found")
-        cursor.execute(
-            """
-            SELECT item_id, title, price_value, price_currency,
-                   image_url, rating, stock_quantity, points_cost
-            FROM SponsorCatalog
-            WHERE sponsor_user_id = %s
-            AND is_published = TRUE
-            AND is_active = TRUE
-            ORDER BY title ASC
-            """,
-            (row["sponsor_user_id"],)
-        )
-        items = cursor.fetchall()
-        return {"current_points": row["total_points"] or 0, "items": items}
+        paginated = (
+            limit is not None or after is not None or sort != "title" or min_points is not None
+            or max_points is not None or in_stock or saved_only
+        )
+        if paginated:
+            try:
+                page = get_driver_catalog_page(
+                    cursor, row["sponsor_user_id"], driver_id,
+                    limit=limit or DRIVER_CATALOG_DEFAULT_PAGE_SIZE, sort=sort, after=after,
+                    min_points=min_points, max_points=max_points,
+                    in_stock=in_stock, saved_only=saved_only,
+                )
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve))
+            # saved_only pages also depend on SavedProducts, so hash the page itself
+            etag = etag_from_rows(page["items"], row["total_points"], page["next_cursor"])
+            if is_not_modified(http_request, etag):
+                return not_modified_response(etag)
+            set_etag(response, etag)
+            return {"current_points": row["total_points"] or 0, **page}
+        # Shared per-sponsor snapshot; items are already serialized, only the balance is per driver
+        snapshot = driver_catalog_cache.get(row["sponsor_user_id"], cursor)
+        current_points = int(row["total_points"] or 0)
+        etag = etag_from_parts("catalog", row["sponsor_user_id"], snapshot.version, current_points)
+        if is_not_modified(http_request, etag):
+            return not_modified_response(etag)
+        body = f'{{"current_points":{current_points},"items":{snapshot.items_json}}}'
+        catalog_response = Response(content=body, media_type="application/json")
+        set_etag(catalog_response, etag)
+        return catalog_response
+    finally:
+        cursor.close()
+        conn.close()
+
+# Declared before /api/driver/catalog/{item_id} so "search" is not taken as an item id
+@app.get("/api/driver/catalog/search")
+def search_driver_catalog_items(
+    q: str = Query(..., min_length=1, max_length=200),
+    sponsor_user_id: int | None = None,
+    limit: int = Query(DRIVER_CATALOG_DEFAULT_PAGE_SIZE, ge=1, le=DRIVER_CATALOG_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user),
+):
+    """Relevance-ranked, prefix-matching search over the driver's sponsor catalog."""
+    if current_user["role"] != "driver":
+        raise HTTPException(status_code=403, detail="Driver access required")
+    driver_id = current_user["user_id"]
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if sponsor_user_id is not None:
+            cursor.execute(
+                """
+                SELECT sponsor_user_id, total_points
+                FROM SponsorDrivers
+                WHERE driver_user_id = %s AND sponsor_user_id = %s
+                ORDER BY sponsor_driver_id DESC
+                LIMIT 1
+                """,
+                (driver_id, sponsor_user_id)
+            )
+        else:
+            cursor.execute(
+                """
+                SELECT sponsor_user_id, total_points
+                FROM SponsorDrivers
+                WHERE driver_user_id = %s
+                ORDER BY sponsor_driver_id DESC
+                LIMIT 1
+                """,
+                (driver_id,)
+            )
+        row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="No sponsor relationship found")
+        try:
+            result = search_driver_catalog(cursor, row["sponsor_user_id"], q, limit=limit, offset=offset)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        return {"current_points": row["total_points"] or 0, "query": q, **result}
     finally:
         cursor.close()
         conn.close()
@@ -1738,109 +1905,119 @@ def purchase_catalog_item(body: dict, http_request: Request, current_user: dict
         raise HTTPException(status_code=400, detail="item_id required")
     if not sponsor_user_id:
         raise HTTPException(status_code=400, detail="sponsor_user_id required")
+    try:
+        sponsor_user_id = int(sponsor_user_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="sponsor_user_id must be an integer")
     ip = get_request_ip(http_request)
     agent = http_request.headers.get("User-Agent")
     device_name, browser_name, os_name = parse_login_device_details(agent)
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute(
-            """
-            SELECT sponsor_driver_id, sponsor_user_id, total_points
-            FROM SponsorDrivers
-            WHERE driver_user_id = %s AND sponsor_user_id = %s
-            ORDER BY sponsor_driver_id DESC
-            LIMIT 1
-            """,
-            (driver_id, sponsor_user_id)
-        )
-        driver_row = cursor.fetchone()
-        if not driver_row:
-            raise HTTPException(status_code=404, detail="No sponsor relationship found")
-        sponsor_id = driver_row["sponsor_user_id"]
-        current_points = driver_row["total_points"] or 0
-        sponsor_driver_id = driver_row["sponsor_driver_id"]
-        cursor.execute(
-            "SELECT item_id, title, points_cost, stock_quantity FROM SponsorCatalog WHERE item_id = %s AND sponsor_user_id = %s",
-            (item_id, sponsor_id)
-        )
-        item = cursor.fetchone()
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found in your sponsor's catalog")
-        if current_points < item["points_cost"]:
-            raise HTTPException(status_code=400, detail=f"Insufficient points. '{item['title']}' costs {item['points_cost']} pts but your balance is {current_points} pts. You need {item['points_cost'] - current_points} more.")
-        if item["stock_quantity"] <= 0:
-            raise HTTPException(status_code=400, detail="This item is out of stock.")
-        cursor.execute(
-            "UPDATE SponsorDrivers SET total_points = total_points - %s WHERE sponsor_driver_id = %s",
-            (item["points_cost"], sponsor_driver_id)
-        )
-        cursor.execute(
-            "UPDATE SponsorCatalog SET stock_quantity = stock_quantity - 1 WHERE item_id = %s AND sponsor_user_id = %s",
-            (item_id, sponsor_id)
-        )
-        now = datetime.utcnow()
-        cursor.execute(
-            "INSERT INTO audit_log (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id) VALUES ('point_change', %s, %s, %s, %s, %s, %s)",
-            (now, sponsor_id, driver_id, -item["points_cost"], f"Redeemed: {item['title']}", driver_id)
-        )
-        # create Order record for status tracking
-        cursor.execute(
-            """
-            INSERT INTO Orders (
-                driver_user_id, sponsor_user_id, item_id, item_title, points_cost, status, created_at, updated_at,
-                purchase_ip_address, purchase_device_name, purchase_browser_name, purchase_os_name
-            )
-            VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                driver_id, sponsor_id, item_id, item["title"], item["points_cost"], now, now,
-                ip, device_name, browser_name, os_name
-            )
+        result = purchase_item(
+            driver_id, sponsor_user_id, item_id,
+            changed_by_user_id=driver_id,
+            reason_prefix="Redeemed: ",
+            idempotency_key=http_request.headers.get("Idempotency-Key"),
+            order_metadata={
+                "purchase_ip_address": ip,
+                "purchase_device_name": device_name,
+                "purchase_browser_name": browser_name,
+                "purchase_os_name": os_name,
+            },
+        )
+    except PurchaseError as pe:
+        raise HTTPException(status_code=pe.status_code, detail=pe.detail)
+
+    # A replayed request already sent its email
+    if not result["replayed"] and current_user.get("email") and orders_email_enabled_for(driver_id):
+        send_order_placed_email(
+            to_email=current_user["email"],
+            username=current_user["username"],
+            order_items=[{"title": result["title"], "points_cost": result["points_cost"]}],
+            total_points=result["points_cost"],
+            placed_at=result["placed_at"],
+            ip_address=ip,
+            device_name=device_name,
+            browser_name=browser_name,
+            os_name=os_name,
         )
-        conn.commit()
-        cursor.execute(
-            "SELECT total_points FROM SponsorDrivers WHERE sponsor_driver_id = %s",
-            (sponsor_driver_id,)
+
+    return {
+        "message": f"Successfully redeemed '{result['title']}'",
+        "order_id": result["order_id"],
+        "points_spent": result["points_cost"],
+        "new_points_balance": result["new_points_balance"],
+        "remaining_stock": result["remaining_stock"],
+    }
+
+@app.post("/api/driver/catalog/checkout")
+def checkout_driver_cart(body: CheckoutRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    """Buy the whole cart in one transaction and send one order confirmation."""
+    if current_user["role"] != "driver":
+        raise HTTPException(status_code=403, detail="Driver access required")
+    driver_id = current_user["user_id"]
+    quantities: dict[str, int] = {}
+    for line in body.items:
+        quantities[line.item_id] = quantities.get(line.item_id, 0) + line.quantity
+    ip = get_request_ip(http_request)
+    device_name, browser_name, os_name = parse_login_device_details(http_request.headers.get("User-Agent"))
+    try:
+        result = checkout_cart(
+            driver_id, body.sponsor_user_id, quantities,
+            idempotency_key=http_request.headers.get("Idempotency-Key"),
+            order_metadata={
+                "purchase_ip_address": ip,
+                "purchase_device_name": device_name,
+                "purchase_browser_name": browser_name,
+                "purchase_os_name": os_name,
+            },
+        )
+    except PurchaseError as pe:
+        raise HTTPException(status_code=pe.status_code, detail=pe.detail)
+
+    if not result["replayed"] and current_user.get("email") and orders_email_enabled_for(driver_id):
+        send_order_placed_email(
+            to_email=current_user["email"],
+            username=current_user["username"],
+            order_items=[
+                {
+                    "title": line["title"] if line["quantity"] == 1 else f"{line['title']} x{line['quantity']}",
+                    "points_cost": line["points_cost"] * line["quantity"],
+                }
+                for line in result["items"]
+            ],
+            total_points=result["total_points_spent"],
+            placed_at=result["placed_at"],
+            ip_address=ip,
+            device_name=device_name,
+            browser_name=browser_name,
+            os_name=os_name,
         )
-        new_balance_row = cursor.fetchone()
-        new_balance = new_balance_row["total_points"] if new_balance_row else 0
-        cursor.execute("SELECT stock_quantity FROM SponsorCatalog WHERE item_id = %s AND sponsor_user_id = %s", (item_id, sponsor_id))
-        new_stock = cursor.fetchone()["stock_quantity"]
 
+    return {
+        "message": f"Order placed for {sum(quantities.values())} item(s)",
+        "order_ids": result["order_ids"],
+        "items": result["items"],
+        "points_spent": result["total_points_spent"],
+        "new_points_balance": result["new_points_balance"],
+    }
+
+def orders_email_enabled_for(user_id: int) -> bool:
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
         cursor.execute(
             "SELECT orders_email_enabled FROM NotificationPreferences WHERE user_id = %s",
-            (driver_id,)
+            (user_id,)
         )
         pref_row = cursor.fetchone()
-        orders_email_enabled = True if not pref_row else bool(pref_row["orders_email_enabled"])
-
-        if orders_email_enabled and current_user.get("email"):
-            send_order_placed_email(
-                to_email=current_user["email"],
-                username=current_user["username"],
-                order_items=[{"title": item["title"], "points_cost": item["points_cost"]}],
-                total_points=item["points_cost"],
-                placed_at=now.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                ip_address=ip,
-                device_name=device_name,
-                browser_name=browser_name,
-                os_name=os_name,
-            )
-
-        return {"message": f"Successfully redeemed '{item['title']}'", "points_spent": item["points_cost"], "new_points_balance": new_balance, "remaining_stock": new_stock}
-    except HTTPException:
-        conn.rollback()
-        raise
-    except Exception:
-        conn.rollback()
-        raise
+        return True if not pref_row else bool(pref_row["orders_email_enabled"])
     finally:
         cursor.close()
         conn.close()
 
 @app.post("/api/sponsor/catalog/purchase")
-def sponsor_purchase_for_driver(body: dict, current_user: dict = Depends(get_current_user)):
+def sponsor_purchase_for_driver(body: dict, http_request: Request, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "sponsor":
         raise HTTPException(status_code=403, detail="Sponsor access required")
 
@@ -1852,77 +2029,14 @@ def sponsor_purchase_for_driver(body: dict, current_user: dict = Depends(get_cur
         raise HTTPException(status_code=400, detail="item_id required")
     if not driver_id:
         raise HTTPException(status_code=400, detail="driver_user_id required")
+    try:
+        driver_id = int(driver_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="driver_user_id must be an integer")
 
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
-
     try:
-        cursor.execute(
-            """
-            SELECT sponsor_driver_id, total_points
-            FROM SponsorDrivers
-            WHERE driver_user_id = %s AND sponsor_user_id = %s
-            ORDER BY sponsor_driver_id DESC
-            LIMIT 1
-            """,
-            (driver_id, sponsor_id)
-        )
-        driver_row = cursor.fetchone()
-        if not driver_row:
-            raise HTTPException(status_code=404, detail="Driver not found in your organization")
-
-        current_points = driver_row["total_points"] or 0
-        sponsor_driver_id = driver_row["sponsor_driver_id"]
-
-        cursor.execute(
-            """
-            SELECT item_id, title, points_cost, stock_quantity
-            FROM SponsorCatalog
-            WHERE item_id = %s AND sponsor_user_id = %s
-              AND is_active = TRUE AND is_published = TRUE
-            """,
-            (item_id, sponsor_id)
-        )
-        item = cursor.fetchone()
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not available for purchase")
-
-        if current_points < item["points_cost"]:
-            needed = item["points_cost"] - current_points
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient driver points. '{item['title']}' costs {item['points_cost']} pts; driver has {current_points} pts (needs {needed} more).",
-            )
-
-        if item["stock_quantity"] <= 0:
-            raise HTTPException(status_code=400, detail="This item is out of stock.")
-
-        cursor.execute(
-            "UPDATE SponsorDrivers SET total_points = total_points - %s WHERE sponsor_driver_id = %s",
-            (item["points_cost"], sponsor_driver_id)
-        )
-        cursor.execute(
-            "UPDATE SponsorCatalog SET stock_quantity = stock_quantity - 1 WHERE item_id = %s AND sponsor_user_id = %s",
-            (item_id, sponsor_id)
-        )
-
-        now = datetime.utcnow()
-        cursor.execute(
-            """
-            INSERT INTO audit_log (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-            VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-            """,
-            (now, sponsor_id, driver_id, -item["points_cost"], f"Sponsor redeemed for driver: {item['title']}", sponsor_id)
-        )
-        cursor.execute(
-            """
-            INSERT INTO Orders (driver_user_id, sponsor_user_id, item_id, item_title, points_cost, status, created_at, updated_at)
-            VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s)
-            """,
-            (driver_id, sponsor_id, item_id, item["title"], item["points_cost"], now, now)
-        )
-
-         # build notification before commit so it's part of the same transaction
         cursor.execute(
             """
             SELECT COALESCE(sp.company_name, u.username) AS sponsor_label
@@ -1935,64 +2049,63 @@ def sponsor_purchase_for_driver(body: dict, current_user: dict = Depends(get_cur
         sponsor_row = cursor.fetchone()
         sponsor_label = sponsor_row["sponsor_label"] if sponsor_row else "Your sponsor"
 
-        cursor.execute("SELECT username, email FROM Users WHERE user_id = %s", (driver_id,))
+        cursor.execute(
+            """
+            SELECT u.username, u.email, COALESCE(np.orders_email_enabled, TRUE) AS orders_email_enabled
+            FROM Users u
+            LEFT JOIN NotificationPreferences np ON np.user_id = u.user_id
+            WHERE u.user_id = %s
+            """,
+            (driver_id,)
+        )
         driver_user = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
 
+    def add_driver_notification(tx_cursor, result):
+        # Part of the purchase transaction: no order without its notification
         notification_msg = (
-            f"{sponsor_label} placed an order for '{item['title']}' "
-            f"using {item['points_cost']} of your points."
+            f"{sponsor_label} placed an order for '{result['title']}' "
+            f"using {result['points_cost']} of your points."
         )
-        cursor.execute(
+        tx_cursor.execute(
             "INSERT INTO Notifications (user_id, message) VALUES (%s, %s)",
             (driver_id, notification_msg)
         )
 
-        conn.commit()
-
-        cursor.execute(
-            "SELECT total_points FROM SponsorDrivers WHERE sponsor_driver_id = %s",
-            (sponsor_driver_id,)
-        )
-        new_balance = cursor.fetchone()["total_points"]
-        cursor.execute(
-            "SELECT stock_quantity FROM SponsorCatalog WHERE item_id = %s AND sponsor_user_id = %s",
-            (item_id, sponsor_id)
-        )
-        new_stock = cursor.fetchone()["stock_quantity"]
+    try:
+        result = purchase_item(
+            driver_id, sponsor_id, item_id,
+            changed_by_user_id=sponsor_id,
+            reason_prefix="Sponsor redeemed for driver: ",
+            idempotency_key=http_request.headers.get("Idempotency-Key"),
+            before_commit=add_driver_notification,
+        )
+    except PurchaseError as pe:
+        detail = "Driver not found in your organization" if pe.code == "no_relationship" else pe.detail
+        raise HTTPException(status_code=pe.status_code, detail=detail)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Failed to complete sponsor purchase")
 
-        # Send email if driver has orders notifications enabled
-        cursor.execute(
-            "SELECT orders_email_enabled FROM NotificationPreferences WHERE user_id = %s",
-            (driver_id,)
+    if (not result["replayed"] and driver_user and driver_user.get("email")
+            and bool(driver_user["orders_email_enabled"])):
+        send_sponsor_order_placed_email(
+            to_email=driver_user["email"],
+            username=driver_user["username"],
+            item_title=result["title"],
+            points_cost=result["points_cost"],
+            placed_at=result["placed_at"],
+            sponsor_name=sponsor_label,
         )
-        pref_row = cursor.fetchone()
-        orders_email_enabled = True if not pref_row else bool(pref_row["orders_email_enabled"])
-
-        if orders_email_enabled and driver_user and driver_user.get("email"):
-            send_sponsor_order_placed_email(
-                to_email=driver_user["email"],
-                username=driver_user["username"],
-                item_title=item["title"],
-                points_cost=item["points_cost"],
-                placed_at=now.strftime("%Y-%m-%d %H:%M:%S UTC"),
-                sponsor_name=sponsor_label,
-            )
 
-        return {
-            "message": f"Purchased '{item['title']}' for driver #{driver_id}",
-            "points_spent": item["points_cost"],
-            "driver_new_points_balance": new_balance,
-            "remaining_stock": new_stock,
-        }
-    except HTTPException:
-        conn.rollback()
-        raise
-    except Exception:
-        conn.rollback()
-        raise HTTPException(status_code=500, detail="Failed to complete sponsor purchase")
-    finally:
-        cursor.close()
-        conn.close()
+    return {
+        "message": f"Purchased '{result['title']}' for driver #{driver_id}",
+        "order_id": result["order_id"],
+        "points_spent": result["points_cost"],
+        "driver_new_points_balance": result["new_points_balance"],
+        "remaining_stock": result["remaining_stock"],
+    }
 
 @app.post("/api/driver/orders/{order_id}/report-issue")
 def report_order_issue(
@@ -2104,31 +2217,69 @@ def update_order_issue(
 # ORDERS: DRIVER ENDPOINTS 
 # ==============================================================================
 
+def _isoformat_order_dates(orders: list[dict]) -> None:
+    for o in orders:
+        if o.get("created_at"):
+            o["created_at"] = o["created_at"].isoformat()
+        if o.get("updated_at"):
+            o["updated_at"] = o["updated_at"].isoformat()
+
+
+@app.get("/api/driver/orders/summary")
+def get_driver_orders_summary(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """Order counts by status for the logged-in driver."""
+    if current_user["role"] != "driver":
+        raise HTTPException(status_code=403, detail="Driver access required")
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return get_order_status_counts(cursor, "driver", current_user["user_id"], date_from, date_to)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @app.get("/api/driver/orders")
-def get_driver_orders(current_user: dict = Depends(get_current_user)):
-    """Task 15492: return driver's orders so they can see/cancel pending ones."""
+def get_driver_orders(
+    http_request: Request,
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=ORDER_HISTORY_MAX_PAGE_SIZE),
+    after: str | None = Query(None, alias="cursor"),
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Task 15492: return driver's orders so they can see/cancel pending ones.
+    Pass limit (and then cursor) for newest-first pages; without it every order is returned.
+    """
     if current_user["role"] != "driver":
         raise HTTPException(status_code=403, detail="Driver access required")
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute(
-            """
-            SELECT order_id, item_id, item_title, points_cost, status,
-                   created_at, updated_at
-            FROM Orders
-            WHERE driver_user_id = %s
-            ORDER BY created_at DESC
-            """,
-            (current_user["user_id"],)
-        )
-        orders = cursor.fetchall()
-        for o in orders:
-            if o.get("created_at"):
-                o["created_at"] = o["created_at"].isoformat()
-            if o.get("updated_at"):
-                o["updated_at"] = o["updated_at"].isoformat()
-        return {"orders": orders}
+        try:
+            page = get_orders_page(
+                cursor, "driver", current_user["user_id"], limit,
+                after=after, status=status, date_from=date_from, date_to=date_to,
+            )
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        etag = etag_from_rows(page["orders"], page["next_cursor"])
+        if is_not_modified(http_request, etag):
+            return not_modified_response(etag)
+        _isoformat_order_dates(page["orders"])
+        set_etag(response, etag)
+        if limit is None:
+            return {"orders": page["orders"]}
+        return page
     finally:
         cursor.close()
         conn.close()
@@ -2150,7 +2301,7 @@ def cancel_driver_order(order_id: int, current_user: dict = Depends(get_current_
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute(
-            "SELECT order_id, driver_user_id, sponsor_user_id, item_id, item_title, points_cost, status FROM Orders WHERE order_id = %s",
+            "SELECT order_id, driver_user_id, sponsor_user_id, item_id, item_title, points_cost, status, created_at FROM Orders WHERE order_id = %s",
             (order_id,)
         )
         order = cursor.fetchone()
@@ -2174,15 +2325,18 @@ def cancel_driver_order(order_id: int, current_user: dict = Depends(get_current_
             "UPDATE SponsorCatalog SET stock_quantity = stock_quantity + 1 WHERE item_id = %s AND sponsor_user_id = %s",
             (order["item_id"], sponsor_id)
         )
+        bump_catalog_version(cursor, sponsor_id)
         # Update order status
         cursor.execute(
             "UPDATE Orders SET status = 'cancelled', updated_at = %s WHERE order_id = %s",
             (now, order_id)
         )
-        # Audit log — point refund
-        cursor.execute(
-            "INSERT INTO audit_log (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id) VALUES ('point_change', %s, %s, %s, %s, %s, %s)",
-            (now, sponsor_id, driver_id, order["points_cost"], f"Cancelled order #{order_id}: {order['item_title']}", driver_id)
+        # Audit log — point refund; the points go back into the lots the order spent,
+        # keeping their original expiration
+        record_point_change(
+            cursor, sponsor_id, driver_id, order["points_cost"],
+            f"{ORDER_REFUND_REASON_PREFIX}{order_id}: {order['item_title']}", driver_id, changed_at=now,
+            restores_order_id=order_id, earned_at=order["created_at"], earned=False,
         )
         conn.commit()
 
@@ -2204,15 +2358,41 @@ def cancel_driver_order(order_id: int, current_user: dict = Depends(get_current_
 # ORDERS: SPONSOR ENDPOINT 
 # ==============================================================================
 
+@app.get("/api/sponsor/orders/summary")
+def get_sponsor_orders_summary(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    current_user: dict = Depends(get_current_user),
+):
+    """Order counts by status across the sponsor's drivers."""
+    if current_user["role"] != "sponsor":
+        raise HTTPException(status_code=403, detail="Sponsor access required")
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return get_order_status_counts(cursor, "sponsor", current_user["user_id"], date_from, date_to)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @app.get("/api/sponsor/orders")
 def get_sponsor_orders(
     driver_name: str = "",
+    limit: int | None = Query(None, ge=1, le=ORDER_HISTORY_MAX_PAGE_SIZE),
+    after: str | None = Query(None, alias="cursor"),
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Task 15503: sponsor views all orders for their drivers.
     Optional ?driver_name= filter (matches username, first_name, or last_name).
     Only returns orders for drivers in this sponsor's org.
+    Pass limit (and then cursor) for newest-first pages; without it every match is returned.
     """
     if current_user["role"] != "sponsor":
         raise HTTPException(status_code=403, detail="Sponsor access required")
@@ -2220,39 +2400,18 @@ def get_sponsor_orders(
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        cursor.execute(
-            """
-            SELECT
-                o.order_id, o.item_id, o.item_title, o.points_cost, o.status,
-                o.created_at, o.updated_at,
-                u.username,
-                COALESCE(p.first_name, '') AS first_name,
-                COALESCE(p.last_name, '')  AS last_name
-            FROM Orders o
-            JOIN Users u   ON u.user_id = o.driver_user_id
-            LEFT JOIN Profiles p ON p.user_id = o.driver_user_id
-            WHERE o.sponsor_user_id = %s
-            ORDER BY o.created_at DESC
-            """,
-            (sponsor_id,)
-        )
-        orders = cursor.fetchall()
-        # Apply driver_name filter in Python (case-insensitive substring match)
-        if driver_name.strip():
-            q = driver_name.strip().lower()
-            orders = [
-                o for o in orders
-                if q in o["username"].lower()
-                or q in o["first_name"].lower()
-                or q in o["last_name"].lower()
-                or q in f"{o['first_name']} {o['last_name']}".lower()
-            ]
-        for o in orders:
-            if o.get("created_at"):
-                o["created_at"] = o["created_at"].isoformat()
-            if o.get("updated_at"):
-                o["updated_at"] = o["updated_at"].isoformat()
-        return {"orders": orders}
+        try:
+            page = get_orders_page(
+                cursor, "sponsor", sponsor_id, limit,
+                after=after, status=status, date_from=date_from, date_to=date_to,
+                driver_name=driver_name,
+            )
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        _isoformat_order_dates(page["orders"])
+        if limit is None:
+            return {"orders": page["orders"]}
+        return page
     finally:
         cursor.close()
         conn.close()
@@ -2279,7 +2438,8 @@ def get_sponsor_error_logs(
         cursor.execute(
             """
             SELECT error_id, occurred_at, operation, endpoint,
-                   error_message, status_code, request_id
+                   error_message, status_code, request_id,
+                   occurrence_count, first_seen_at, last_seen_at
             FROM APIErrorLog
             WHERE sponsor_id = %s OR sponsor_id IS NULL
             ORDER BY occurred_at DESC
@@ -2289,8 +2449,9 @@ def get_sponsor_error_logs(
         )
         rows = cursor.fetchall()
         for r in rows:
-            if r.get("occurred_at"):
-                r["occurred_at"] = r["occurred_at"].isoformat()
+            for field in ("occurred_at", "first_seen_at", "last_seen_at"):
+                if r.get(field):
+                    r[field] = r[field].isoformat()
         return {"errors": rows}
     finally:
         cursor.close()
@@ -2312,6 +2473,7 @@ def get_admin_error_logs(
             """
             SELECT e.error_id, e.occurred_at, e.sponsor_id, e.operation,
                    e.endpoint, e.error_message, e.status_code, e.request_id,
+                   e.occurrence_count, e.first_seen_at, e.last_seen_at,
                    sp.company_name
             FROM APIErrorLog e
             LEFT JOIN SponsorProfiles sp ON sp.user_id = e.sponsor_id
@@ -2322,13 +2484,21 @@ def get_admin_error_logs(
         )
         rows = cursor.fetchall()
         for r in rows:
-            if r.get("occurred_at"):
-                r["occurred_at"] = r["occurred_at"].isoformat()
+            for field in ("occurred_at", "first_seen_at", "last_seen_at"):
+                if r.get(field):
+                    r[field] = r[field].isoformat()
         return {"errors": rows}
     finally:
         cursor.close()
         conn.close()
 
+@app.get("/api/admin/ebay/cache-stats")
+def get_ebay_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit ratio and size of the eBay search / item-detail response caches."""
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return get_cache_stats()
+
 @app.put("/api/sponsor/catalog/{item_id}/disable")
 def disable_catalog_item(
     item_id: str,
@@ -2351,6 +2521,7 @@ def disable_catalog_item(
             """,
             (item_id, sponsor_id)
         )
+        bump_catalog_version(cursor, sponsor_id)
 
         conn.commit()
 
@@ -2381,6 +2552,7 @@ def enable_catalog_item(
             """,
             (item_id, sponsor_id)
         )
+        bump_catalog_version(cursor, sponsor_id)
 
         conn.commit()
 
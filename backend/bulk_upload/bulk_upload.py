@@ -24,6 +24,7 @@ import string
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from auth.auth import hash_password, require_role
 from shared.db import get_connection
+from shared.point_ledger import record_point_change
 from shared.services import get_user_by_username
 
 router = APIRouter()
@@ -177,13 +178,7 @@ def _create_or_update_points_with_reason(
         """,
         (points_delta, sponsor_user_id, driver_user_id),
     )
-    cursor.execute(
-        """
-        INSERT INTO audit_log (date, category, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-        VALUES (NOW(), 'point_change', %s, %s, %s, %s, %s)
-        """,
-        (sponsor_user_id, driver_user_id, points_delta, points_reason, changed_by_user_id),
-    )
+    record_point_change(cursor, sponsor_user_id, driver_user_id, points_delta, points_reason, changed_by_user_id)
 
 
 def _create_sponsor_user_linked_to_owner(
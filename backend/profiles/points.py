@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie, UploadFile, File
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Cookie, UploadFile, File, Request, Response, Query
+from datetime import date, datetime, timedelta
+import codecs
+import time
 from shared.db import get_connection
+from shared.etag import etag_from_rows, is_not_modified, not_modified_response, set_etag
+from shared.point_ledger import record_point_change, record_point_changes
+from services.point_expiration import run_point_expiration
+from services.point_balances import get_balance_as_of, reconcile_point_balances
+from services.point_upload import apply_point_upload
+from services.reward_simulator import simulate_reward_settings
+from services.leaderboard import (
+    get_leaderboard_top, get_leaderboard_position, LEADERBOARD_MAX_LIMIT, LEADERBOARD_MAX_NEIGHBORS,
+)
+from services.point_history import get_point_history_page, count_point_history, POINT_HISTORY_MAX_PAGE_SIZE
 from auth.auth import get_current_user
 from users.email_service import send_points_notification
+from users.email_queue import email_queue
 
 from schemas.points import (
     PointChangeRequest, SponsorSettings, PointChangeResponse, ExpirationPolicyRequest,
     TipCreate, Tip, TipViewCreate, AccrualStatusUpdate, BulkPointUpdateRequest,
     SponsorRewardDefaults, PointHistoryItem, PointHistoryResponse,
-    BulkPointUploadResponse, BulkPointChangeResponse,
+    BulkPointUploadResponse, BulkPointChangeResponse, RewardSimulationRequest,
 )
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 
 router = APIRouter()
@@ -32,10 +45,15 @@ def verify_sponsor(current_user: dict = Depends(get_current_user)):
 
 def parse_points_upload_file(content: str) -> tuple[list[dict], list[dict]]:
     """Parse username|points|reason rows into valid records plus line-level errors."""
+    return parse_points_upload_lines(content.splitlines())
+
+
+def parse_points_upload_lines(lines: Iterable[str]) -> tuple[list[dict], list[dict]]:
+    """Same as parse_points_upload_file, over lines produced one at a time."""
     records = []
     errors = []
 
-    for line_num, raw_line in enumerate(content.splitlines(), start=1):
+    for line_num, raw_line in enumerate(lines, start=1):
         line = raw_line.strip()
         if not line:
             continue
@@ -94,6 +112,35 @@ def parse_points_upload_file(content: str) -> tuple[list[dict], list[dict]]:
 
     return records, errors
 
+
+def _iter_upload_lines(binary_file, read_size: int = 64 * 1024) -> Iterator[str]:
+    """Decode an uploaded file as UTF-8 a block at a time; yields the same lines as str.splitlines()."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    while True:
+        block = binary_file.read(read_size)
+        pending += decoder.decode(block, final=not block)
+        if not block:
+            break
+        lines = pending.splitlines(keepends=True)
+        # The last piece may continue in the next block (including a \r before its \n)
+        pending = lines.pop() if lines else ""
+        for line in lines:
+            yield line.splitlines()[0]
+    yield from pending.splitlines()
+
+
+def _parse_as_of(as_of: Optional[str]) -> datetime:
+    """YYYY-MM-DD means the end of that day; a full ISO timestamp is used as-is; None is now."""
+    if not as_of:
+        return datetime.now()
+    try:
+        if len(as_of) == 10:
+            return datetime.strptime(as_of, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        return datetime.fromisoformat(as_of)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="as_of must be YYYY-MM-DD or an ISO 8601 timestamp")
+
 # ============= SPONSOR ENDPOINTS =============
 
 @router.get("/sponsor/settings")
@@ -245,6 +292,41 @@ async def update_sponsor_reward_defaults(
         cursor.close()
         conn.close()
 
+@router.post("/sponsor/reward-defaults/simulate")
+def simulate_sponsor_reward_defaults(
+    request: RewardSimulationRequest,
+    current_user: dict = Depends(verify_sponsor)
+):
+    """Project points liability, award cost and expirations under candidate reward settings vs the current ones"""
+    user_id = current_user["user_id"]
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+
+    try:
+        cursor.execute(
+            "SELECT dollar_per_point, earn_rate, expiration_days FROM SponsorProfiles WHERE user_id = %s",
+            (user_id,)
+        )
+        row = cursor.fetchone() or {}
+        current = {
+            "dollar_per_point": float(row['dollar_per_point']) if row.get('dollar_per_point') is not None else 0.01,
+            "earn_rate": float(row['earn_rate']) if row.get('earn_rate') is not None else 1.0,
+            "expiration_days": row.get('expiration_days'),
+        }
+        return simulate_reward_settings(
+            cursor, user_id, current,
+            {
+                "dollar_per_point": request.dollar_per_point,
+                "earn_rate": request.earn_rate,
+                "expiration_days": request.expiration_days,
+            },
+            horizon_days=request.horizon_days,
+            lookback_days=request.lookback_days,
+        )
+    finally:
+        cursor.close()
+        conn.close()
+
 @router.get("/sponsor/reward-defaults/history")
 async def get_sponsor_reward_defaults_history(
     current_user: dict = Depends(verify_sponsor)
@@ -382,23 +464,11 @@ async def add_driver_points(
             (request.points, request.driver_id, user_id)
         )
 
-        # Log the point change - try with expires_at first, fall back without it if column doesn't exist
-        try:
-            cursor.execute("""
-                INSERT INTO audit_log
-                (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id, expires_at)
-                VALUES ('point_change', %s, %s, %s, %s, %s, %s, %s)
-            """, (datetime.now(), user_id, request.driver_id, request.points, request.reason, current_user['user_id'], expires_at))
-        except Exception as e:
-            # If expires_at column doesn't exist, insert without it
-            if 'expires_at' in str(e).lower() or 'unknown column' in str(e).lower():
-                cursor.execute("""
-                    INSERT INTO audit_log
-                    (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-                    VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-                """, (datetime.now(), user_id, request.driver_id, request.points, request.reason, current_user['user_id']))
-            else:
-                raise
+        # Log the point change (the ledger drops expires_at if the column doesn't exist)
+        record_point_change(
+            cursor, user_id, request.driver_id, request.points, request.reason,
+            current_user['user_id'], expires_at=expires_at,
+        )
         
         conn.commit()
         
@@ -444,81 +514,133 @@ async def add_driver_points(
 
 
 
+def _load_points_email_recipients(cursor, driver_ids: list[int]) -> dict[int, dict]:
+    """Users + NotificationPreferences for many drivers in one query; only drivers who want points emails."""
+    if not driver_ids:
+        return {}
+    cursor.execute(
+        f"""
+        SELECT u.user_id, u.email, u.username, np.user_id AS pref_user_id, np.points_email_enabled
+        FROM Users u
+        LEFT JOIN NotificationPreferences np ON np.user_id = u.user_id
+        WHERE u.user_id IN ({', '.join(['%s'] * len(driver_ids))})
+        """,
+        tuple(driver_ids),
+    )
+    return {
+        row["user_id"]: row
+        for row in cursor.fetchall()
+        if row["pref_user_id"] is None or row["points_email_enabled"]
+    }
+
+
+def _enqueue_points_notifications(recipients: dict[int, dict], changes: list[dict]) -> None:
+    """Queue one points email per change; call after commit so rolled-back changes send nothing."""
+    for change in changes:
+        recipient = recipients.get(change["driver_id"])
+        if recipient:
+            email_queue.enqueue(
+                send_points_notification,
+                to_email=recipient["email"],
+                username=recipient["username"],
+                points_changed=change["points_changed"],
+                reason=change["reason"],
+                new_total=change["new_total"],
+            )
+
+
 @router.post("/sponsor/points/bulk-update", response_model=BulkPointChangeResponse)
-async def bulk_update_driver_points(request: BulkPointUpdateRequest, current_user: dict = Depends(verify_sponsor)):
+def bulk_update_driver_points(request: BulkPointUpdateRequest, current_user: dict = Depends(verify_sponsor)):
+    """
+    Add (or, with negative points, deduct) the same amount for many drivers.
+    Balances never go below zero. One transaction: lock the balances, one
+    UPDATE for all drivers, one ledger batch; emails are queued after commit.
+    """
     user_id = current_user['user_id']
+    points = int(round(request.points))
+    driver_ids = list(dict.fromkeys(request.driver_ids))
+    if not driver_ids:
+        return {"success": True, "message": "Updated 0 drivers.", "updated_drivers": []}
+
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
+    placeholders = ', '.join(['%s'] * len(driver_ids))
 
     try:
-        updated_drivers = []
-        for driver_id in request.driver_ids:
-            cursor.execute("SELECT total_points FROM SponsorDrivers WHERE driver_user_id = %s AND sponsor_user_id = %s", (driver_id, user_id))
-            driver = cursor.fetchone()
-            if not driver:
-                continue
+        cursor.execute(
+            f"""
+            SELECT driver_user_id, total_points
+            FROM SponsorDrivers
+            WHERE sponsor_user_id = %s AND driver_user_id IN ({placeholders})
+            ORDER BY sponsor_driver_id
+            FOR UPDATE
+            """,
+            (user_id, *driver_ids),
+        )
+        before = {row['driver_user_id']: int(row['total_points']) for row in cursor.fetchall()}
+        found = [driver_id for driver_id in driver_ids if driver_id in before]
 
+        changes = []
+        if found:
             # Prevent negative points
-            new_total = max(0, driver['total_points'] + request.points)
-
             cursor.execute(
-                "UPDATE SponsorDrivers SET total_points = %s WHERE driver_user_id = %s AND sponsor_user_id = %s",
-                (new_total, driver_id, user_id),
+                f"""
+                UPDATE SponsorDrivers
+                SET total_points = GREATEST(0, total_points + %s)
+                WHERE sponsor_user_id = %s AND driver_user_id IN ({', '.join(['%s'] * len(found))})
+                """,
+                (points, user_id, *found),
             )
+            for driver_id in found:
+                new_total = max(0, before[driver_id] + points)
+                changes.append({
+                    "sponsor_id": user_id,
+                    "driver_id": driver_id,
+                    # What actually moved, so the ledger's running balance stays exact when clamped
+                    "points_changed": new_total - before[driver_id],
+                    "reason": request.reason,
+                    "changed_by_user_id": current_user['user_id'],
+                    "new_total": new_total,
+                })
             # Log audit
-            cursor.execute("""
-                INSERT INTO audit_log (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-                VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-            """, (datetime.now(), user_id, driver_id, request.points, request.reason, current_user['user_id']))
-            updated_drivers.append({"driver_id": driver_id, "new_total": new_total})
-
-            cursor.execute(
-                "SELECT email, username FROM Users WHERE user_id = %s",
-                (driver_id,)
-            )
-            driver_user = cursor.fetchone()
-
-            if driver_user:
-                cursor.execute(
-                    "SELECT points_email_enabled FROM NotificationPreferences WHERE user_id = %s",
-                    (driver_id,)
-                )
-                pref = cursor.fetchone()
-                if not pref or pref.get("points_email_enabled", True):
-                    send_points_notification(
-                        to_email=driver_user["email"],
-                        username=driver_user["username"],
-                        points_changed=request.points,
-                        reason=request.reason,
-                        new_total=new_total
-                    )
-
-        conn.commit()        
-
-        return {
-            "success": True,
-            "message": f"Updated {len(updated_drivers)} driver{'s' if len(updated_drivers) != 1 else ''}.",
-            "updated_drivers": updated_drivers,
-        }
-
+            record_point_changes(cursor, changes)
+            recipients = _load_points_email_recipients(cursor, found)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cursor.close()
         conn.close()
 
+    if changes:
+        _enqueue_points_notifications(recipients, [{**c, "points_changed": points} for c in changes])
+    return {
+        "success": True,
+        "message": f"Updated {len(changes)} driver{'s' if len(changes) != 1 else ''}.",
+        "updated_drivers": [{"driver_id": c["driver_id"], "new_total": c["new_total"]} for c in changes],
+    }
+
 
 @router.post("/sponsor/points/upload", response_model=BulkPointUploadResponse)
-async def upload_driver_points(
+def upload_driver_points(
     file: UploadFile = File(...),
     current_user: dict = Depends(verify_sponsor),
 ):
+    """
+    Add points from a username|points|reason file. Pipeline: streamed parse,
+    then (services/point_upload.py) one username prefetch and set-based
+    apply per chunk in a single transaction, then emails queued after commit.
+    """
     user_id = current_user["user_id"]
-    raw_bytes = await file.read()
+    timings = {}
+    started = time.perf_counter()
     try:
-        content = raw_bytes.decode("utf-8")
+        records, errors = parse_points_upload_lines(_iter_upload_lines(file.file))
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="File must be UTF-8 encoded text.")
+    timings["parse"] = (time.perf_counter() - started) * 1000
 
-    records, errors = parse_points_upload_file(content)
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
@@ -533,108 +655,12 @@ async def upload_driver_points(
         except Exception:
             # If expiration_days column doesn't exist, default to None
             expiration_days = None
+        expires_at = (datetime.now() + timedelta(days=int(expiration_days))) if expiration_days else None
 
-        updated_driver_ids = []
-        total_points_added = 0
-
-        for record in records:
-            cursor.execute(
-                """
-                SELECT u.user_id, u.email, u.username, sd.total_points
-                FROM Users u
-                JOIN SponsorDrivers sd
-                  ON sd.driver_user_id = u.user_id
-                WHERE u.username = %s
-                  AND sd.sponsor_user_id = %s
-                """,
-                (record["username"], user_id)
-            )
-            driver = cursor.fetchone()
-
-            if not driver:
-                errors.append({
-                    "line_number": record["line_number"],
-                    "raw_line": record["raw_line"],
-                    "reason": f"Driver '{record['username']}' not found for your organization.",
-                })
-                continue
-
-            new_total = driver["total_points"] + record["points"]
-            expires_at = (datetime.now() + timedelta(days=int(expiration_days))) if expiration_days else None
-
-            cursor.execute(
-                """
-                UPDATE SponsorDrivers
-                SET total_points = total_points + %s
-                WHERE driver_user_id = %s AND sponsor_user_id = %s
-                """,
-                (record["points"], driver["user_id"], user_id)
-            )
-            try:
-                cursor.execute(
-                    """
-                    INSERT INTO audit_log
-                    (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id, expires_at)
-                    VALUES ('point_change', %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        datetime.now(),
-                        user_id,
-                        driver["user_id"],
-                        record["points"],
-                        record["reason"],
-                        user_id,
-                        expires_at,
-                    )
-                )
-            except Exception as e:
-                # If expires_at column doesn't exist, insert without it
-                if 'expires_at' in str(e).lower() or 'unknown column' in str(e).lower():
-                    cursor.execute(
-                        """
-                        INSERT INTO audit_log
-                        (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-                        VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            datetime.now(),
-                            user_id,
-                            driver["user_id"],
-                            record["points"],
-                            record["reason"],
-                            user_id,
-                        )
-                    )
-                else:
-                    raise
-
-            cursor.execute(
-                "SELECT points_email_enabled FROM NotificationPreferences WHERE user_id = %s",
-                (driver["user_id"],)
-            )
-            pref = cursor.fetchone()
-            if not pref or pref.get("points_email_enabled", True):
-                send_points_notification(
-                    to_email=driver["email"],
-                    username=driver["username"],
-                    points_changed=record["points"],
-                    reason=record["reason"],
-                    new_total=new_total,
-                )
-
-            updated_driver_ids.append(driver["user_id"])
-            total_points_added += record["points"]
-
+        changes, lookup_errors = apply_point_upload(cursor, user_id, records, expires_at, user_id, timings)
+        errors.extend(lookup_errors)
+        recipients = _load_points_email_recipients(cursor, sorted({c["driver_id"] for c in changes}))
         conn.commit()
-
-        return {
-            "success": True,
-            "rows_processed": len(records),
-            "rows_updated": len(updated_driver_ids),
-            "total_points_added": total_points_added,
-            "updated_drivers": updated_driver_ids,
-            "errors": errors,
-        }
     except Exception:
         conn.rollback()
         raise
@@ -642,6 +668,19 @@ async def upload_driver_points(
         cursor.close()
         conn.close()
 
+    started = time.perf_counter()
+    _enqueue_points_notifications(recipients, changes)
+    timings["notify"] = (time.perf_counter() - started) * 1000
+
+    return {
+        "success": True,
+        "rows_processed": len(records),
+        "rows_updated": len(changes),
+        "total_points_added": sum(c["points_changed"] for c in changes),
+        "updated_drivers": [c["driver_id"] for c in changes],
+        "errors": errors,
+        "timings_ms": {stage: round(ms, 2) for stage, ms in timings.items()},
+    }
 
 
 @router.post("/sponsor/points/deduct", response_model=PointChangeResponse)
@@ -687,11 +726,7 @@ async def deduct_driver_points(
         """, (request.points, request.driver_id, user_id))
 
         # Log the audit trail
-        cursor.execute("""
-            INSERT INTO audit_log
-            (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-            VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-        """, (datetime.now(), user_id, request.driver_id, -request.points, request.reason, current_user['user_id']))
+        record_point_change(cursor, user_id, request.driver_id, -request.points, request.reason, current_user['user_id'])
 
         conn.commit()
 
@@ -786,12 +821,16 @@ async def get_driver_point_history_for_sponsor(
     end_date: Optional[str] = None,
     limit: int = 100,
     offset: int = 0,
+    after: Optional[str] = Query(None, alias="cursor"),
+    include_total: bool = True,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Sponsor retrieves point history for a specific driver (#14012, #14014).
     Supports start_date/end_date filters (YYYY-MM-DD format).
     Defaults to last 90 days if no dates provided.
+    Page with the returned next_cursor; offset is still accepted for older clients.
+    Pass include_total=false on follow-up pages to skip the count.
     """
     user_id = current_user['user_id']
     role = current_user.get('role')
@@ -829,20 +868,18 @@ async def get_driver_point_history_for_sponsor(
         else:
             parsed_start = datetime.now() - timedelta(days=90)
 
+        # parsed_end is exclusive: the day after end_date, or now
         if end_date:
             try:
-                parsed_end = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+                parsed_end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
             except ValueError:
                 raise HTTPException(status_code=400, detail="end_date must be YYYY-MM-DD format")
         else:
             parsed_end = datetime.now()
 
-        if parsed_start > parsed_end:
+        if parsed_start >= parsed_end:
             raise HTTPException(status_code=400, detail="start_date must be before end_date")
 
-        # Cap limit to prevent abuse
-        limit = min(limit, 500)
-
         # Get current point total
         if role == 'admin':
             cursor.execute(
@@ -858,41 +895,114 @@ async def get_driver_point_history_for_sponsor(
             current = cursor.fetchone()
             current_points = current['total_points'] if current else 0
 
-        # Get total count for the filtered range
-        cursor.execute("""
-            SELECT COUNT(*) as cnt
-            FROM audit_log
-            WHERE category = 'point_change'
-            AND driver_id = %s
-            AND date BETWEEN %s AND %s
-        """, (driver_id, parsed_start, parsed_end))
-        total_count = cursor.fetchone()['cnt']
-
-        # Get paginated point history with expires_at
-        cursor.execute("""
-            SELECT
-                date,
-                points_changed,
-                reason,
-                changed_by_user_id,
-                expires_at
-            FROM audit_log
-            WHERE category = 'point_change'
-            AND driver_id = %s
-            AND date BETWEEN %s AND %s
-            ORDER BY date DESC
-            LIMIT %s OFFSET %s
-        """, (driver_id, parsed_start, parsed_end, limit, offset))
-
-        history = cursor.fetchall()
+        try:
+            page = get_point_history_page(
+                cursor, driver_id, limit, after=after,
+                start=parsed_start, end=parsed_end, offset=max(offset, 0),
+            )
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        total_count = count_point_history(cursor, driver_id, start=parsed_start, end=parsed_end) if include_total else None
 
         return {
             "driver_id": driver_id,
             "current_points": current_points,
-            "history": history,
+            "history": page["history"],
             "total_count": total_count,
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+        }
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/sponsor/drivers/{driver_id}/balance-as-of")
+async def get_sponsor_driver_balance_as_of(
+    driver_id: int,
+    as_of: Optional[str] = None,
+    current_user: dict = Depends(verify_sponsor)
+):
+    """A driver's balance with this sponsor at a past date/time"""
+    
+    user_id = current_user['user_id']
+    point_in_time = _parse_as_of(as_of)
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT 1 FROM SponsorDrivers WHERE driver_user_id = %s AND sponsor_user_id = %s LIMIT 1",
+            (driver_id, user_id),
+        )
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Driver not found")
+        return {
+            "driver_id": driver_id,
+            "sponsor_user_id": user_id,
+            **get_balance_as_of(cursor, user_id, driver_id, point_in_time),
         }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _parse_period_date(at: Optional[str]) -> Optional[date]:
+    """YYYY-MM-DD picking the week/month to rank; None means the current one."""
+    if not at:
+        return None
+    try:
+        return datetime.strptime(at, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="at must be YYYY-MM-DD")
+
+
+@router.get("/sponsor/leaderboard")
+async def get_sponsor_leaderboard(
+    period: str = "week",
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+    at: Optional[str] = None,
+    current_user: dict = Depends(verify_sponsor)
+):
+    """Top drivers by points earned this week / month / all time (period=week|month|all)"""
+
+    period_date = _parse_period_date(at)
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return get_leaderboard_top(cursor, current_user['user_id'], period, limit, period_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/sponsor/leaderboard/drivers/{driver_id}")
+async def get_sponsor_driver_leaderboard_position(
+    driver_id: int,
+    period: str = "week",
+    neighbors: int = Query(2, ge=0, le=LEADERBOARD_MAX_NEIGHBORS),
+    at: Optional[str] = None,
+    current_user: dict = Depends(verify_sponsor)
+):
+    """A driver's rank plus the drivers just above and below them"""
 
+    user_id = current_user['user_id']
+    period_date = _parse_period_date(at)
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT 1 FROM SponsorDrivers WHERE driver_user_id = %s AND sponsor_user_id = %s LIMIT 1",
+            (driver_id, user_id),
+        )
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Driver not found")
+        return get_leaderboard_position(cursor, user_id, driver_id, period, neighbors, period_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     finally:
         cursor.close()
         conn.close()
@@ -977,9 +1087,15 @@ async def update_accrual_status(
 @router.get("/driver/points/history")
 async def get_driver_point_history(
     current_user: dict = Depends(get_current_user), 
-    sponsor_user_id: Optional[int] = None
+    sponsor_user_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=POINT_HISTORY_MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, alias="cursor"),
 ):
-    """Get driver's complete point history"""
+    """
+    Get driver's point history. Without limit the complete history is returned;
+    with limit it is paged newest-first via next_cursor, and total_count comes
+    from the monthly rollup.
+    """
     
     if current_user.get('role') != 'driver':
         raise HTTPException(status_code=403, detail="Only drivers can access this endpoint")
@@ -1003,28 +1119,22 @@ async def get_driver_point_history(
             """, (driver_id,))
         current = cursor.fetchone()
 
-        if sponsor_user_id:
-            cursor.execute("""
-                SELECT date, points_changed, reason, changed_by_user_id, expires_at
-                FROM audit_log
-                WHERE category = 'point_change'
-                AND driver_id = %s AND sponsor_id = %s
-                ORDER BY date DESC
-            """, (driver_id, sponsor_user_id))
-        else:
-            cursor.execute("""
-                SELECT date, points_changed, reason, changed_by_user_id, expires_at
-                FROM audit_log
-                WHERE category = 'point_change'
-                AND driver_id = %s
-                ORDER BY date DESC
-            """, (driver_id,))
-        
-        history = cursor.fetchall()
+        try:
+            page = get_point_history_page(cursor, driver_id, limit, after=after, sponsor_id=sponsor_user_id or None)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
         
+        if limit is None:
+            return {
+                "current_points": current['total_points'] if current else 0,
+                "history": page["history"]
+            }
         return {
             "current_points": current['total_points'] if current else 0,
-            "history": history
+            "history": page["history"],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_more"],
+            "total_count": count_point_history(cursor, driver_id, sponsor_id=sponsor_user_id or None) if not after else None,
         }
         
     finally:
@@ -1046,22 +1156,31 @@ async def get_driver_point_history_monthly(
     cursor = conn.cursor(dictionary=True)
 
     try:
+        # Served from the rollup maintained by shared/point_ledger.py: one row per sponsor per month
         cursor.execute("""
             SELECT
-                DATE_FORMAT(date, '%Y-%m') as month,
-                DATE_FORMAT(date, '%M %Y') as month_name,
-                SUM(CASE WHEN points_changed > 0 THEN points_changed ELSE 0 END) as points_earned,
-                SUM(CASE WHEN points_changed < 0 THEN ABS(points_changed) ELSE 0 END) as points_deducted,
-                SUM(points_changed) as net_change,
-                COUNT(*) as transaction_count
-            FROM audit_log
-            WHERE category = 'point_change' 
-            AND driver_id = %s
-            GROUP BY DATE_FORMAT(date, '%Y-%m')
-            ORDER BY month DESC
+                month_start,
+                SUM(points_earned) AS points_earned,
+                SUM(points_deducted) AS points_deducted,
+                SUM(net_change) AS net_change,
+                SUM(transaction_count) AS transaction_count
+            FROM PointMonthlyRollup
+            WHERE driver_id = %s
+            GROUP BY month_start
+            ORDER BY month_start DESC
         """, (driver_id,))
-        
-        monthly_history = cursor.fetchall()
+
+        monthly_history = [
+            {
+                "month": row["month_start"].strftime("%Y-%m"),
+                "month_name": row["month_start"].strftime("%B %Y"),
+                "points_earned": int(row["points_earned"]),
+                "points_deducted": int(row["points_deducted"]),
+                "net_change": int(row["net_change"]),
+                "transaction_count": int(row["transaction_count"]),
+            }
+            for row in cursor.fetchall()
+        ]
         
         return {"monthly_history": monthly_history}
         
@@ -1070,6 +1189,66 @@ async def get_driver_point_history_monthly(
         conn.close()
 
 
+@router.get("/driver/points/balance-as-of")
+async def get_driver_balance_as_of(
+    sponsor_user_id: int,
+    as_of: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Driver's point balance with one sponsor at a past date/time"""
+    
+    if current_user.get('role') != 'driver':
+        raise HTTPException(status_code=403, detail="Only drivers can access this endpoint")
+    point_in_time = _parse_as_of(as_of)
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        return {
+            "driver_id": current_user['user_id'],
+            "sponsor_user_id": sponsor_user_id,
+            **get_balance_as_of(cursor, sponsor_user_id, current_user['user_id'], point_in_time),
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@router.get("/driver/leaderboard")
+async def get_driver_leaderboard(
+    sponsor_user_id: int,
+    period: str = "week",
+    limit: int = Query(10, ge=1, le=LEADERBOARD_MAX_LIMIT),
+    neighbors: int = Query(2, ge=0, le=LEADERBOARD_MAX_NEIGHBORS),
+    at: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """The sponsor's top drivers plus this driver's own rank and neighbors"""
+
+    if current_user.get('role') != 'driver':
+        raise HTTPException(status_code=403, detail="Only drivers can access this endpoint")
+    driver_id = current_user['user_id']
+    period_date = _parse_period_date(at)
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "SELECT 1 FROM SponsorDrivers WHERE driver_user_id = %s AND sponsor_user_id = %s LIMIT 1",
+            (driver_id, sponsor_user_id),
+        )
+        if not cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Sponsor not found")
+        top = get_leaderboard_top(cursor, sponsor_user_id, period, limit, period_date)
+        position = get_leaderboard_position(cursor, sponsor_user_id, driver_id, period, neighbors, period_date)
+        return {**position, "entries": top["entries"]}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @router.get("/driver/points/month/{year_month}")
 async def get_driver_point_month_details(
     year_month: str,  # Format: YYYY-MM
@@ -1080,6 +1259,12 @@ async def get_driver_point_month_details(
     if current_user.get('role') != 'driver':
         raise HTTPException(status_code=403, detail="Only drivers can access this endpoint")
     driver_id = current_user['user_id']
+
+    try:
+        month_begin = datetime.strptime(year_month, '%Y-%m')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="year_month must be YYYY-MM format")
+    next_month = (month_begin + timedelta(days=32)).replace(day=1)
     
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
@@ -1094,9 +1279,9 @@ async def get_driver_point_month_details(
             FROM audit_log
             WHERE category = 'point_change'
             AND driver_id = %s
-            AND DATE_FORMAT(date, '%%Y-%%m') = %s
+            AND date >= %s AND date < %s
             ORDER BY date DESC
-        """, (driver_id, year_month))
+        """, (driver_id, month_begin, next_month))
         
         transactions = cursor.fetchall()
         
@@ -1108,6 +1293,14 @@ async def get_driver_point_month_details(
 
 # ============= ADMIN ENDPOINTS =============
 
+@router.post("/admin/points/reconcile")
+async def reconcile_points_now(
+    repair: bool = True,
+    current_user: dict = Depends(verify_admin)
+):
+    """Check ledger entries written since the last reconciliation (the hourly job runs the same check)"""
+    return reconcile_point_balances(repair=repair)
+
 @router.post("/admin/point-expiration/settings")
 async def set_point_expiration_policy(
     request: ExpirationPolicyRequest,
@@ -1182,94 +1375,45 @@ async def get_all_expiration_policies(
 
 
 @router.post("/admin/point-expiration/run")
-async def run_point_expiration(
+async def run_point_expiration_now(
     current_user: dict = Depends(verify_admin)
 ):
-    """Manually trigger point expiration process"""
-    
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
+    """Manually trigger point expiration process (the same run the nightly job makes)"""
     
     try:
-        # Get all active expiration policies
-        cursor.execute("""
-            SELECT sponsor_id, expiration_months 
-            FROM point_expiration_settings 
-            WHERE auto_expire_enabled = TRUE
-        """)
-        policies = cursor.fetchall()
-        
-        expired_records = []
-        
-        for policy in policies:
-            expiration_date = datetime.now() - timedelta(days=30 * policy['expiration_months'])
-            
-            # Find drivers with points to expire
-            cursor.execute("""
-                SELECT 
-                    al.driver_id,
-                    dp.first_name,
-                    dp.last_name,
-                    sd.total_points,
-                    SUM(al.points_changed) as expired_points
-                FROM audit_log al
-                JOIN SponsorDrivers sd ON al.driver_id = sd.driver_user_id
-                LEFT JOIN Profiles dp ON sd.driver_user_id = dp.user_id
-                WHERE al.category = 'point_change'
-                AND al.sponsor_id = %s
-                AND al.date < %s
-                AND al.points_changed > 0
-                AND sd.total_points > 0
-                GROUP BY al.driver_id, dp.first_name, dp.last_name, sd.total_points
-                HAVING expired_points > 0
-            """, (policy['sponsor_id'], expiration_date))
-            
-            drivers_to_expire = cursor.fetchall()
-            
-            for driver in drivers_to_expire:
-                points_to_deduct = min(driver['expired_points'], driver['total_points'])
-                
-                if points_to_deduct > 0:
-                    # Deduct expired points
-                    cursor.execute("""
-                        UPDATE SponsorDrivers
-                        SET total_points = GREATEST(0, total_points - %s)
-                        WHERE driver_user_id = %s
-                    """, (points_to_deduct, driver['driver_id']))
-                    
-                    # Log the expiration
-                    cursor.execute("""
-                        INSERT INTO audit_log 
-                        (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-                        VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-                    """, (
-                        datetime.now(), 
-                        policy['sponsor_id'], 
-                        driver['driver_id'],
-                        -points_to_deduct,
-                        f"Automatic expiration - points older than {policy['expiration_months']} months",
-                        current_user['user_id']
-                    ))
-                    
-                    expired_records.append({
-                        "driver_id": driver['driver_id'],
-                        "driver_name": f"{driver['first_name']} {driver['last_name']}",
-                        "points_expired": points_to_deduct
-                    })
-        
-        conn.commit()
-        return {
-            "success": True, 
-            "expired_count": len(expired_records),
-            "details": expired_records
-        }
-        
+        expired = run_point_expiration(changed_by_user_id=current_user['user_id'])
     except Exception as e:
-        conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        cursor.close()
-        conn.close()
+
+    names = {}
+    if expired:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            driver_ids = sorted({e['driver_id'] for e in expired})
+            cursor.execute(
+                f"SELECT user_id, first_name, last_name FROM Profiles WHERE user_id IN ({', '.join(['%s'] * len(driver_ids))})",
+                tuple(driver_ids),
+            )
+            names = {row['user_id']: row for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+    expired_records = []
+    for e in expired:
+        profile = names.get(e['driver_id'], {})
+        expired_records.append({
+            "sponsor_id": e['sponsor_id'],
+            "driver_id": e['driver_id'],
+            "driver_name": f"{profile.get('first_name')} {profile.get('last_name')}",
+            "points_expired": e['points_expired'],
+        })
+    return {
+        "success": True, 
+        "expired_count": len(expired_records),
+        "details": expired_records
+    }
 
 
 # ------------------- TIP ENDPOINTS -------------------
@@ -1421,6 +1565,8 @@ async def delete_sponsor_tip(tip_id: int, current_user: dict = Depends(verify_sp
 # Get all active, unviewed tips (with dynamic min points threshold)
 @router.get("/tips", response_model=list[Tip])
 async def get_all_tips(
+    request: Request,
+    response: Response,
     current_user: dict = Depends(get_current_user),
     session_index: int = Cookie(default=0),
     sponsor_user_id: int | None = None,
@@ -1493,12 +1639,14 @@ async def get_all_tips(
             (driver_profile_id, sponsor_id)
         )
         tips = cursor.fetchall()
-        if not tips:
-            return []
-
         # Cycle tips based on session_index
-        tip_to_show = tips[session_index % len(tips)]
-        return [tip_to_show]
+        result = [tips[session_index % len(tips)]] if tips else []
+
+        etag = etag_from_rows(result)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        set_etag(response, etag)
+        return result
 
     finally:
         cursor.close()
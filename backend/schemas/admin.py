@@ -92,6 +92,8 @@ class CommunicationLogResponse(BaseModel):
 
 class SystemMetricsResponse(BaseModel):
     fetched_at: str
+    # seconds since the cached snapshot was collected
+    snapshot_age_seconds: float = 0.0
     # user counts
     total_users: int
     total_drivers: int
@@ -108,6 +110,8 @@ class SystemMetricsResponse(BaseModel):
     # logins in last 24 hours
     logins_last_24h: int
     failed_logins_last_24h: int
+    # eBay Browse quota usage and response cache effectiveness
+    ebay_api_usage: dict | None = None
 
 class OperationsSummaryResponse(BaseModel):
     period: str
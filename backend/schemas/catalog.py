@@ -0,0 +1,76 @@
+# schemas/catalog.py
+from pydantic import BaseModel, Field
+
+# Upper bound for one bulk catalog call; each call is a single SQL statement
+CATALOG_BULK_MAX_ITEMS = 5000
+
+
+class CatalogPrice(BaseModel):
+    value: str | float | None = None
+    currency: str | None = None
+
+
+class CatalogImage(BaseModel):
+    imageUrl: str | None = None
+
+
+# Same shape the frontend already posts to POST /api/sponsor/catalog
+class CatalogProductIn(BaseModel):
+    itemId: str = Field(min_length=1, max_length=64)
+    title: str = Field(min_length=1, max_length=255)
+    price: CatalogPrice | None = None
+    image: CatalogImage | None = None
+    rating: float | None = None
+    points_cost: int = Field(default=0, ge=0)
+
+
+class BulkCatalogAddRequest(BaseModel):
+    items: list[CatalogProductIn] = Field(min_length=1, max_length=CATALOG_BULK_MAX_ITEMS)
+
+
+class BulkCatalogItemIdsRequest(BaseModel):
+    item_ids: list[str] = Field(min_length=1, max_length=CATALOG_BULK_MAX_ITEMS)
+
+
+class BulkCatalogVisibilityRequest(BaseModel):
+    item_ids: list[str] = Field(min_length=1, max_length=CATALOG_BULK_MAX_ITEMS)
+    is_active: bool
+
+
+class CatalogRepriceEntry(BaseModel):
+    item_id: str = Field(min_length=1, max_length=64)
+    points_cost: int = Field(ge=0)
+
+
+class BulkCatalogRepriceRequest(BaseModel):
+    items: list[CatalogRepriceEntry] = Field(min_length=1, max_length=CATALOG_BULK_MAX_ITEMS)
+
+
+class BulkCatalogResult(BaseModel):
+    requested: int
+    affected: int
+    # bulk-add only: affected split into new rows and changed existing rows
+    inserted: int | None = None
+    updated: int | None = None
+
+
+class SponsorCatalogPage(BaseModel):
+    items: list[dict]
+    fields: list[str]
+    next_cursor: str | None
+    has_more: bool
+
+
+# Cart checkout
+CHECKOUT_MAX_LINES = 50
+CHECKOUT_MAX_QUANTITY = 20
+
+
+class CheckoutLine(BaseModel):
+    item_id: str = Field(min_length=1, max_length=64)
+    quantity: int = Field(default=1, ge=1, le=CHECKOUT_MAX_QUANTITY)
+
+
+class CheckoutRequest(BaseModel):
+    sponsor_user_id: int
+    items: list[CheckoutLine] = Field(min_length=1, max_length=CHECKOUT_MAX_LINES)
@@ -1,7 +1,7 @@
 # schemas/points.py
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class PointChangeRequest(BaseModel):
     driver_id: int
@@ -58,6 +58,7 @@ class BulkPointUploadResponse(BaseModel):
     total_points_added: int
     updated_drivers: List[int]
     errors: List[BulkPointUploadError]
+    timings_ms: Optional[Dict[str, float]] = None  # parse / prefetch / apply / notify
 
 class SponsorRewardDefaults(BaseModel):
     """Default reward settings for a sponsor (#13984)"""
@@ -68,10 +69,17 @@ class SponsorRewardDefaults(BaseModel):
     max_points_per_month: Optional[int] = Field(default=None, ge=1, description="Monthly point cap; null = unlimited")
     order_success_delay_minutes: int = Field(default=60, ge=1, description="Minutes before a pending order is marked successful")
 
+class RewardSimulationRequest(SponsorRewardDefaults):
+    """Candidate reward settings to project against the current ones"""
+    horizon_days: int = Field(default=30, ge=1, le=365, description="Days to project")
+    lookback_days: int = Field(default=30, ge=1, le=180, description="Days of ledger history behind the credit/spend rates")
+
 class PointHistoryItem(BaseModel):
     """single entry in a drivers point history"""
+    id: Optional[int] = None
     date: datetime
     points_changed: int
+    balance_after: Optional[int] = None  # null for entries recorded before running balances
     reason: Optional[str] = None
     changed_by_user_id: Optional[int] = None
     expires_at: Optional[datetime] = None
@@ -81,7 +89,9 @@ class PointHistoryResponse(BaseModel):
     driver_id: int
     current_points: int
     history: List[PointHistoryItem]
-    total_count: int
+    total_count: Optional[int] = None  # omitted when include_total=false
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 # Tip schemas
 
@@ -0,0 +1,122 @@
+# services/admin_metrics.py
+"""
+Cached system metrics for the admin dashboard.
+
+The counts (users by role, orders by status, points awarded and redeemed,
+logins in the last 24 hours) used to be aggregated on every dashboard load.
+They are now collected by a scheduler job every ADMIN_METRICS_REFRESH_SECONDS
+and the endpoint serves the last snapshot together with its age. Points
+awarded come from PointMonthlyRollup, which holds a few rows per driver and
+month, instead of summing all of audit_log.
+
+A process with no snapshot yet, or one older than ADMIN_METRICS_MAX_AGE_SECONDS
+(the job stopped running), collects one inline.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from shared.db import get_connection
+
+ADMIN_METRICS_REFRESH_SECONDS = float(os.getenv("ADMIN_METRICS_REFRESH_SECONDS", "60"))
+ADMIN_METRICS_MAX_AGE_SECONDS = float(os.getenv("ADMIN_METRICS_MAX_AGE_SECONDS", str(5 * ADMIN_METRICS_REFRESH_SECONDS)))
+
+
+def collect_system_metrics(cursor) -> dict:
+    # User counts by role
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*) AS total_users,
+            SUM(CASE WHEN role = 'driver'  THEN 1 ELSE 0 END) AS total_drivers,
+            SUM(CASE WHEN role = 'sponsor' THEN 1 ELSE 0 END) AS total_sponsors,
+            SUM(CASE WHEN role = 'admin'   THEN 1 ELSE 0 END) AS total_admins
+        FROM Users
+        """
+    )
+    user_row = cursor.fetchone() or {}
+
+    # All-time order totals
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*) AS total_orders,
+            SUM(CASE WHEN status = 'pending'   THEN 1 ELSE 0 END) AS pending_orders,
+            SUM(CASE WHEN status = 'shipped'   THEN 1 ELSE 0 END) AS shipped_orders,
+            SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) AS cancelled_orders,
+            COALESCE(SUM(CASE WHEN status != 'cancelled' THEN points_cost ELSE 0 END), 0) AS points_redeemed
+        FROM Orders
+        """
+    )
+    order_row = cursor.fetchone() or {}
+
+    # All-time points awarded (positive point changes), from the monthly rollup
+    cursor.execute("SELECT COALESCE(SUM(points_earned), 0) AS pts FROM PointMonthlyRollup")
+    pts_awarded = int((cursor.fetchone() or {}).get("pts") or 0)
+
+    # Login activity in the last 24 hours
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*) AS total_logins,
+            SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) AS failed_logins
+        FROM LoginAudit
+        WHERE login_time >= NOW() - INTERVAL 24 HOUR
+        """
+    )
+    login_row = cursor.fetchone() or {}
+
+    return {
+        "fetched_at": datetime.utcnow().isoformat(),
+        "total_users":   int(user_row.get("total_users")   or 0),
+        "total_drivers": int(user_row.get("total_drivers") or 0),
+        "total_sponsors":int(user_row.get("total_sponsors")or 0),
+        "total_admins":  int(user_row.get("total_admins")  or 0),
+        "total_orders":    int(order_row.get("total_orders")    or 0),
+        "pending_orders":  int(order_row.get("pending_orders")  or 0),
+        "shipped_orders":  int(order_row.get("shipped_orders")  or 0),
+        "cancelled_orders":int(order_row.get("cancelled_orders")or 0),
+        "total_points_awarded":  pts_awarded,
+        "total_points_redeemed": int(order_row.get("points_redeemed") or 0),
+        "logins_last_24h":        int(login_row.get("total_logins")  or 0),
+        "failed_logins_last_24h": int(login_row.get("failed_logins") or 0),
+    }
+
+
+class SystemMetricsCache:
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._snapshot: dict | None = None
+        self._taken_at = 0.0
+
+    def refresh(self) -> dict:
+        """Collect a fresh snapshot (scheduler job, or inline when missing/stale)."""
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            snapshot = collect_system_metrics(cursor)
+        finally:
+            cursor.close()
+            conn.close()
+        with self._lock:
+            self._snapshot = snapshot
+            self._taken_at = time.monotonic()
+        return snapshot
+
+    def get(self, force_refresh: bool = False) -> tuple[dict, float]:
+        """(snapshot, age in seconds)."""
+        with self._lock:
+            snapshot, taken_at = self._snapshot, self._taken_at
+        if force_refresh or snapshot is None or time.monotonic() - taken_at > self.max_age_seconds:
+            return self.refresh(), 0.0
+        return snapshot, time.monotonic() - taken_at
+
+
+system_metrics_cache = SystemMetricsCache(ADMIN_METRICS_MAX_AGE_SECONDS)
+
+
+def refresh_system_metrics() -> None:
+    system_metrics_cache.refresh()
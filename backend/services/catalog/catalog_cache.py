@@ -0,0 +1,193 @@
+# services/catalog/catalog_cache.py
+"""
+Per-sponsor driver catalog cache keyed by a catalog version number.
+
+Every write to a sponsor's SponsorCatalog rows (add/remove, publish,
+enable/disable, purchases and cancellations changing stock, eBay sync) calls
+bump_catalog_version() inside the same transaction. Readers keep the
+published item list for each sponsor already serialized to JSON and re-check
+the stored version at most every CATALOG_CACHE_CHECK_SECONDS, so all drivers
+of a sponsor share one query per catalog change instead of one per page view.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from shared.db import get_connection
+
+CATALOG_CACHE_CHECK_SECONDS = float(os.getenv("CATALOG_CACHE_CHECK_SECONDS", "2"))
+CATALOG_CACHE_MAX_SPONSORS = int(os.getenv("CATALOG_CACHE_MAX_SPONSORS", "500"))
+
+
+def ensure_catalog_version_table(cursor=None) -> None:
+    own_connection = cursor is None
+    if own_connection:
+        conn = get_connection()
+        cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS SponsorCatalogVersion (
+                sponsor_user_id INT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """
+        )
+        if own_connection:
+            conn.commit()
+    finally:
+        if own_connection:
+            cursor.close()
+            conn.close()
+
+
+def bump_catalog_version(cursor, sponsor_user_id: int) -> None:
+    """Call inside the mutating transaction so the new version commits with the change."""
+    bump_catalog_versions(cursor, [sponsor_user_id])
+
+
+def bump_catalog_versions(cursor, sponsor_user_ids) -> None:
+    sponsor_ids = sorted({int(s) for s in sponsor_user_ids if s is not None})
+    if not sponsor_ids:
+        return
+    placeholders = ", ".join(["(%s, 1)"] * len(sponsor_ids))
+    cursor.execute(
+        f"""
+        INSERT INTO SponsorCatalogVersion (sponsor_user_id, version)
+        VALUES {placeholders}
+        ON DUPLICATE KEY UPDATE version = version + 1
+        """,
+        tuple(sponsor_ids),
+    )
+
+
+def _json_default(value):
+    # Same encodings FastAPI's jsonable_encoder uses for these types
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> str:
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+
+class CatalogSnapshot:
+    __slots__ = ("version", "items", "items_json", "checked_at")
+
+    def __init__(self, version: int, items: list[dict], items_json: str):
+        self.version = version
+        self.items = items
+        self.items_json = items_json
+        self.checked_at = time.monotonic()
+
+
+class DriverCatalogCache:
+    def __init__(self, check_seconds: float, max_sponsors: int):
+        self.check_seconds = check_seconds
+        self.max_sponsors = max_sponsors
+        self._lock = threading.Lock()
+        self._snapshots: OrderedDict[int, CatalogSnapshot] = OrderedDict()
+        self._load_locks: dict[int, threading.Lock] = {}
+        self._hits = 0
+        self._version_checks = 0
+        self._reloads = 0
+
+    @staticmethod
+    def _read_version(cursor, sponsor_user_id: int) -> int:
+        cursor.execute(
+            "SELECT version FROM SponsorCatalogVersion WHERE sponsor_user_id = %s",
+            (sponsor_user_id,),
+        )
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        return row["version"] if isinstance(row, dict) else row[0]
+
+    @staticmethod
+    def _load_items(cursor, sponsor_user_id: int) -> list[dict]:
+        cursor.execute(
+            """
+            SELECT item_id, title, price_value, price_currency,
+                   image_url, rating, stock_quantity, points_cost
+            FROM SponsorCatalog
+            WHERE sponsor_user_id = %s
+            AND is_published = TRUE
+            AND is_active = TRUE
+            ORDER BY title ASC
+            """,
+            (sponsor_user_id,),
+        )
+        return cursor.fetchall()
+
+    def _fresh(self, sponsor_user_id: int) -> CatalogSnapshot | None:
+        with self._lock:
+            snapshot = self._snapshots.get(sponsor_user_id)
+            if snapshot and time.monotonic() - snapshot.checked_at < self.check_seconds:
+                self._hits += 1
+                self._snapshots.move_to_end(sponsor_user_id)
+                return snapshot
+        return None
+
+    def get(self, sponsor_user_id: int, cursor) -> CatalogSnapshot:
+        """Published items for the sponsor; cursor must be a dictionary cursor."""
+        snapshot = self._fresh(sponsor_user_id)
+        if snapshot:
+            return snapshot
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(sponsor_user_id, threading.Lock())
+        # One version check / reload per sponsor at a time; the rest wait and reuse it
+        with load_lock:
+            snapshot = self._fresh(sponsor_user_id)
+            if snapshot:
+                return snapshot
+
+            # Version is read before the items: a concurrent change can only make
+            # the snapshot newer than its version, which just triggers one extra reload.
+            version = self._read_version(cursor, sponsor_user_id)
+            with self._lock:
+                self._version_checks += 1
+                current = self._snapshots.get(sponsor_user_id)
+                if current and current.version == version:
+                    current.checked_at = time.monotonic()
+                    self._snapshots.move_to_end(sponsor_user_id)
+                    return current
+
+            items = self._load_items(cursor, sponsor_user_id)
+            snapshot = CatalogSnapshot(version, items, dumps(items))
+            with self._lock:
+                self._reloads += 1
+                self._snapshots[sponsor_user_id] = snapshot
+                self._snapshots.move_to_end(sponsor_user_id)
+                while len(self._snapshots) > self.max_sponsors:
+                    evicted, _ = self._snapshots.popitem(last=False)
+                    self._load_locks.pop(evicted, None)
+            return snapshot
+
+    def invalidate(self, sponsor_user_id: int | None = None) -> None:
+        with self._lock:
+            if sponsor_user_id is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(sponsor_user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sponsors_cached": len(self._snapshots),
+                "hits": self._hits,
+                "version_checks": self._version_checks,
+                "reloads": self._reloads,
+            }
+
+
+driver_catalog_cache = DriverCatalogCache(CATALOG_CACHE_CHECK_SECONDS, CATALOG_CACHE_MAX_SPONSORS)
@@ -1,6 +1,8 @@
 # services/catalog/catalog_service.py
 
 from shared.db import get_connection
+from shared.pagination import encode_cursor, decode_cursor
+from services.catalog.catalog_cache import bump_catalog_version
 
 
 def get_sponsor_catalog(sponsor_user_id: int):
@@ -86,6 +88,7 @@ def add_to_catalog(sponsor_user_id: int, product: dict):
             product.get("rating"),
             points_cost
         ))
+        bump_catalog_version(cursor, sponsor_user_id)
 
         conn.commit()
 
@@ -101,6 +104,7 @@ def remove_from_catalog(sponsor_user_id: int, item_id: str):
             "DELETE FROM SponsorCatalog WHERE item_id = %s AND sponsor_user_id = %s",
             (item_id, sponsor_user_id)
         )
+        bump_catalog_version(cursor, sponsor_user_id)
         conn.commit()
     finally:
         cursor.close()
@@ -118,7 +122,188 @@ def toggle_catalog_visibility(sponsor_user_id: int, item_id: str, is_active: boo
             """,
             (is_active, item_id, sponsor_user_id)
         )
+        bump_catalog_version(cursor, sponsor_user_id)
         conn.commit()
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# =====================================================
+# SPONSOR CATALOG MANAGEMENT (projection, paging, bulk)
+# =====================================================
+
+# Columns a sponsor may project; item_id and created_at are always returned for the cursor
+SPONSOR_CATALOG_FIELDS = (
+    "item_id", "title", "price_value", "price_currency", "image_url", "rating",
+    "points_cost", "stock_quantity", "is_active", "is_published", "is_draft", "created_at",
+)
+SPONSOR_CATALOG_DEFAULT_FIELDS = ("item_id", "title", "points_cost", "stock_quantity", "is_active", "is_published")
+SPONSOR_CATALOG_MAX_PAGE_SIZE = 500
+
+
+def parse_catalog_fields(fields: str | None) -> list[str]:
+    """Comma-separated projection -> validated column list. Raises ValueError on unknown columns."""
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(SPONSOR_CATALOG_DEFAULT_FIELDS)
+    unknown = [f for f in requested if f not in SPONSOR_CATALOG_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(["item_id", *requested, "created_at"]))
+
+
+def get_sponsor_catalog_page(sponsor_user_id: int, fields: list[str], limit: int,
+                             after: str | None = None, is_active: bool | None = None) -> dict:
+    """Newest-first keyset page over (created_at, item_id) with only the requested columns."""
+    limit = max(1, min(int(limit), SPONSOR_CATALOG_MAX_PAGE_SIZE))
+    where = ["sponsor_user_id = %s"]
+    params: list = [sponsor_user_id]
+    if is_active is not None:
+        where.append("is_active = %s")
+        params.append(is_active)
+    if after:
+        created_at, item_id = decode_cursor(after, "sponsor_catalog", size=2)
+        where.append("(created_at, item_id) < (%s, %s)")
+        params.extend([created_at, item_id])
+
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # fields are whitelisted against SPONSOR_CATALOG_FIELDS, so interpolation is safe
+        cursor.execute(
+            f"""
+            SELECT {", ".join(fields)}
+            FROM SponsorCatalog
+            WHERE {" AND ".join(where)}
+            ORDER BY created_at DESC, item_id DESC
+            LIMIT %s
+            """,
+            tuple(params) + (limit + 1,),
+        )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = encode_cursor("sponsor_catalog", [items[-1]["created_at"], items[-1]["item_id"]]) if has_more else None
+    return {"items": items, "fields": fields, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def _run_catalog_write(sponsor_user_id: int, sql: str, params: tuple) -> int:
+    """Execute one catalog statement, bump the catalog version, commit; returns rowcount."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        affected = cursor.rowcount
+        if affected:
+            bump_catalog_version(cursor, sponsor_user_id)
+        conn.commit()
+        return affected
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def bulk_add_to_catalog(sponsor_user_id: int, products: list[dict]) -> dict:
+    """
+    add_to_catalog for many products in one multi-row upsert.
+    Returns {"inserted", "updated"}: rows added, and existing rows whose
+    fields changed (re-adding an unchanged product counts as neither).
+    """
+    rows = {}
+    for product in products:
+        price = product.get("price") or {}
+        image = product.get("image") or {}
+        # Last occurrence wins, as it would with repeated single adds
+        rows[product["itemId"]] = (
+            sponsor_user_id, product["itemId"], product["title"], price.get("value"),
+            price.get("currency"), image.get("imageUrl"), product.get("rating"),
+            int(product.get("points_cost") or 0),
+        )
+    item_placeholders = ", ".join(["%s"] * len(rows))
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # Locks the existing rows (and the gaps around new ones) so the split below stays exact
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) FROM SponsorCatalog
+            WHERE sponsor_user_id = %s AND item_id IN ({item_placeholders})
+            FOR UPDATE
+            """,
+            (sponsor_user_id, *rows),
+        )
+        existing = int(cursor.fetchone()[0])
+        cursor.execute(
+            f"""
+            INSERT INTO SponsorCatalog
+            (sponsor_user_id, item_id, title, price_value, price_currency, image_url, rating, points_cost)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE
+                title = VALUES(title),
+                price_value = VALUES(price_value),
+                price_currency = VALUES(price_currency),
+                image_url = VALUES(image_url),
+                rating = VALUES(rating),
+                points_cost = VALUES(points_cost)
+            """,
+            tuple(value for row in rows.values() for value in row),
+        )
+        # MySQL counts 1 per inserted row and 2 per updated one
+        inserted = len(rows) - existing
+        updated = max(cursor.rowcount - inserted, 0) // 2
+        if inserted or updated:
+            bump_catalog_version(cursor, sponsor_user_id)
+        conn.commit()
+        return {"inserted": inserted, "updated": updated}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def bulk_remove_from_catalog(sponsor_user_id: int, item_ids: list[str]) -> int:
+    item_ids = list(dict.fromkeys(item_ids))
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    return _run_catalog_write(
+        sponsor_user_id,
+        f"DELETE FROM SponsorCatalog WHERE sponsor_user_id = %s AND item_id IN ({placeholders})",
+        (sponsor_user_id, *item_ids),
+    )
+
+
+def bulk_set_catalog_visibility(sponsor_user_id: int, item_ids: list[str], is_active: bool) -> int:
+    item_ids = list(dict.fromkeys(item_ids))
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    return _run_catalog_write(
+        sponsor_user_id,
+        f"""
+        UPDATE SponsorCatalog
+        SET is_active = %s
+        WHERE sponsor_user_id = %s AND item_id IN ({placeholders})
+        """,
+        (is_active, sponsor_user_id, *item_ids),
+    )
+
+
+def bulk_reprice_catalog(sponsor_user_id: int, prices: dict[str, int]) -> int:
+    """Set points_cost per item with one UPDATE ... JOIN over the new prices."""
+    selects = " UNION ALL ".join(["SELECT %s AS item_id, %s AS points_cost"] * len(prices))
+    params = [value for item_id, points_cost in prices.items() for value in (item_id, points_cost)]
+    return _run_catalog_write(
+        sponsor_user_id,
+        f"""
+        UPDATE SponsorCatalog sc
+        JOIN ({selects}) v ON v.item_id = sc.item_id
+        SET sc.points_cost = v.points_cost
+        WHERE sc.sponsor_user_id = %s
+        """,
+        (*params, sponsor_user_id),
+    )
@@ -0,0 +1,253 @@
+# services/catalog/catalog_sync.py
+"""
+Incremental SponsorCatalog refresh from eBay.
+
+Walks SponsorCatalog in (sponsor_user_id, item_id) order, CATALOG_SYNC_CHUNK_SIZE
+rows at a time, fetches current item data concurrently, and writes back only
+rows whose title/price/image/stock actually changed. Progress is checkpointed
+after every chunk so a large catalog is covered over several scheduler runs
+instead of one long burst against eBay and the DB. A fetch that fails for any
+reason other than 404 (quota, open breaker, 5xx) stops the run; the
+checkpoint never moves past a row that was not actually checked.
+"""
+
+import os
+from decimal import Decimal, InvalidOperation
+
+from shared.db import get_connection
+from services.catalog.catalog_cache import bump_catalog_versions
+from services.ebay.browse import get_products_details_batch
+from services.ebay.ebay_config import BATCH_MAX_ITEMS
+from services.ebay.quota import quota_governor, PRIORITY_SYNC
+
+CATALOG_SYNC_CHUNK_SIZE = int(os.getenv("CATALOG_SYNC_CHUNK_SIZE", "200"))
+CATALOG_SYNC_MAX_CHUNKS = int(os.getenv("CATALOG_SYNC_MAX_CHUNKS", "5"))
+CATALOG_SYNC_INTERVAL_MINUTES = int(os.getenv("CATALOG_SYNC_INTERVAL_MINUTES", "15"))
+
+SYNCED_FIELDS = ("title", "price_value", "price_currency", "image_url", "stock_quantity")
+
+
+def ensure_catalog_sync_checkpoint_table(cursor) -> None:
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS CatalogSyncCheckpoint (
+            checkpoint_id TINYINT PRIMARY KEY,
+            last_sponsor_user_id INT NOT NULL DEFAULT 0,
+            last_item_id VARCHAR(64) NOT NULL DEFAULT '',
+            passes_completed INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def _to_decimal(value) -> Decimal | None:
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def extract_catalog_fields(detail: dict) -> dict:
+    """Map an eBay item-detail payload onto SponsorCatalog columns."""
+    price = detail.get("price") or {}
+    image = detail.get("image") or {}
+    fields = {
+        "title": (detail.get("title") or "")[:255] or None,
+        "price_value": _to_decimal(price.get("value")),
+        "price_currency": price.get("currency"),
+        "image_url": image.get("imageUrl"),
+        "stock_quantity": None,
+    }
+    availabilities = detail.get("estimatedAvailabilities") or []
+    if availabilities:
+        first = availabilities[0]
+        quantity = first.get("estimatedAvailableQuantity")
+        if quantity is not None:
+            fields["stock_quantity"] = int(quantity)
+        elif first.get("estimatedAvailabilityStatus") == "OUT_OF_STOCK":
+            fields["stock_quantity"] = 0
+    return fields
+
+
+def diff_catalog_row(row: dict, fresh: dict) -> dict | None:
+    """Return the merged row if any synced field changed, else None. Missing eBay fields keep stored values."""
+    merged = dict(row)
+    changed = False
+    for field in SYNCED_FIELDS:
+        new_value = fresh.get(field)
+        if new_value is None:
+            continue
+        old_value = _to_decimal(row.get(field)) if field == "price_value" else row.get(field)
+        if old_value != new_value:
+            merged[field] = new_value
+            changed = True
+    return merged if changed else None
+
+
+def _apply_changes(cursor, changed_rows: list[dict]) -> None:
+    """One set-based UPDATE for the whole chunk; UPDATE (not upsert) so rows removed mid-sync stay removed."""
+    if not changed_rows:
+        return
+    selects = " UNION ALL ".join(["SELECT %s AS sponsor_user_id, %s AS item_id, %s AS title, %s AS price_value, "
+                                  "%s AS price_currency, %s AS image_url, %s AS stock_quantity"] * len(changed_rows))
+    params = []
+    for r in changed_rows:
+        params.extend([r["sponsor_user_id"], r["item_id"], r["title"], r["price_value"],
+                       r["price_currency"], r["image_url"], r["stock_quantity"]])
+    cursor.execute(
+        f"""
+        UPDATE SponsorCatalog sc
+        JOIN ({selects}) v
+          ON v.sponsor_user_id = sc.sponsor_user_id AND v.item_id = sc.item_id
+        SET sc.title = v.title,
+            sc.price_value = v.price_value,
+            sc.price_currency = v.price_currency,
+            sc.image_url = v.image_url,
+            sc.stock_quantity = v.stock_quantity
+        """,
+        tuple(params),
+    )
+    bump_catalog_versions(cursor, (r["sponsor_user_id"] for r in changed_rows))
+
+
+def _fetch_fresh_details(item_ids: list[str]) -> tuple[dict[str, dict], set[str], list[dict], list[dict]]:
+    """
+    Returns (fresh fields by item_id, item_ids eBay answered for, failures,
+    rejected). A 4xx other than 429 is eBay's final word on the item (404:
+    listing ended; 400/410: bad or legacy id), so it counts as answered and
+    the row is passed over (rejected) rather than retried forever. Quota,
+    open-breaker, 5xx and network failures are failures. Stops fetching after
+    the first sub-batch with failures: the rows after them cannot be
+    checkpointed this run anyway.
+    """
+    fresh = {}
+    answered = set()
+    failures = []
+    rejected = []
+    for start in range(0, len(item_ids), BATCH_MAX_ITEMS):
+        result = get_products_details_batch(item_ids[start:start + BATCH_MAX_ITEMS], priority=PRIORITY_SYNC)
+        for item_id, detail in result["products"].items():
+            answered.add(item_id)
+            if detail:
+                fresh[item_id] = extract_catalog_fields(detail)
+        for err in result["errors"]:
+            status = err.get("status_code")
+            if status == 404:
+                # Listing ended on eBay: keep the row but stop it being redeemable.
+                answered.add(err["item_id"])
+                fresh[err["item_id"]] = {"stock_quantity": 0}
+            elif status is not None and 400 <= status < 500 and status != 429:
+                # Bad or legacy id: no retry will fix it, so leave the row as it is
+                answered.add(err["item_id"])
+                rejected.append(err)
+            else:
+                failures.append(err)
+        if failures:
+            break
+    return fresh, answered, failures, rejected
+
+
+def sync_sponsor_catalog(chunk_size: int = CATALOG_SYNC_CHUNK_SIZE, max_chunks: int = CATALOG_SYNC_MAX_CHUNKS) -> dict:
+    """Sync up to max_chunks chunks starting from the saved checkpoint."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    summary = {"rows_checked": 0, "rows_updated": 0, "chunks": 0, "pass_completed": False}
+    try:
+        ensure_catalog_sync_checkpoint_table(cursor)
+        cursor.execute("INSERT IGNORE INTO CatalogSyncCheckpoint (checkpoint_id) VALUES (1)")
+        conn.commit()
+        cursor.execute(
+            "SELECT last_sponsor_user_id, last_item_id FROM CatalogSyncCheckpoint WHERE checkpoint_id = 1"
+        )
+        checkpoint = cursor.fetchone()
+        last_sponsor, last_item = checkpoint["last_sponsor_user_id"], checkpoint["last_item_id"]
+
+        for _ in range(max_chunks):
+            # Sync is the lowest-priority eBay consumer; leave the rest of the budget to sponsors.
+            if quota_governor.is_low(PRIORITY_SYNC):
+                summary["stopped_for_quota"] = True
+                break
+            cursor.execute(
+                """
+                SELECT sponsor_user_id, item_id, title, price_value, price_currency,
+                       image_url, stock_quantity
+                FROM SponsorCatalog
+                WHERE sponsor_user_id > %s
+                   OR (sponsor_user_id = %s AND item_id > %s)
+                ORDER BY sponsor_user_id, item_id
+                LIMIT %s
+                """,
+                (last_sponsor, last_sponsor, last_item, chunk_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                last_sponsor, last_item = 0, ""
+                summary["pass_completed"] = True
+                cursor.execute(
+                    """
+                    UPDATE CatalogSyncCheckpoint
+                    SET last_sponsor_user_id = 0, last_item_id = '', passes_completed = passes_completed + 1
+                    WHERE checkpoint_id = 1
+                    """
+                )
+                conn.commit()
+                break
+
+            # Many sponsors carry the same listing; fetch each item once per chunk.
+            fresh, answered, failures, rejected = _fetch_fresh_details(list(dict.fromkeys(r["item_id"] for r in rows)))
+            # Only the rows before the first unanswered item count as checked
+            checked = len(rows)
+            for index, row in enumerate(rows):
+                if row["item_id"] not in answered:
+                    checked = index
+                    break
+            rows = rows[:checked]
+
+            changed_rows = []
+            for row in rows:
+                if row["item_id"] in fresh:
+                    merged = diff_catalog_row(row, fresh[row["item_id"]])
+                    if merged:
+                        changed_rows.append(merged)
+
+            if rows:
+                _apply_changes(cursor, changed_rows)
+                last_sponsor, last_item = rows[-1]["sponsor_user_id"], rows[-1]["item_id"]
+                cursor.execute(
+                    """
+                    UPDATE CatalogSyncCheckpoint
+                    SET last_sponsor_user_id = %s, last_item_id = %s
+                    WHERE checkpoint_id = 1
+                    """,
+                    (last_sponsor, last_item),
+                )
+                conn.commit()
+                summary["chunks"] += 1
+                summary["rows_checked"] += len(rows)
+                summary["rows_updated"] += len(changed_rows)
+            if rejected:
+                # eBay will never return these; leave the rows as they are and move past them
+                summary.setdefault("rejected_items", []).extend(rejected)
+                print(f"Catalog sync skipped {len(rejected)} item(s) eBay rejected, first: "
+                      f"{rejected[0].get('item_id')!r} ({rejected[0].get('error')})")
+
+            if failures:
+                # Quota, open breaker, eBay 5xx or network errors: retry from here next run instead of skipping ahead
+                error_types = {f.get("error_type") for f in failures}
+                summary["stopped_for_errors"] = True
+                summary["stopped_for_quota"] = summary.get("stopped_for_quota", False) or "QuotaExceededError" in error_types
+                summary["stopped_for_breaker"] = "EbayUnavailableError" in error_types
+                summary["fetch_errors"] = failures
+                print(f"Catalog sync stopped at sponsor {last_sponsor} item {last_item!r}: "
+                      f"{len(failures)} fetch error(s), first: {failures[0].get('error')}")
+                break
+        return summary
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
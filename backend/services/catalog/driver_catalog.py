@@ -0,0 +1,199 @@
+# services/catalog/driver_catalog.py
+"""
+Keyset-paginated, filtered view of a sponsor's published catalog for drivers.
+
+Each sort walks one of the idx_sc_driver_* indexes
+(sponsor_user_id, is_published, is_active, <sort column>, item_id), so a page
+costs the same no matter how deep the driver has scrolled.
+
+Search uses the ft_sc_title FULLTEXT index, which InnoDB keeps current on
+every catalog insert/update/delete, so no separate rebuild step is needed.
+"""
+
+from shared.db import get_connection
+from shared.pagination import encode_cursor, decode_cursor
+
+DRIVER_CATALOG_DEFAULT_PAGE_SIZE = 50
+DRIVER_CATALOG_MAX_PAGE_SIZE = 100
+
+# sort name -> (column, descending, nullable)
+# Nullable columns are only used descending, where MySQL orders NULLs last.
+DRIVER_CATALOG_SORTS = {
+    "title": ("title", False, False),
+    "points_asc": ("points_cost", False, False),
+    "points_desc": ("points_cost", True, False),
+    "rating": ("rating", True, True),
+    "newest": ("created_at", True, True),
+}
+
+CATALOG_ITEM_COLUMNS = """sc.item_id, sc.title, sc.price_value, sc.price_currency,
+                   sc.image_url, sc.rating, sc.stock_quantity, sc.points_cost, sc.created_at"""
+
+
+def _seek_condition(column: str, descending: bool, nullable: bool, cursor_values: list) -> tuple[str, list]:
+    """WHERE fragment selecting rows strictly after the cursor in (column, item_id) order."""
+    last_value, last_item_id = cursor_values
+    op = "<" if descending else ">"
+    if nullable and last_value is None:
+        return f"(sc.{column} IS NULL AND sc.item_id {op} %s)", [last_item_id]
+    condition = f"((sc.{column}, sc.item_id) {op} (%s, %s)"
+    if nullable:
+        condition += f" OR sc.{column} IS NULL"
+    return condition + ")", [last_value, last_item_id]
+
+
+def get_driver_catalog_page(
+    cursor,
+    sponsor_user_id: int,
+    driver_user_id: int,
+    limit: int,
+    sort: str = "title",
+    after: str | None = None,
+    min_points: int | None = None,
+    max_points: int | None = None,
+    in_stock: bool = False,
+    saved_only: bool = False,
+) -> dict:
+    """
+    One page of published, active items. Raises ValueError for an unknown
+    sort or a cursor that does not belong to it.
+    """
+    if sort not in DRIVER_CATALOG_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(DRIVER_CATALOG_SORTS)}")
+    column, descending, nullable = DRIVER_CATALOG_SORTS[sort]
+    limit = max(1, min(int(limit), DRIVER_CATALOG_MAX_PAGE_SIZE))
+
+    where = ["sc.sponsor_user_id = %s", "sc.is_published = TRUE", "sc.is_active = TRUE"]
+    params: list = [sponsor_user_id]
+    if min_points is not None:
+        where.append("sc.points_cost >= %s")
+        params.append(min_points)
+    if max_points is not None:
+        where.append("sc.points_cost <= %s")
+        params.append(max_points)
+    if in_stock:
+        where.append("sc.stock_quantity > 0")
+    if saved_only:
+        # Probes SavedProducts' (driver_user_id, item_id) unique key per candidate row
+        where.append(
+            "EXISTS (SELECT 1 FROM SavedProducts sp WHERE sp.driver_user_id = %s AND sp.item_id = sc.item_id)"
+        )
+        params.append(driver_user_id)
+    if after:
+        condition, values = _seek_condition(column, descending, nullable, decode_cursor(after, sort, size=2))
+        where.append(condition)
+        params.extend(values)
+
+    direction = "DESC" if descending else "ASC"
+    cursor.execute(
+        f"""
+        SELECT {CATALOG_ITEM_COLUMNS}
+        FROM SponsorCatalog sc
+        WHERE {" AND ".join(where)}
+        ORDER BY sc.{column} {direction}, sc.item_id {direction}
+        LIMIT %s
+        """,
+        tuple(params) + (limit + 1,),
+    )
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, [last[column], last["item_id"]])
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more, "sort": sort}
+
+
+SEARCH_MAX_RESULTS = 1000
+# InnoDB's default innodb_ft_min_token_size; shorter words are not in the FULLTEXT index
+FULLTEXT_MIN_TOKEN = 3
+
+
+def ensure_catalog_search_index() -> None:
+    """Create the FULLTEXT index on SponsorCatalog.title if this database predates it."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT 1
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'SponsorCatalog'
+              AND INDEX_NAME = 'ft_sc_title'
+            LIMIT 1
+            """
+        )
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE SponsorCatalog ADD FULLTEXT INDEX ft_sc_title (title)")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _boolean_query(q: str) -> tuple[str, list[str]]:
+    """
+    Turn free text into a BOOLEAN MODE expression: every word required, and
+    every word a prefix match so partially typed input (typeahead) matches.
+    Boolean operators in user input are stripped rather than interpreted.
+    """
+    words = "".join(ch if ch.isalnum() else " " for ch in q.lower()).split()
+    indexed = [w for w in words if len(w) >= FULLTEXT_MIN_TOKEN]
+    return " ".join(f"+{w}*" for w in indexed), words
+
+
+def search_driver_catalog(cursor, sponsor_user_id: int, q: str, limit: int, offset: int = 0) -> dict:
+    """
+    Relevance-ranked search over one sponsor's published, active items.
+    Queries made only of words shorter than the FULLTEXT token size fall back
+    to a title prefix match on idx_sc_driver_title.
+    """
+    limit = max(1, min(int(limit), DRIVER_CATALOG_MAX_PAGE_SIZE))
+    offset = max(0, int(offset))
+    if offset + limit > SEARCH_MAX_RESULTS:
+        raise ValueError(f"Search results are limited to the first {SEARCH_MAX_RESULTS} matches")
+
+    expression, words = _boolean_query(q)
+    if not words:
+        raise ValueError("q must contain at least one letter or digit")
+
+    if expression:
+        cursor.execute(
+            f"""
+            SELECT {CATALOG_ITEM_COLUMNS},
+                   MATCH(sc.title) AGAINST (%s IN BOOLEAN MODE) AS relevance
+            FROM SponsorCatalog sc
+            WHERE sc.sponsor_user_id = %s
+              AND sc.is_published = TRUE
+              AND sc.is_active = TRUE
+              AND MATCH(sc.title) AGAINST (%s IN BOOLEAN MODE)
+            ORDER BY relevance DESC, sc.item_id ASC
+            LIMIT %s OFFSET %s
+            """,
+            (expression, sponsor_user_id, expression, limit + 1, offset),
+        )
+    else:
+        cursor.execute(
+            f"""
+            SELECT {CATALOG_ITEM_COLUMNS}, 0 AS relevance
+            FROM SponsorCatalog sc
+            WHERE sc.sponsor_user_id = %s
+              AND sc.is_published = TRUE
+              AND sc.is_active = TRUE
+              AND sc.title LIKE %s
+            ORDER BY sc.title ASC, sc.item_id ASC
+            LIMIT %s OFFSET %s
+            """,
+            (sponsor_user_id, " ".join(words) + "%", limit + 1, offset),
+        )
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    for item in items:
+        item["relevance"] = round(float(item["relevance"] or 0), 4)
+    return {
+        "items": items,
+        "has_more": has_more,
+        "next_offset": offset + limit if has_more else None,
+    }
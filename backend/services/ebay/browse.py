@@ -1,47 +1,31 @@
 # services/ebay/browse.py
-from .ebay_config import CLIENT_ID, CLIENT_SECRET, TOKEN_URL, BROWSE_SEARCH_URL, OAUTH_SCOPE
-import requests, base64, time, uuid
+from .ebay_config import (
+    CLIENT_ID, CLIENT_SECRET, TOKEN_URL, BROWSE_SEARCH_URL, BROWSE_ITEM_URL, OAUTH_SCOPE,
+    SEARCH_CACHE_TTL_SECONDS, ITEM_CACHE_TTL_SECONDS, CACHE_STALE_SECONDS, CACHE_MAX_ENTRIES,
+    BATCH_MAX_ITEMS, BATCH_MAX_WORKERS,
+)
+from .client import ebay_client
+from .error_log import api_error_aggregator
+from .quota import quota_governor, QuotaExceededError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from .response_cache import ResponseCache
+from .token_manager import EbayTokenManager
+from concurrent.futures import ThreadPoolExecutor
+import requests, base64
 from urllib.parse import quote
-from shared.db import get_connection
 
 
-# Cache token and expiry time
-_token_cache = {
-    "access_token": None,
-    "expires_at": 0
-}
-
 def _log_api_error(operation: str, endpoint: str, error_message: str,
                    status_code: int | None = None, sponsor_id: int | None = None):
-    """Task 15515: persist eBay API failure to APIErrorLog. Non-fatal."""
+    """Task 15515: record eBay API failure for APIErrorLog (aggregated, written asynchronously). Non-fatal."""
     try:
-        request_id = str(uuid.uuid4())[:16]
-        conn = get_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                """
-                INSERT INTO APIErrorLog
-                    (sponsor_id, operation, endpoint, error_message, status_code, request_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (sponsor_id, operation, endpoint, str(error_message)[:2000], status_code, request_id)
-            )
-            conn.commit()
-        finally:
-            cursor.close()
-            conn.close()
+        api_error_aggregator.record(operation, endpoint, error_message, status_code=status_code, sponsor_id=sponsor_id)
     except Exception:
         pass  # never let logging crash the caller
 
-def get_ebay_token():
-    """Get eBay OAuth token, use cached if valid"""
-    global _token_cache
-    if _token_cache["access_token"] and time.time() < _token_cache["expires_at"]:
-        return _token_cache["access_token"]
-
+def _request_ebay_token():
+    """POST client credentials to TOKEN_URL. Returns (access_token, expires_in)."""
     auth = base64.b64encode(f"{CLIENT_ID}:{CLIENT_SECRET}".encode()).decode()
-    response = requests.post(
+    response = ebay_client.post(
         TOKEN_URL,
         headers={
             "Authorization": f"Basic {auth}",
@@ -49,21 +33,44 @@ def get_ebay_token():
         },
         data=f"grant_type=client_credentials&scope={OAUTH_SCOPE}"
     )
+    response.raise_for_status()
     data = response.json()
-    access_token = data.get("access_token")
-    expires_in = data.get("expires_in", 7200)  # default 2 hours
+    return data.get("access_token"), data.get("expires_in", 7200)  # default 2 hours
+
+
+# One token per process, refreshed single-flight and renewed ahead of expiry
+token_manager = EbayTokenManager(_request_ebay_token)
+
+
+def get_ebay_token():
+    """Get eBay OAuth token, use cached if valid"""
+    return token_manager.get_token()
+
 
-    _token_cache["access_token"] = access_token
-    _token_cache["expires_at"] = time.time() + int(expires_in) - 60  # buffer 1 min
-    return access_token
+def _authorized_get(url, priority=PRIORITY_INTERACTIVE):
+    """GET with the app token; on 401 drop the token and retry once with a fresh one."""
+    token = get_ebay_token()
+    response = ebay_client.get(url, priority=priority, headers={"Authorization": f"Bearer {token}"})
+    if response.status_code == 401:
+        token_manager.invalidate(token)
+        response = ebay_client.get(url, priority=priority, headers={"Authorization": f"Bearer {get_ebay_token()}"})
+    return response
 
-def search_products(query, limit=10, offset=0, sponsor_id=None):
-    """Search eBay products by keyword. Logs failures to APIErrorLog."""
+search_cache = ResponseCache("ebay_search", SEARCH_CACHE_TTL_SECONDS, CACHE_STALE_SECONDS, CACHE_MAX_ENTRIES)
+item_cache = ResponseCache("ebay_item", ITEM_CACHE_TTL_SECONDS, CACHE_STALE_SECONDS, CACHE_MAX_ENTRIES)
+
+
+def _search_cache_key(query, limit, offset):
+    """Queries differing only by case/whitespace share one entry."""
+    return (" ".join(str(query).lower().split()), int(limit), max(0, int(offset)))
+
+
+def _fetch_search(query, limit, offset, sponsor_id=None, priority=PRIORITY_INTERACTIVE):
+    """Call eBay search. Logs and re-raises failures so they are never cached."""
     encoded_query = quote(query)
     url = f"{BROWSE_SEARCH_URL}?q={encoded_query}&limit={limit}&offset={max(0, int(offset))}"
     try:
-        token = get_ebay_token()
-        response = requests.get(url, headers={"Authorization": f"Bearer {token}"})
+        response = _authorized_get(url, priority=priority)
         response.raise_for_status()
         data = response.json()
         return {
@@ -73,28 +80,117 @@ def search_products(query, limit=10, offset=0, sponsor_id=None):
     except requests.HTTPError as e:
         status_code = e.response.status_code if e.response is not None else None
         _log_api_error("ebay_search", url, str(e), status_code=status_code, sponsor_id=sponsor_id)
-        print(f"Error searching eBay: {e}")
-        return {"items": [], "total": 0}
+        raise
+    except QuotaExceededError:
+        raise
     except Exception as e:
         _log_api_error("ebay_search", url, str(e), sponsor_id=sponsor_id)
-        print(f"Error searching eBay: {e}")
-        return {"items": [], "total": 0}
+        raise
 
 
-def get_product_details(item_id, sponsor_id=None):
-    """Retrieve detailed info for a single eBay item. Logs failures to APIErrorLog."""
-    url = f"https://api.ebay.com/buy/browse/v1/item/{item_id}"
+def _fetch_product_details(item_id, sponsor_id=None, priority=PRIORITY_INTERACTIVE):
+    """Call eBay item detail. Logs and re-raises failures so they are never cached."""
+    url = BROWSE_ITEM_URL.format(itemId=quote(str(item_id), safe="|"))
     try:
-        token = get_ebay_token()
-        response = requests.get(url, headers={"Authorization": f"Bearer {token}"})
+        response = _authorized_get(url, priority=priority)
         response.raise_for_status()
         return response.json()
     except requests.HTTPError as e:
         status_code = e.response.status_code if e.response is not None else None
         _log_api_error("ebay_product_detail", url, str(e), status_code=status_code, sponsor_id=sponsor_id)
-        print(f"Error getting eBay item details: {e}")
-        return None
+        raise
+    except QuotaExceededError:
+        raise
     except Exception as e:
         _log_api_error("ebay_product_detail", url, str(e), sponsor_id=sponsor_id)
+        raise
+
+
+def _cached_or_load(cache, key, loader, priority):
+    """
+    Normal path: cache.get_or_load. When the eBay budget is low (or the lane is
+    rejected outright) fall back to whatever the cache still holds, however old.
+    """
+    if quota_governor.is_low(priority):
+        found, value = cache.peek(key, allow_expired=True)
+        if found:
+            return value
+    try:
+        return cache.get_or_load(key, loader)
+    except QuotaExceededError:
+        found, value = cache.peek(key, allow_expired=True)
+        if found:
+            return value
+        raise
+
+
+def search_products(query, limit=10, offset=0, sponsor_id=None, priority=PRIORITY_INTERACTIVE):
+    """Search eBay products by keyword (cached). Logs failures to APIErrorLog."""
+    key = _search_cache_key(query, limit, offset)
+    try:
+        return _cached_or_load(
+            search_cache, key, lambda: _fetch_search(query, limit, offset, sponsor_id, priority), priority
+        )
+    except Exception as e:
+        print(f"Error searching eBay: {e}")
+        return {"items": [], "total": 0}
+
+
+def get_product_details(item_id, sponsor_id=None, priority=PRIORITY_INTERACTIVE):
+    """Retrieve detailed info for a single eBay item (cached). Logs failures to APIErrorLog."""
+    try:
+        return _cached_or_load(
+            item_cache, str(item_id), lambda: _fetch_product_details(item_id, sponsor_id, priority), priority
+        )
+    except Exception as e:
         print(f"Error getting eBay item details: {e}")
         return None
+
+
+# Shared across requests so the total number of concurrent detail calls stays bounded
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="ebay-batch")
+
+
+def _describe_fetch_error(e: Exception) -> dict:
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return {"error": f"eBay returned HTTP {e.response.status_code}", "status_code": e.response.status_code,
+                "error_type": e.__class__.__name__}
+    return {"error": str(e) or e.__class__.__name__, "status_code": None, "error_type": e.__class__.__name__}
+
+
+def get_products_details_batch(item_ids, sponsor_id=None, priority=PRIORITY_BATCH):
+    """
+    Fetch details for up to BATCH_MAX_ITEMS items concurrently.
+    Returns partial results: {"products": {item_id: detail}, "errors": [...]}.
+    Cached items are served without an eBay call.
+    """
+    unique_ids = list(dict.fromkeys(str(i).strip() for i in item_ids if str(i).strip()))
+    if len(unique_ids) > BATCH_MAX_ITEMS:
+        raise ValueError(f"At most {BATCH_MAX_ITEMS} item_ids per batch")
+
+    futures = {
+        item_id: _batch_pool.submit(
+            _cached_or_load, item_cache, item_id,
+            lambda item_id=item_id: _fetch_product_details(item_id, sponsor_id, priority),
+            priority,
+        )
+        for item_id in unique_ids
+    }
+
+    products = {}
+    errors = []
+    for item_id, future in futures.items():
+        try:
+            products[item_id] = future.result()
+        except Exception as e:
+            errors.append({"item_id": item_id, **_describe_fetch_error(e)})
+    return {"products": products, "errors": errors}
+
+
+def get_cache_stats():
+    return {"search": search_cache.stats(), "item": item_cache.stats()}
+
+
+def get_ebay_usage():
+    """Quota usage plus cache effectiveness, for the admin metrics endpoint."""
+    return {"quota": quota_governor.usage(), "cache": get_cache_stats()}
@@ -0,0 +1,177 @@
+# services/ebay/client.py
+"""
+Shared HTTP client for every eBay call.
+
+One keep-alive requests.Session (pooled per host), connect/read timeouts on
+every request, jittered retry on 429/5xx that honors Retry-After, and a
+circuit breaker so an eBay outage fails fast instead of tying up workers.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .ebay_config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_COOLDOWN_SECONDS,
+)
+from .quota import quota_governor, QuotaExceededError, PRIORITY_INTERACTIVE
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EbayUnavailableError(Exception):
+    """Raised without touching the network while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures; half-open after cooldown."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False
+            # Half-open: let a single probe through, everyone else keeps failing fast.
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe slot that was never used."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    """Parse Retry-After as delta-seconds or an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class EbayClient:
+    def __init__(self):
+        self.timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.max_retries = HTTP_MAX_RETRIES
+        self.breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN_SECONDS)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = _retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, HTTP_BACKOFF_MAX)
+        # Full jitter keeps a burst of failed callers from retrying in lockstep.
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method: str, url: str, priority: str = PRIORITY_INTERACTIVE, **kwargs) -> requests.Response:
+        """
+        Send a request through the shared session.
+        Returns the final response (caller decides on raise_for_status);
+        raises EbayUnavailableError when the breaker is open,
+        QuotaExceededError when the priority lane has no budget left, and
+        requests.RequestException when the network keeps failing.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow_request():
+                raise EbayUnavailableError("eBay API temporarily unavailable (circuit open)")
+            # Every attempt, retries included, counts against the eBay quota.
+            try:
+                quota_governor.acquire(priority)
+            except QuotaExceededError:
+                self.breaker.release_probe()
+                raise
+
+            response = None
+            settled = False
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.breaker.record_failure()
+                settled = True
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_success()
+                    settled = True
+                    return response
+                # 429 means "slow down", not "eBay is down" - it should not trip the breaker.
+                if response.status_code != 429:
+                    self.breaker.record_failure()
+                    settled = True
+                if attempt >= self.max_retries:
+                    return response
+            finally:
+                # A 429 or an unexpected exception says nothing about eBay's health:
+                # free a half-open probe slot so the next caller can probe again.
+                if not settled:
+                    self.breaker.release_probe()
+
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def get(self, url: str, priority: str = PRIORITY_INTERACTIVE, **kwargs) -> requests.Response:
+        return self.request("GET", url, priority=priority, **kwargs)
+
+    def post(self, url: str, priority: str = PRIORITY_INTERACTIVE, **kwargs) -> requests.Response:
+        return self.request("POST", url, priority=priority, **kwargs)
+
+
+# Module-level singleton shared by every caller in the process
+ebay_client = EbayClient()
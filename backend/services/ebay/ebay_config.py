@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 import os
 
 # Load variables from your .env file
-load_dotenv()  
+load_dotenv()
 
 # eBay API credentials
 CLIENT_ID = os.getenv("EBAY_CLIENT_ID")
@@ -13,7 +13,46 @@ CLIENT_SECRET = os.getenv("EBAY_CLIENT_SECRET")
 # eBay OAuth scope (application access)
 OAUTH_SCOPE = "https://api.ebay.com/oauth/api_scope"
 
-# Optional: API endpoints
-TOKEN_URL = "https://api.ebay.com/identity/v1/oauth2/token"
-BROWSE_SEARCH_URL = "https://api.ebay.com/buy/browse/v1/item_summary/search"
-BROWSE_ITEM_URL = "https://api.ebay.com/buy/browse/v1/item/{itemId}"
\ No newline at end of file
+# API endpoints. Point EBAY_API_BASE_URL at the local stand-in
+# (python -m services.ebay.stub_server) to run without eBay credentials/network.
+API_BASE_URL = os.getenv("EBAY_API_BASE_URL", "https://api.ebay.com").rstrip("/")
+TOKEN_URL = os.getenv("EBAY_TOKEN_URL", f"{API_BASE_URL}/identity/v1/oauth2/token")
+BROWSE_SEARCH_URL = os.getenv("EBAY_BROWSE_SEARCH_URL", f"{API_BASE_URL}/buy/browse/v1/item_summary/search")
+BROWSE_ITEM_URL = os.getenv("EBAY_BROWSE_ITEM_URL", f"{API_BASE_URL}/buy/browse/v1/item/{{itemId}}")
+
+# HTTP client tuning (seconds unless noted)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("EBAY_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("EBAY_READ_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("EBAY_HTTP_POOL_SIZE", "20"))
+HTTP_MAX_RETRIES = int(os.getenv("EBAY_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("EBAY_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.getenv("EBAY_BACKOFF_MAX", "8"))
+
+# Circuit breaker: open after N consecutive failures, stay open for the cooldown
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("EBAY_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("EBAY_BREAKER_COOLDOWN", "30"))
+
+# OAuth token renewal: refresh this many seconds before expiry, back off on failures
+TOKEN_RENEW_AHEAD_SECONDS = float(os.getenv("EBAY_TOKEN_RENEW_AHEAD", "300"))
+TOKEN_BACKOFF_BASE = float(os.getenv("EBAY_TOKEN_BACKOFF_BASE", "1"))
+TOKEN_BACKOFF_MAX = float(os.getenv("EBAY_TOKEN_BACKOFF_MAX", "60"))
+
+# Response cache for search / item-detail calls
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("EBAY_SEARCH_CACHE_TTL", "300"))
+ITEM_CACHE_TTL_SECONDS = float(os.getenv("EBAY_ITEM_CACHE_TTL", "900"))
+CACHE_STALE_SECONDS = float(os.getenv("EBAY_CACHE_STALE_SECONDS", "600"))  # serve-stale window past TTL
+CACHE_MAX_ENTRIES = int(os.getenv("EBAY_CACHE_MAX_ENTRIES", "2000"))
+
+# Batch item-detail fetch
+BATCH_MAX_ITEMS = int(os.getenv("EBAY_BATCH_MAX_ITEMS", "50"))
+BATCH_MAX_WORKERS = int(os.getenv("EBAY_BATCH_MAX_WORKERS", "8"))
+
+# Call quota / rate governor (per process; divide by worker count when running several)
+DAILY_CALL_LIMIT = int(os.getenv("EBAY_DAILY_CALL_LIMIT", "5000"))
+CALLS_PER_SECOND = float(os.getenv("EBAY_CALLS_PER_SECOND", "5"))
+CALL_BURST = int(os.getenv("EBAY_CALL_BURST", "10"))
+# Fraction of the daily budget that must still remain for a lane to spend from it
+BATCH_BUDGET_RESERVE = float(os.getenv("EBAY_BATCH_BUDGET_RESERVE", "0.10"))
+SYNC_BUDGET_RESERVE = float(os.getenv("EBAY_SYNC_BUDGET_RESERVE", "0.25"))
+# Below this remaining fraction, callers are served cached results when available
+LOW_BUDGET_FRACTION = float(os.getenv("EBAY_LOW_BUDGET_FRACTION", "0.10"))
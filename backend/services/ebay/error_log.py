@@ -0,0 +1,139 @@
+# services/ebay/error_log.py
+"""
+Aggregated, asynchronous APIErrorLog writer.
+
+During an eBay outage every failed call used to open a DB connection and
+insert its own row. Failures are now counted in memory per
+(sponsor_id, operation, endpoint template, status_code) and a background
+thread writes one row per key every API_ERROR_FLUSH_SECONDS, carrying the
+occurrence count and first/last-seen timestamps.
+"""
+
+import atexit
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from shared.db import get_connection
+
+API_ERROR_FLUSH_SECONDS = float(os.getenv("API_ERROR_FLUSH_SECONDS", "15"))
+
+_ITEM_PATH = re.compile(r"/item/[^/]+")
+
+
+def endpoint_template(url: str) -> str:
+    """Collapse per-call URLs to their route: drop the query, replace item ids."""
+    parts = urlsplit(url)
+    path = _ITEM_PATH.sub("/item/{itemId}", parts.path)
+    return f"{parts.scheme}://{parts.netloc}{path}" if parts.netloc else path
+
+
+def ensure_api_error_log_schema() -> None:
+    """Add the aggregation columns to APIErrorLog on databases that predate them."""
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute(
+            """
+            SELECT COLUMN_NAME
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+              AND TABLE_NAME = 'APIErrorLog'
+            """
+        )
+        columns = {row["COLUMN_NAME"] for row in cursor.fetchall()}
+        if columns and "occurrence_count" not in columns:
+            cursor.execute(
+                """
+                ALTER TABLE APIErrorLog
+                    ADD COLUMN occurrence_count INT NOT NULL DEFAULT 1,
+                    ADD COLUMN first_seen_at DATETIME NULL,
+                    ADD COLUMN last_seen_at DATETIME NULL
+                """
+            )
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class APIErrorAggregator:
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending: dict[tuple, dict] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(self, operation: str, endpoint: str, error_message: str,
+               status_code: int | None = None, sponsor_id: int | None = None) -> None:
+        now = datetime.utcnow()
+        template = endpoint_template(endpoint)
+        key = (sponsor_id, operation, template, status_code)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry:
+                entry["count"] += 1
+                entry["last_seen"] = now
+                entry["error_message"] = error_message
+            else:
+                self._pending[key] = {
+                    "count": 1,
+                    "first_seen": now,
+                    "last_seen": now,
+                    "error_message": error_message,
+                }
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="api-error-log-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything buffered so far as one multi-row INSERT. Non-fatal."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        rows = []
+        for (sponsor_id, operation, template, status_code), entry in pending.items():
+            rows.append((
+                entry["last_seen"], sponsor_id, operation, template[:255],
+                str(entry["error_message"])[:2000], status_code, str(uuid.uuid4())[:16],
+                entry["count"], entry["first_seen"], entry["last_seen"],
+            ))
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+        params = [value for row in rows for value in row]
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    f"""
+                    INSERT INTO APIErrorLog
+                        (occurred_at, sponsor_id, operation, endpoint, error_message, status_code,
+                         request_id, occurrence_count, first_seen_at, last_seen_at)
+                    VALUES {placeholders}
+                    """,
+                    tuple(params),
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
+        except Exception as e:
+            print(f"Failed to flush {len(rows)} API error log rows: {e}")  # never let logging crash the caller
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+api_error_aggregator = APIErrorAggregator(API_ERROR_FLUSH_SECONDS)
+atexit.register(api_error_aggregator.flush)
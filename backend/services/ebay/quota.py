@@ -0,0 +1,129 @@
+# services/ebay/quota.py
+"""
+eBay call governor shared by every caller in the process.
+
+- Rolling 24h call count against DAILY_CALL_LIMIT (per-minute buckets).
+- Token bucket for short-term rate (CALLS_PER_SECOND, CALL_BURST).
+- Priority lanes: interactive > batch > sync. Lower lanes stop spending once
+  the remaining daily budget drops to their reserve, and they leave the last
+  bucket tokens for interactive callers, so background work can never starve
+  a sponsor's search.
+"""
+
+import threading
+import time
+from collections import deque
+
+from .ebay_config import (
+    DAILY_CALL_LIMIT,
+    CALLS_PER_SECOND,
+    CALL_BURST,
+    BATCH_BUDGET_RESERVE,
+    SYNC_BUDGET_RESERVE,
+    LOW_BUDGET_FRACTION,
+)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_SYNC = "sync"
+
+WINDOW_SECONDS = 24 * 60 * 60
+
+
+class QuotaExceededError(Exception):
+    """Raised when a lane has no budget left or could not get a rate token in time."""
+
+
+class QuotaGovernor:
+    # How long each lane may wait for a rate token before giving up
+    WAIT_SECONDS = {PRIORITY_INTERACTIVE: 2.0, PRIORITY_BATCH: 10.0, PRIORITY_SYNC: 30.0}
+    # Tokens a lane must leave in the bucket for higher lanes
+    TOKENS_HELD_BACK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1, PRIORITY_SYNC: 2}
+
+    def __init__(self, daily_limit: int, rate_per_second: float, burst: int):
+        self.daily_limit = daily_limit
+        self.rate_per_second = rate_per_second
+        self.burst = max(burst, 1)
+        self.budget_reserve = {
+            PRIORITY_INTERACTIVE: 0,
+            PRIORITY_BATCH: int(daily_limit * BATCH_BUDGET_RESERVE),
+            PRIORITY_SYNC: int(daily_limit * SYNC_BUDGET_RESERVE),
+        }
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._minute_buckets: deque[list] = deque()  # [minute_epoch, count]
+        self._used_in_window = 0
+        self._calls = {p: 0 for p in self.WAIT_SECONDS}
+        self._rejected = {p: 0 for p in self.WAIT_SECONDS}
+
+    def _expire_window(self, now: float) -> None:
+        cutoff = int((now - WINDOW_SECONDS) // 60)
+        while self._minute_buckets and self._minute_buckets[0][0] <= cutoff:
+            self._used_in_window -= self._minute_buckets.popleft()[1]
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+        self._refilled_at = now
+
+    def remaining(self) -> int:
+        with self._cond:
+            self._expire_window(time.time())
+            return max(0, self.daily_limit - self._used_in_window)
+
+    def is_low(self, priority: str = PRIORITY_INTERACTIVE) -> bool:
+        """True once the remaining budget is at the lane's reserve or below the low-water mark."""
+        remaining = self.remaining()
+        return remaining <= max(self.budget_reserve.get(priority, 0), self.daily_limit * LOW_BUDGET_FRACTION)
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE) -> None:
+        """Block until the call may proceed, or raise QuotaExceededError."""
+        priority = priority if priority in self.WAIT_SECONDS else PRIORITY_INTERACTIVE
+        deadline = time.monotonic() + self.WAIT_SECONDS[priority]
+        with self._cond:
+            while True:
+                now = time.time()
+                self._expire_window(now)
+                if self.daily_limit - self._used_in_window <= self.budget_reserve[priority]:
+                    self._rejected[priority] += 1
+                    raise QuotaExceededError(f"eBay daily call budget exhausted for {priority} calls")
+
+                self._refill()
+                needed = 1 + self.TOKENS_HELD_BACK[priority]
+                if self._tokens >= needed:
+                    self._tokens -= 1
+                    minute = int(now // 60)
+                    if self._minute_buckets and self._minute_buckets[-1][0] == minute:
+                        self._minute_buckets[-1][1] += 1
+                    else:
+                        self._minute_buckets.append([minute, 1])
+                    self._used_in_window += 1
+                    self._calls[priority] += 1
+                    return
+
+                wait = (needed - self._tokens) / self.rate_per_second
+                remaining_wait = deadline - time.monotonic()
+                if remaining_wait <= 0:
+                    self._rejected[priority] += 1
+                    raise QuotaExceededError(f"eBay call rate limit reached for {priority} calls")
+                self._cond.wait(timeout=min(wait, remaining_wait))
+
+    def usage(self) -> dict:
+        with self._cond:
+            self._expire_window(time.time())
+            self._refill()
+            remaining = max(0, self.daily_limit - self._used_in_window)
+            return {
+                "daily_limit": self.daily_limit,
+                "used_last_24h": self._used_in_window,
+                "remaining": remaining,
+                "low_budget": remaining <= self.daily_limit * LOW_BUDGET_FRACTION,
+                "rate_per_second": self.rate_per_second,
+                "tokens_available": round(self._tokens, 2),
+                "calls_by_priority": dict(self._calls),
+                "rejected_by_priority": dict(self._rejected),
+            }
+
+
+quota_governor = QuotaGovernor(DAILY_CALL_LIMIT, CALLS_PER_SECOND, CALL_BURST)
@@ -0,0 +1,131 @@
+# services/ebay/response_cache.py
+"""
+Bounded TTL + LRU cache for eBay responses.
+
+- Fresh entries (age < ttl) are returned directly.
+- Stale entries (ttl <= age < ttl + stale_ttl) are returned immediately while
+  one background refresh runs (stale-while-revalidate).
+- Concurrent misses for the same key share one loader call (single-flight).
+- Failed loads are never cached.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+# Shared by every cache instance; revalidation is rare and cheap to queue.
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ebay-cache-refresh")
+
+
+class ResponseCache:
+    def __init__(self, name: str, ttl_seconds: float, stale_seconds: float, max_entries: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._inflight: dict[Hashable, Future] = {}
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._load_errors = 0
+        self._evictions = 0
+        self._degraded_hits = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age < self.ttl_seconds:
+                    self._hits += 1
+                    self._entries.move_to_end(key)
+                    return value
+                if age < self.ttl_seconds + self.stale_seconds:
+                    self._stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._inflight:
+                        future = Future()
+                        self._inflight[key] = future
+                        _refresh_pool.submit(self._fill, key, loader, future)
+                    return value
+
+            self._misses += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if leader:
+            self._fill(key, loader, future)
+        return future.result()
+
+    def _fill(self, key: Hashable, loader: Callable[[], Any], future: Future) -> None:
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._load_errors += 1
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def peek(self, key: Hashable, allow_stale: bool = True, allow_expired: bool = False) -> tuple[bool, Any]:
+        """
+        Return (found, value) without loading. Stale entries count only if
+        allow_stale; entries past the stale window only if allow_expired
+        (used to degrade gracefully when eBay calls cannot be made).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            value, stored_at = entry
+            if not allow_expired:
+                age = time.monotonic() - stored_at
+                limit = self.ttl_seconds + (self.stale_seconds if allow_stale else 0)
+                if age >= limit:
+                    return False, None
+            if allow_expired:
+                self._degraded_hits += 1
+            return True, value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._stale_hits + self._misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "stale_seconds": self.stale_seconds,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "load_errors": self._load_errors,
+                "evictions": self._evictions,
+                "degraded_hits": self._degraded_hits,
+                "hit_ratio": round((self._hits + self._stale_hits) / lookups, 4) if lookups else 0.0,
+            }
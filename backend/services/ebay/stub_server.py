@@ -0,0 +1,284 @@
+"""
+stub_server.py
+--------------
+Purpose:
+    Local stand-in for the three eBay endpoints browse.py uses (OAuth token,
+    item_summary/search, item/{itemId}) so search, catalog add and catalog
+    sync can be exercised and benchmarked without eBay credentials or network.
+
+Fixtures:
+    - Synthetic (default): any item id of the form v1|<digits>|0 resolves to a
+      deterministic item; search returns deterministic pages for any query.
+    - Recorded: set EBAY_STUB_FIXTURE_DIR to a folder of item-detail JSON
+      files (one per item, as returned by eBay). Those items are served by id
+      and searched by title; unknown ids still fall back to synthetic ones.
+
+Behavior knobs (env, or POST /_stub/config at runtime):
+    EBAY_STUB_LATENCY_MS / EBAY_STUB_LATENCY_JITTER_MS  added per request
+    EBAY_STUB_ERROR_RATE       fraction of browse calls answered 500/503
+    EBAY_STUB_RATE_LIMIT       browse calls per second before 429 + Retry-After (0 = off)
+    EBAY_STUB_TOKEN_TTL        expires_in for issued tokens (seconds)
+    EBAY_STUB_PRICE_EPOCH      re-roll prices/stock every N seconds so sync sees changes (0 = off)
+    EBAY_STUB_SEED             seed for synthetic data and injected errors
+
+Usage:
+    python -m services.ebay.stub_server            (port EBAY_STUB_PORT, default 8900)
+    EBAY_API_BASE_URL=http://127.0.0.1:8900 uvicorn app:app
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+class StubSettings:
+    def __init__(self):
+        self.latency_ms = float(os.getenv("EBAY_STUB_LATENCY_MS", "80"))
+        self.latency_jitter_ms = float(os.getenv("EBAY_STUB_LATENCY_JITTER_MS", "40"))
+        self.error_rate = float(os.getenv("EBAY_STUB_ERROR_RATE", "0"))
+        self.rate_limit = float(os.getenv("EBAY_STUB_RATE_LIMIT", "0"))
+        self.token_ttl = int(os.getenv("EBAY_STUB_TOKEN_TTL", "7200"))
+        self.price_epoch = float(os.getenv("EBAY_STUB_PRICE_EPOCH", "0"))
+        self.seed = int(os.getenv("EBAY_STUB_SEED", "27"))
+        self.fixture_dir = os.getenv("EBAY_STUB_FIXTURE_DIR")
+
+    def as_dict(self) -> dict:
+        return {
+            "latency_ms": self.latency_ms,
+            "latency_jitter_ms": self.latency_jitter_ms,
+            "error_rate": self.error_rate,
+            "rate_limit": self.rate_limit,
+            "token_ttl": self.token_ttl,
+            "price_epoch": self.price_epoch,
+            "seed": self.seed,
+        }
+
+
+settings = StubSettings()
+
+_ADJECTIVES = ["Wireless", "Compact", "Heavy-Duty", "Portable", "Insulated", "Rechargeable",
+               "Magnetic", "LED", "Waterproof", "Ergonomic", "Universal", "Premium"]
+_NOUNS = ["Dash Cam", "Phone Mount", "Seat Cushion", "Travel Mug", "Tire Gauge", "Jump Starter",
+          "Bluetooth Headset", "Cooler", "Flashlight", "Steering Wheel Cover", "Backpack", "Gift Card"]
+_CONDITIONS = ["New", "New", "New", "Used", "Open box"]
+SYNTHETIC_SEARCH_TOTAL = 1000
+
+
+def _rng(*parts) -> random.Random:
+    """Deterministic per-key RNG; crc32 keeps values stable across processes."""
+    key = "|".join(str(p) for p in (settings.seed, *parts))
+    return random.Random(zlib.crc32(key.encode()))
+
+
+def _price_epoch() -> int:
+    return int(time.time() // settings.price_epoch) if settings.price_epoch > 0 else 0
+
+
+def _synthetic_item(item_id: str) -> dict | None:
+    parts = item_id.split("|")
+    if len(parts) != 3 or parts[0] != "v1" or not parts[1].isdigit():
+        return None
+    rng = _rng("item", item_id)
+    title = f"{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)} {rng.randint(100, 999)}"
+    image_id = rng.randint(10_000, 99_999)
+    volatile = _rng("price", item_id, _price_epoch())
+    quantity = volatile.choice([0, 1, 3, 5, 10, 25, 50])
+    return {
+        "itemId": item_id,
+        "title": title,
+        "shortDescription": f"{title} - synthetic listing for local testing.",
+        "price": {"value": f"{volatile.uniform(5, 250):.2f}", "currency": "USD"},
+        "condition": rng.choice(_CONDITIONS),
+        "image": {"imageUrl": f"https://i.ebayimg.example/{image_id}/s-l500.jpg"},
+        "additionalImages": [
+            {"imageUrl": f"https://i.ebayimg.example/{image_id + n}/s-l500.jpg"} for n in range(1, 3)
+        ],
+        "itemWebUrl": f"https://www.ebay.example/itm/{parts[1]}",
+        "seller": {"username": f"seller_{rng.randint(1, 500)}", "feedbackPercentage": "99.1"},
+        "localizedAspects": [{"type": "STRING", "name": "Brand", "value": "Stub"}],
+        "estimatedAvailabilities": [{
+            "estimatedAvailableQuantity": quantity,
+            "estimatedAvailabilityStatus": "IN_STOCK" if quantity else "OUT_OF_STOCK",
+        }],
+    }
+
+
+def _load_fixtures(fixture_dir: str | None) -> dict[str, dict]:
+    items = {}
+    if not fixture_dir:
+        return items
+    for path in sorted(Path(fixture_dir).glob("*.json")):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"Skipping fixture {path.name}: {e}")
+            continue
+        # Accept single item payloads or a recorded list of them
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict) and item.get("itemId"):
+                items[item["itemId"]] = item
+    return items
+
+
+recorded_items = _load_fixtures(settings.fixture_dir)
+
+
+def _summary(item: dict) -> dict:
+    """Trim an item-detail payload to the fields eBay returns in itemSummaries."""
+    keys = ("itemId", "title", "price", "image", "condition", "itemWebUrl", "seller", "shortDescription")
+    return {k: item[k] for k in keys if k in item}
+
+
+def get_item(item_id: str) -> dict | None:
+    return recorded_items.get(item_id) or _synthetic_item(item_id)
+
+
+def search_items(query: str, limit: int, offset: int) -> dict:
+    if recorded_items:
+        words = query.lower().split()
+        matches = [item for item in recorded_items.values()
+                   if all(w in str(item.get("title", "")).lower() for w in words)]
+        page = matches[offset:offset + limit]
+        return {"total": len(matches), "itemSummaries": [_summary(i) for i in page]}
+
+    # Same query + offset always yields the same ids, so caches and catalog adds line up
+    query_key = " ".join(query.lower().split())
+    end = min(offset + limit, SYNTHETIC_SEARCH_TOTAL)
+    page = []
+    for position in range(offset, end):
+        number = _rng("search", query_key, position).randint(100_000_000_000, 999_999_999_999)
+        page.append(_summary(_synthetic_item(f"v1|{number}|0")))
+    return {"total": SYNTHETIC_SEARCH_TOTAL, "itemSummaries": page}
+
+
+class _RateLimiter:
+    """Token bucket with a one-second burst; reports how long until the next token."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = float("inf")  # clamped to a full bucket on first use
+        self._refilled_at = time.monotonic()
+
+    def try_acquire(self, rate: float) -> float:
+        """Return 0 when allowed, else seconds to wait."""
+        if rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(rate, self._tokens + (now - self._refilled_at) * rate)
+            self._refilled_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / rate
+
+
+_limiter = _RateLimiter()
+_issued_tokens: dict[str, float] = {}
+_tokens_lock = threading.Lock()
+_error_rng = random.Random(settings.seed)
+_stats = {"token": 0, "search": 0, "item": 0, "throttled": 0, "injected_errors": 0, "unauthorized": 0}
+
+app = FastAPI(title="eBay Browse stand-in")
+
+
+def _error(status_code: int, message: str, headers: dict | None = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"errors": [{"errorId": status_code, "domain": "API_BROWSE", "message": message}]},
+        headers=headers,
+    )
+
+
+async def _simulate_upstream(authorization: str | None) -> JSONResponse | None:
+    """Latency, auth, rate limit and injected failures, in the order eBay would apply them."""
+    delay_ms = settings.latency_ms + random.uniform(0, settings.latency_jitter_ms)
+    if delay_ms > 0:
+        await asyncio.sleep(delay_ms / 1000)
+
+    token = (authorization or "").removeprefix("Bearer ").strip()
+    with _tokens_lock:
+        expires_at = _issued_tokens.get(token)
+    if expires_at is None or expires_at < time.time():
+        _stats["unauthorized"] += 1
+        return _error(401, "Invalid access token")
+
+    wait = _limiter.try_acquire(settings.rate_limit)
+    if wait > 0:
+        _stats["throttled"] += 1
+        return _error(429, "Too many requests", headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+    if settings.error_rate > 0 and _error_rng.random() < settings.error_rate:
+        _stats["injected_errors"] += 1
+        status_code = _error_rng.choice([500, 503])
+        return _error(status_code, "Injected upstream failure")
+    return None
+
+
+@app.post("/identity/v1/oauth2/token")
+async def issue_token():
+    _stats["token"] += 1
+    if settings.latency_ms > 0:
+        await asyncio.sleep(settings.latency_ms / 1000)
+    token = f"stub-{uuid.uuid4().hex}"
+    with _tokens_lock:
+        now = time.time()
+        for stale in [t for t, exp in _issued_tokens.items() if exp < now]:
+            _issued_tokens.pop(stale, None)
+        _issued_tokens[token] = now + settings.token_ttl
+    return {"access_token": token, "expires_in": settings.token_ttl, "token_type": "Application Access Token"}
+
+
+@app.get("/buy/browse/v1/item_summary/search")
+async def search(q: str = "", limit: int = 50, offset: int = 0, authorization: str | None = Header(None)):
+    _stats["search"] += 1
+    failure = await _simulate_upstream(authorization)
+    if failure:
+        return failure
+    limit = max(1, min(limit, 200))
+    return search_items(q, limit, max(0, offset))
+
+
+@app.get("/buy/browse/v1/item/{item_id}")
+async def item_detail(item_id: str, authorization: str | None = Header(None)):
+    _stats["item"] += 1
+    failure = await _simulate_upstream(authorization)
+    if failure:
+        return failure
+    item = get_item(item_id)
+    if item is None:
+        return _error(404, f"The specified item ID '{item_id}' was not found")
+    return item
+
+
+@app.get("/_stub/stats")
+def stub_stats():
+    return {"requests": dict(_stats), "settings": settings.as_dict(), "recorded_items": len(recorded_items)}
+
+
+@app.post("/_stub/config")
+async def update_stub_config(request: Request):
+    """Change latency / error rate / rate limit mid-run, e.g. to script an outage."""
+    body = await request.json()
+    for field in ("latency_ms", "latency_jitter_ms", "error_rate", "rate_limit", "price_epoch"):
+        if field in body:
+            setattr(settings, field, float(body[field]))
+    if "token_ttl" in body:
+        settings.token_ttl = int(body["token_ttl"])
+    return settings.as_dict()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("EBAY_STUB_HOST", "127.0.0.1"), port=int(os.getenv("EBAY_STUB_PORT", "8900")))
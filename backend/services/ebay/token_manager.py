@@ -0,0 +1,108 @@
+# services/ebay/token_manager.py
+"""
+Thread-safe eBay application token holder.
+
+Concurrent callers that find the token expired share a single refresh
+(single-flight); a daemon timer renews the token shortly before it expires
+so request threads normally never wait; failed refreshes back off
+exponentially instead of hammering TOKEN_URL.
+"""
+
+import threading
+import time
+from typing import Callable
+
+from .ebay_config import TOKEN_RENEW_AHEAD_SECONDS, TOKEN_BACKOFF_BASE, TOKEN_BACKOFF_MAX
+
+
+class EbayTokenError(Exception):
+    """Raised when no valid token is available and a refresh is backing off or failed."""
+
+
+class EbayTokenManager:
+    def __init__(self, fetch_token: Callable[[], tuple[str, int]]):
+        """fetch_token() must return (access_token, expires_in_seconds) or raise."""
+        self._fetch_token = fetch_token
+        self._cond = threading.Condition()
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self._last_error: Exception | None = None
+        self._timer: threading.Timer | None = None
+
+    def _valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at
+
+    def get_token(self) -> str:
+        with self._cond:
+            while not self._valid() and self._refreshing:
+                # Another thread is already refreshing; wait for its result.
+                self._cond.wait(timeout=30)
+            if self._valid():
+                return self._token
+            if time.time() < self._retry_at:
+                raise EbayTokenError(f"eBay token refresh backing off: {self._last_error}")
+            self._refreshing = True
+        return self._refresh()
+
+    def _refresh(self) -> str:
+        """Run the fetch outside the lock. Caller must have set _refreshing."""
+        try:
+            access_token, expires_in = self._fetch_token()
+            if not access_token:
+                raise EbayTokenError("eBay token response did not include an access_token")
+        except Exception as e:
+            with self._cond:
+                self._failures += 1
+                backoff = min(TOKEN_BACKOFF_MAX, TOKEN_BACKOFF_BASE * (2 ** (self._failures - 1)))
+                self._retry_at = time.time() + backoff
+                self._last_error = e
+                self._refreshing = False
+                self._cond.notify_all()
+            # Keep trying in the background while the current token (if any) is still usable.
+            self._schedule_renewal(backoff)
+            raise
+
+        expires_in = int(expires_in or 7200)
+        with self._cond:
+            self._token = access_token
+            self._expires_at = time.time() + expires_in - 60  # buffer 1 min
+            self._failures = 0
+            self._retry_at = 0.0
+            self._last_error = None
+            self._refreshing = False
+            self._cond.notify_all()
+        self._schedule_renewal(max(1.0, expires_in - TOKEN_RENEW_AHEAD_SECONDS))
+        return access_token
+
+    def _schedule_renewal(self, delay: float) -> None:
+        with self._cond:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self._background_refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_refresh(self) -> None:
+        with self._cond:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        try:
+            self._refresh()
+        except Exception as e:
+            print(f"Background eBay token refresh failed: {e}")
+
+    def invalidate(self, rejected: str | None = None) -> None:
+        """
+        Drop the cached token, e.g. after eBay rejects it with 401. Pass the
+        rejected token so a burst of 401s does not also drop the fresh token
+        a parallel caller already fetched.
+        """
+        with self._cond:
+            if rejected is not None and self._token != rejected:
+                return
+            self._token = None
+            self._expires_at = 0.0
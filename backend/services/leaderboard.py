@@ -0,0 +1,153 @@
+"""
+leaderboard.py
+--------------
+Purpose:
+    Rank a sponsor's drivers by points earned in a week, a month or all time,
+    read from PointLeaderboard and PointLeaderboardBuckets (kept current by
+    shared/point_ledger.py on every point change).
+
+Every read is a seek on idx_leaderboard_rank
+(sponsor_id, period_type, period_start, points_earned, driver_id):
+    - top-K: the first K entries of the index, read backwards;
+    - a driver: one primary-key probe for their score, then the rank: the
+      driver counts of the buckets above theirs plus a count of the entries
+      ahead of them inside their own LEADERBOARD_BUCKET_POINTS-wide bucket.
+      The cost is the number of buckets plus that bucket's population, not
+      the driver's rank, though a crowded band of scores is still counted
+      entry by entry;
+    - neighbors: K entries either side of the driver's (points, driver_id).
+Ties share a rank (1, 2, 2, 4); within a tie the higher driver_id is listed
+first so pages and neighbors are stable.
+"""
+
+from datetime import date
+
+from shared.point_ledger import LEADERBOARD_BUCKET_POINTS, LEADERBOARD_PERIODS, leaderboard_bucket, period_start
+
+LEADERBOARD_MAX_LIMIT = 100
+LEADERBOARD_MAX_NEIGHBORS = 25
+
+_ENTRY_COLUMNS = """
+    SELECT lb.driver_id, u.username, lb.points_earned
+    FROM PointLeaderboard lb
+    LEFT JOIN Users u ON u.user_id = lb.driver_id
+"""
+_BOARD = "lb.sponsor_id = %s AND lb.period_type = %s AND lb.period_start = %s"
+
+
+def _board(sponsor_id: int, period: str, at: date | None) -> tuple:
+    """(sponsor_id, period, period_start) for the period containing at (default today). Raises ValueError."""
+    if period not in LEADERBOARD_PERIODS:
+        raise ValueError(f"period must be one of {', '.join(LEADERBOARD_PERIODS)}")
+    return sponsor_id, period, period_start(period, at or date.today())
+
+
+def _ranked(cursor, board: tuple, rows: list[dict]) -> list[dict]:
+    """
+    Attach ranks to rows that are consecutive in leaderboard order. One query
+    places the first row (whole buckets above it, then its own bucket); the
+    rest follow from their position.
+    """
+    if not rows:
+        return []
+    first = rows[0]
+    points = int(first["points_earned"])
+    bucket = leaderboard_bucket(points)
+    cursor.execute(
+        f"""
+        SELECT
+            (SELECT COALESCE(SUM(b.drivers), 0)
+             FROM PointLeaderboardBuckets b
+             WHERE b.sponsor_id = %s AND b.period_type = %s AND b.period_start = %s AND b.bucket > %s) AS above,
+            COUNT(*) AS ahead,
+            COALESCE(SUM(lb.points_earned > %s), 0) AS higher
+        FROM PointLeaderboard lb
+        WHERE {_BOARD}
+          AND (lb.points_earned, lb.driver_id) > (%s, %s)
+          AND lb.points_earned < %s
+        """,
+        (*board, bucket, points, *board, points, first["driver_id"], (bucket + 1) * LEADERBOARD_BUCKET_POINTS),
+    )
+    counts = cursor.fetchone()
+    position = int(counts["above"]) + int(counts["ahead"]) + 1
+    rank = int(counts["above"]) + int(counts["higher"]) + 1
+    ranked = []
+    previous = None
+    for row in rows:
+        points = int(row["points_earned"])
+        if previous is not None:
+            position += 1
+            if points != previous:
+                rank = position
+        previous = points
+        ranked.append({"rank": rank, "driver_id": row["driver_id"], "username": row["username"], "points_earned": points})
+    return ranked
+
+
+def get_leaderboard_top(cursor, sponsor_id: int, period: str, limit: int = 10, at: date | None = None) -> dict:
+    """The top `limit` drivers of the period containing at."""
+    board = _board(sponsor_id, period, at)
+    limit = max(1, min(int(limit), LEADERBOARD_MAX_LIMIT))
+    cursor.execute(
+        f"""
+        {_ENTRY_COLUMNS}
+        WHERE {_BOARD}
+        ORDER BY lb.points_earned DESC, lb.driver_id DESC
+        LIMIT %s
+        """,
+        (*board, limit),
+    )
+    return {"period": period, "period_start": board[2], "entries": _ranked(cursor, board, cursor.fetchall())}
+
+
+def get_leaderboard_position(
+    cursor,
+    sponsor_id: int,
+    driver_id: int,
+    period: str,
+    neighbors: int = 0,
+    at: date | None = None,
+) -> dict:
+    """
+    A driver's rank in the period plus up to `neighbors` drivers directly
+    above and below. driver is None when they earned nothing in the period.
+    """
+    board = _board(sponsor_id, period, at)
+    neighbors = max(0, min(int(neighbors), LEADERBOARD_MAX_NEIGHBORS))
+    cursor.execute(
+        f"{_ENTRY_COLUMNS} WHERE {_BOARD} AND lb.driver_id = %s",
+        (*board, driver_id),
+    )
+    me = cursor.fetchone()
+    result = {"period": period, "period_start": board[2], "driver": None, "above": [], "below": []}
+    if me is None:
+        return result
+
+    above, below = [], []
+    if neighbors:
+        cursor.execute(
+            f"""
+            {_ENTRY_COLUMNS}
+            WHERE {_BOARD} AND (lb.points_earned, lb.driver_id) > (%s, %s)
+            ORDER BY lb.points_earned, lb.driver_id
+            LIMIT %s
+            """,
+            (*board, me["points_earned"], me["driver_id"], neighbors),
+        )
+        above = list(reversed(cursor.fetchall()))
+        cursor.execute(
+            f"""
+            {_ENTRY_COLUMNS}
+            WHERE {_BOARD} AND (lb.points_earned, lb.driver_id) < (%s, %s)
+            ORDER BY lb.points_earned DESC, lb.driver_id DESC
+            LIMIT %s
+            """,
+            (*board, me["points_earned"], me["driver_id"], neighbors),
+        )
+        below = cursor.fetchall()
+
+    window = _ranked(cursor, board, above + [me] + below)
+    result["above"] = window[:len(above)]
+    result["driver"] = window[len(above)]
+    result["below"] = window[len(above) + 1:]
+    return result
@@ -0,0 +1,142 @@
+"""
+order_history.py
+----------------
+Purpose:
+    Order history for drivers and sponsors: keyset pages on
+    (created_at, order_id) newest-first, status/date filters, and counts by
+    status.
+
+Each query is scoped to one driver or one sponsor and served by the
+idx_orders_<scope>_created / idx_orders_<scope>_status composite indexes, so
+a page costs the same for a driver with ten orders or ten thousand.
+"""
+
+from datetime import date, timedelta
+
+from shared.pagination import encode_cursor, decode_cursor
+
+ORDER_HISTORY_MAX_PAGE_SIZE = 200
+ORDER_STATUSES = ("pending", "shipped", "cancelled")
+
+# scope name -> Orders column; never taken from user input directly
+_SCOPE_COLUMNS = {"driver": "o.driver_user_id", "sponsor": "o.sponsor_user_id"}
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_order_filters(
+    scope: str,
+    scope_id: int,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    driver_name: str | None = None,
+) -> tuple[list[str], list]:
+    """WHERE clauses + params shared by the page and summary queries. Raises ValueError on bad input."""
+    where = [f"{_SCOPE_COLUMNS[scope]} = %s"]
+    params: list = [scope_id]
+    if status:
+        if status not in ORDER_STATUSES:
+            raise ValueError(f"status must be one of: {', '.join(ORDER_STATUSES)}")
+        where.append("o.status = %s")
+        params.append(status)
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must be on or before date_to")
+    if date_from:
+        where.append("o.created_at >= %s")
+        params.append(date_from)
+    if date_to:
+        # Inclusive end date as a half-open range, so the index range scan still applies
+        where.append("o.created_at < %s")
+        params.append(date_to + timedelta(days=1))
+    if driver_name and driver_name.strip():
+        pattern = f"%{_escape_like(driver_name.strip())}%"
+        where.append(
+            """(u.username LIKE %s OR p.first_name LIKE %s OR p.last_name LIKE %s
+                OR CONCAT(COALESCE(p.first_name, ''), ' ', COALESCE(p.last_name, '')) LIKE %s)"""
+        )
+        params.extend([pattern] * 4)
+    return where, params
+
+
+def get_orders_page(
+    cursor,
+    scope: str,
+    scope_id: int,
+    limit: int | None,
+    after: str | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    driver_name: str | None = None,
+) -> dict:
+    """
+    Newest-first orders. limit=None returns every matching order (legacy
+    callers); otherwise one page plus next_cursor.
+    """
+    where, params = build_order_filters(scope, scope_id, status, date_from, date_to, driver_name)
+    if after:
+        created_at, order_id = decode_cursor(after, f"{scope}_orders", size=2)
+        where.append("(o.created_at, o.order_id) < (%s, %s)")
+        params.extend([created_at, order_id])
+
+    if scope == "sponsor":
+        columns = """o.order_id, o.driver_user_id, o.item_id, o.item_title, o.points_cost, o.status,
+                     o.created_at, o.updated_at,
+                     u.username,
+                     COALESCE(p.first_name, '') AS first_name,
+                     COALESCE(p.last_name, '')  AS last_name"""
+        joins = """JOIN Users u   ON u.user_id = o.driver_user_id
+                   LEFT JOIN Profiles p ON p.user_id = o.driver_user_id"""
+    else:
+        columns = """o.order_id, o.item_id, o.item_title, o.points_cost, o.status,
+                     o.created_at, o.updated_at"""
+        joins = ""
+
+    sql = f"""
+        SELECT {columns}
+        FROM Orders o
+        {joins}
+        WHERE {" AND ".join(where)}
+        ORDER BY o.created_at DESC, o.order_id DESC
+    """
+    if limit is not None:
+        limit = max(1, min(int(limit), ORDER_HISTORY_MAX_PAGE_SIZE))
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+    cursor.execute(sql, tuple(params))
+    rows = cursor.fetchall()
+
+    has_more = limit is not None and len(rows) > limit
+    orders = rows[:limit] if limit is not None else rows
+    next_cursor = None
+    if has_more:
+        last = orders[-1]
+        next_cursor = encode_cursor(f"{scope}_orders", [last["created_at"], last["order_id"]])
+    return {"orders": orders, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def get_order_status_counts(
+    cursor,
+    scope: str,
+    scope_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> dict:
+    """Counts per status; answered from the (scope, status, created_at) index alone."""
+    where, params = build_order_filters(scope, scope_id, date_from=date_from, date_to=date_to)
+    cursor.execute(
+        f"""
+        SELECT o.status, COUNT(*) AS order_count
+        FROM Orders o
+        WHERE {" AND ".join(where)}
+        GROUP BY o.status
+        """,
+        tuple(params),
+    )
+    counts = {s: 0 for s in ORDER_STATUSES}
+    for row in cursor.fetchall():
+        counts[row["status"]] = int(row["order_count"])
+    return {"by_status": counts, "total_orders": sum(counts.values())}
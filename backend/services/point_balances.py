@@ -0,0 +1,350 @@
+"""
+point_balances.py
+-----------------
+Purpose:
+    Point-in-time balances and incremental reconciliation, both built on
+    audit_log.balance_after (written by shared/point_ledger.py together with
+    the SponsorDrivers.total_points change it describes).
+
+    - As-of: the newest ledger entry at or before the instant already holds
+      the balance, so a lookup is one index probe on
+      idx_audit_pair_category_date instead of a sum over all history.
+    - Reconciliation: each ledger entry must satisfy
+      previous balance_after + points_changed = balance_after, and the last
+      one must match SponsorDrivers.total_points. Only entries written since
+      the previous run are checked, against the per-pair checkpoint it left.
+      Entries younger than RECONCILE_SETTLE_SECONDS are left for the next
+      run: ids are handed out at insert but become visible at commit, so a
+      lower id can still appear behind the newest ones.
+    - The very first run has no watermark; it recomputes every total from
+      the whole ledger once (entries from before balance_after have no chain
+      to check) and starts the incremental runs after it.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+from shared.db import get_connection
+
+RECONCILE_CHUNK_SIZE = 5000
+RECONCILE_SETTLE_SECONDS = int(os.getenv("RECONCILE_SETTLE_SECONDS", "300"))
+
+
+def ensure_point_balance_schema() -> None:
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS PointBalanceCheckpoint (
+                sponsor_id INT NOT NULL,
+                driver_id INT NOT NULL,
+                last_audit_id BIGINT NOT NULL,
+                balance_after INT NOT NULL,
+                PRIMARY KEY (sponsor_id, driver_id)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS PointReconcileState (
+                id TINYINT PRIMARY KEY,
+                last_audit_id BIGINT NOT NULL DEFAULT 0,
+                checked_at DATETIME DEFAULT NULL
+            )
+            """
+        )
+        # No state row yet: the first reconcile_point_balances run recomputes every total and creates it
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_balance_as_of(cursor, sponsor_id: int, driver_id: int, as_of: datetime) -> dict:
+    """Driver's balance with sponsor_id right after the last change at or before as_of."""
+    cursor.execute(
+        """
+        SELECT id, date, balance_after
+        FROM audit_log
+        WHERE driver_id = %s AND sponsor_id = %s AND category = 'point_change' AND date <= %s
+        ORDER BY date DESC, id DESC
+        LIMIT 1
+        """,
+        (driver_id, sponsor_id, as_of),
+    )
+    last = cursor.fetchone()
+    if last is None:
+        return {"balance": 0, "as_of": as_of, "last_change_at": None}
+    if last["balance_after"] is not None:
+        return {"balance": int(last["balance_after"]), "as_of": as_of, "last_change_at": last["date"]}
+
+    # Entry predates balance_after: step back from the first later entry that has one,
+    # or from the live total when there is none
+    cursor.execute(
+        """
+        SELECT id, date, balance_after
+        FROM audit_log
+        WHERE driver_id = %s AND sponsor_id = %s AND category = 'point_change'
+          AND date > %s AND balance_after IS NOT NULL
+        ORDER BY date, id
+        LIMIT 1
+        """,
+        (driver_id, sponsor_id, as_of),
+    )
+    anchor = cursor.fetchone()
+    if anchor is not None:
+        anchor_balance = int(anchor["balance_after"])
+        upper_sql, upper_params = "AND (date, id) <= (%s, %s)", (anchor["date"], anchor["id"])
+    else:
+        cursor.execute(
+            """
+            SELECT total_points FROM SponsorDrivers
+            WHERE driver_user_id = %s AND sponsor_user_id = %s
+            ORDER BY sponsor_driver_id DESC
+            LIMIT 1
+            """,
+            (driver_id, sponsor_id),
+        )
+        row = cursor.fetchone()
+        anchor_balance = int(row["total_points"]) if row else 0
+        upper_sql, upper_params = "", ()
+    cursor.execute(
+        f"""
+        SELECT COALESCE(SUM(points_changed), 0) AS later_changes
+        FROM audit_log
+        WHERE driver_id = %s AND sponsor_id = %s AND category = 'point_change'
+          AND date > %s {upper_sql}
+        """,
+        (driver_id, sponsor_id, as_of, *upper_params),
+    )
+    later = int(cursor.fetchone()["later_changes"])
+    return {"balance": anchor_balance - later, "as_of": as_of, "last_change_at": last["date"]}
+
+
+def _pair_in(pairs) -> tuple[str, tuple]:
+    return ", ".join(["(%s, %s)"] * len(pairs)), tuple(v for pair in pairs for v in pair)
+
+
+def reconcile_point_balances(repair: bool = True, chunk_size: int = RECONCILE_CHUNK_SIZE) -> dict:
+    """
+    Check ledger entries written since the last run, up to
+    RECONCILE_SETTLE_SECONDS ago (on the first run, recompute every total
+    from the ledger first).
+    Chain breaks (an entry whose balance_after does not follow from the
+    previous one) are reported. A SponsorDrivers total that no longer matches
+    its last ledger entry is reset to the ledger, like the full recompute this
+    replaces, unless repair=False.
+    """
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    chain_breaks = []
+    checkpoints: dict[tuple, tuple] = {}
+    checked = 0
+    try:
+        settled_before = datetime.now() - timedelta(seconds=RECONCILE_SETTLE_SECONDS)
+        cursor.execute("SELECT last_audit_id FROM PointReconcileState WHERE id = 1")
+        state = cursor.fetchone()
+        if state is not None:
+            watermark = int(state["last_audit_id"])
+            recomputed = []
+        else:
+            watermark, recomputed = _recompute_totals(conn, cursor, settled_before, repair)
+
+        while True:
+            cursor.execute(
+                """
+                SELECT id, date, sponsor_id, driver_id, points_changed, balance_after
+                FROM audit_log
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (watermark, chunk_size),
+            )
+            fetched = cursor.fetchall()
+            # Stop at the first unsettled entry; the watermark must not pass an id still in flight
+            rows = []
+            for r in fetched:
+                if r["date"] is not None and r["date"] >= settled_before:
+                    break
+                rows.append(r)
+            if not rows:
+                break
+            entries = [
+                r for r in rows
+                if r["balance_after"] is not None and r["driver_id"] is not None and r["points_changed"] is not None
+            ]
+            # category is not in the seek; non-ledger rows carry no balance_after and drop out above
+            new_pairs = sorted({(int(r["sponsor_id"] or 0), int(r["driver_id"])) for r in entries} - checkpoints.keys())
+            if new_pairs:
+                placeholders, params = _pair_in(new_pairs)
+                cursor.execute(
+                    f"""
+                    SELECT sponsor_id, driver_id, last_audit_id, balance_after
+                    FROM PointBalanceCheckpoint
+                    WHERE (sponsor_id, driver_id) IN ({placeholders})
+                    """,
+                    params,
+                )
+                for cp in cursor.fetchall():
+                    checkpoints[(cp["sponsor_id"], cp["driver_id"])] = (int(cp["last_audit_id"]), int(cp["balance_after"]))
+
+            touched = set()
+            for r in entries:
+                key = (int(r["sponsor_id"] or 0), int(r["driver_id"]))
+                previous = checkpoints.get(key)
+                if previous is not None and previous[1] + int(r["points_changed"]) != int(r["balance_after"]):
+                    chain_breaks.append({
+                        "audit_id": r["id"],
+                        "sponsor_id": key[0],
+                        "driver_id": key[1],
+                        "expected_balance": previous[1] + int(r["points_changed"]),
+                        "balance_after": int(r["balance_after"]),
+                    })
+                checkpoints[key] = (int(r["id"]), int(r["balance_after"]))
+                touched.add(key)
+
+            if touched:
+                keys = sorted(touched)
+                cursor.execute(
+                    f"""
+                    INSERT INTO PointBalanceCheckpoint (sponsor_id, driver_id, last_audit_id, balance_after)
+                    VALUES {", ".join(["(%s, %s, %s, %s)"] * len(keys))}
+                    ON DUPLICATE KEY UPDATE
+                        last_audit_id = VALUES(last_audit_id),
+                        balance_after = VALUES(balance_after)
+                    """,
+                    tuple(v for key in keys for v in (*key, *checkpoints[key])),
+                )
+            watermark = int(rows[-1]["id"])
+            cursor.execute(
+                "UPDATE PointReconcileState SET last_audit_id = %s, checked_at = %s WHERE id = 1",
+                (watermark, datetime.now()),
+            )
+            conn.commit()
+            checked += len(entries)
+            if len(rows) < chunk_size:
+                break
+
+        mismatches = recomputed + (_compare_totals(conn, cursor, checkpoints, repair) if checkpoints else [])
+        for problem in chain_breaks:
+            print(f"Point ledger chain break: {problem}")
+        for problem in mismatches:
+            print(f"Point balance mismatch: {problem}")
+        return {
+            "entries_checked": checked,
+            "pairs_checked": len(checkpoints),
+            "chain_breaks": chain_breaks,
+            "mismatches": mismatches,
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _compare_totals(conn, cursor, checkpoints: dict, repair: bool) -> list[dict]:
+    pairs = sorted(checkpoints)
+    totals = {}
+    for start in range(0, len(pairs), RECONCILE_CHUNK_SIZE):
+        placeholders, params = _pair_in(pairs[start:start + RECONCILE_CHUNK_SIZE])
+        cursor.execute(
+            f"""
+            SELECT sponsor_driver_id, sponsor_user_id, driver_user_id, total_points
+            FROM SponsorDrivers
+            WHERE (sponsor_user_id, driver_user_id) IN ({placeholders})
+            ORDER BY sponsor_driver_id
+            """,
+            params,
+        )
+        for row in cursor.fetchall():
+            totals[(row["sponsor_user_id"], row["driver_user_id"])] = row
+
+    mismatches = []
+    for key in pairs:
+        row = totals.get(key)
+        last_audit_id, ledger_balance = checkpoints[key]
+        if row is None or int(row["total_points"]) == ledger_balance:
+            continue
+        mismatch = {
+            "sponsor_id": key[0],
+            "driver_id": key[1],
+            "total_points": int(row["total_points"]),
+            "ledger_balance": ledger_balance,
+            "repaired": False,
+        }
+        if repair:
+            mismatch["repaired"] = _repair_total(conn, cursor, row, ledger_balance, last_audit_id)
+        mismatches.append(mismatch)
+    return mismatches
+
+
+def _recompute_totals(conn, cursor, settled_before: datetime, repair: bool) -> tuple[int, list[dict]]:
+    """
+    First run: compare every SponsorDrivers total with the sum of its pair's
+    ledger, resetting it to the ledger unless repair=False, then create the
+    PointReconcileState row. Returns (watermark, mismatches).
+    """
+    cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM audit_log WHERE date < %s", (settled_before,))
+    watermark = int(cursor.fetchone()["last_id"])
+    cursor.execute(
+        """
+        SELECT sd.sponsor_driver_id, sd.sponsor_user_id, sd.driver_user_id, sd.total_points,
+               COALESCE(ledger.balance, 0) AS ledger_balance,
+               COALESCE(ledger.last_audit_id, 0) AS last_audit_id
+        FROM SponsorDrivers sd
+        LEFT JOIN (
+            SELECT sponsor_id, driver_id, SUM(points_changed) AS balance, MAX(id) AS last_audit_id
+            FROM audit_log
+            WHERE category = 'point_change' AND sponsor_id IS NOT NULL AND driver_id IS NOT NULL
+            GROUP BY sponsor_id, driver_id
+        ) ledger
+          ON ledger.sponsor_id = sd.sponsor_user_id
+         AND ledger.driver_id = sd.driver_user_id
+        WHERE sd.total_points <> COALESCE(ledger.balance, 0)
+        ORDER BY sd.sponsor_driver_id
+        """
+    )
+    mismatches = []
+    for row in cursor.fetchall():
+        mismatch = {
+            "sponsor_id": row["sponsor_user_id"],
+            "driver_id": row["driver_user_id"],
+            "total_points": int(row["total_points"]),
+            "ledger_balance": int(row["ledger_balance"]),
+            "repaired": False,
+        }
+        if repair:
+            mismatch["repaired"] = _repair_total(
+                conn, cursor, row, int(row["ledger_balance"]), int(row["last_audit_id"]),
+            )
+        mismatches.append(mismatch)
+
+    cursor.execute(
+        "INSERT IGNORE INTO PointReconcileState (id, last_audit_id, checked_at) VALUES (1, %s, %s)",
+        (watermark, datetime.now()),
+    )
+    conn.commit()
+    return watermark, mismatches
+
+
+def _repair_total(conn, cursor, row: dict, ledger_balance: int, last_audit_id: int) -> bool:
+    """Reset one SponsorDrivers row to its ledger balance. Returns whether it was updated."""
+    # Skip the repair if a newer ledger entry landed since we looked; it carries the live total
+    cursor.execute(
+        """
+        UPDATE SponsorDrivers
+        SET total_points = %s
+        WHERE sponsor_driver_id = %s
+          AND total_points = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM audit_log
+              WHERE driver_id = %s AND sponsor_id = %s AND category = 'point_change' AND id > %s
+          )
+        """,
+        (ledger_balance, row["sponsor_driver_id"], row["total_points"],
+         row["driver_user_id"], row["sponsor_user_id"], last_audit_id),
+    )
+    repaired = cursor.rowcount == 1
+    conn.commit()
+    return repaired
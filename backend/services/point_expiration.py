@@ -0,0 +1,239 @@
+"""
+point_expiration.py
+-------------------
+Purpose:
+    Expire unspent points from PointLots (see shared/point_ledger.py).
+
+How it works:
+    - A lot expires when its own expires_at passes (sponsor expiration_days at
+      award time), or when it is older than the sponsor's
+      point_expiration_settings policy.
+    - Per sponsor, PointExpirationWatermark remembers how far each of those
+      two orderings, (expires_at, lot_id) and (earned_at, lot_id), has been
+      processed. A run seeks past the watermark on idx_lots_expires /
+      idx_lots_earned, so it only reads lots that became expirable since the
+      last run.
+    - Lots are handled in chunks. Each chunk is one transaction: it zeroes
+      the lots, deducts per-driver totals from that sponsor's SponsorDrivers
+      row with one UPDATE, writes the audit rows in one insert, and advances
+      the watermark.
+    - Locks follow the write paths' order (SponsorDrivers, then PointLots).
+      Deadlocks retry the chunk.
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from shared.db import get_connection
+from shared.point_ledger import record_point_changes
+from services.purchase_service import run_with_deadlock_retry
+
+POINT_EXPIRATION_CHUNK_SIZE = int(os.getenv("POINT_EXPIRATION_CHUNK_SIZE", "1000"))
+SYSTEM_USER_ID = 0
+
+_EPOCH = datetime(1970, 1, 1)
+
+# lot column -> watermark (through, lot_id) columns
+_WATERMARK_COLUMNS = {
+    "expires_at": ("expires_through", "expires_lot_id"),
+    "earned_at": ("earned_through", "earned_lot_id"),
+}
+
+
+def ensure_point_expiration_schema() -> None:
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS PointExpirationWatermark (
+                sponsor_id INT PRIMARY KEY,
+                expires_through DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00',
+                expires_lot_id BIGINT NOT NULL DEFAULT 0,
+                earned_through DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00',
+                earned_lot_id BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _lock_balances(cursor, sponsor_id: int, drivers: list[int]) -> dict[int, dict]:
+    """Lock the drivers' SponsorDrivers rows with this sponsor; latest row per driver."""
+    cursor.execute(
+        f"""
+        SELECT sponsor_driver_id, driver_user_id, total_points
+        FROM SponsorDrivers
+        WHERE sponsor_user_id = %s AND driver_user_id IN ({", ".join(["%s"] * len(drivers))})
+        ORDER BY sponsor_driver_id
+        FOR UPDATE
+        """,
+        (sponsor_id, *drivers),
+    )
+    return {row["driver_user_id"]: row for row in cursor.fetchall()}
+
+
+def _deduct_balances(cursor, latest: dict[int, dict], expired_by_driver: dict[int, int]) -> dict[int, int]:
+    """Take expired points off each driver's SponsorDrivers row; never below zero."""
+    deductions = {}
+    for driver_id in sorted(expired_by_driver):
+        row = latest.get(driver_id)
+        if row is None:
+            continue  # driver left the program; the lots are still closed
+        amount = min(expired_by_driver[driver_id], max(int(row["total_points"]), 0))
+        if amount > 0:
+            deductions[driver_id] = (row["sponsor_driver_id"], amount)
+    if deductions:
+        selects = " UNION ALL ".join(["SELECT %s AS sponsor_driver_id, %s AS points"] * len(deductions))
+        cursor.execute(
+            f"""
+            UPDATE SponsorDrivers sd
+            JOIN ({selects}) v ON v.sponsor_driver_id = sd.sponsor_driver_id
+            SET sd.total_points = GREATEST(0, sd.total_points - v.points)
+            """,
+            tuple(value for pair in deductions.values() for value in pair),
+        )
+    return {driver_id: amount for driver_id, (_, amount) in deductions.items()}
+
+
+def _expire_chunk(cursor, sponsor_id: int, column: str, cutoff: datetime, mark: tuple,
+                  now: datetime, reason: str, changed_by_user_id: int, chunk_size: int):
+    """One chunk past the watermark. Returns (lots_scanned, new_mark, {driver_id: points_expired})."""
+    cursor.execute(
+        f"""
+        SELECT lot_id, driver_id, is_open, {column} AS mark_at
+        FROM PointLots
+        WHERE sponsor_id = %s
+          AND ({column}, lot_id) > (%s, %s)
+          AND {column} <= %s
+        ORDER BY {column}, lot_id
+        LIMIT %s
+        """,
+        (sponsor_id, mark[0], mark[1], cutoff, chunk_size),
+    )
+    candidates = cursor.fetchall()
+    if not candidates:
+        return 0, mark, {}
+
+    expired = {}
+    open_ids = [row["lot_id"] for row in candidates if row["is_open"]]
+    if open_ids:
+        # Balance rows first, like every other point write
+        latest = _lock_balances(cursor, sponsor_id, sorted({row["driver_id"] for row in candidates if row["is_open"]}))
+        placeholders = ", ".join(["%s"] * len(open_ids))
+        cursor.execute(
+            f"""
+            SELECT lot_id, driver_id, points_remaining
+            FROM PointLots
+            WHERE lot_id IN ({placeholders}) AND is_open = 1
+            FOR UPDATE
+            """,
+            tuple(open_ids),
+        )
+        lots = cursor.fetchall()
+        if lots:
+            cursor.execute(
+                f"UPDATE PointLots SET points_remaining = 0, is_open = 0 WHERE lot_id IN ({', '.join(['%s'] * len(lots))})",
+                tuple(lot["lot_id"] for lot in lots),
+            )
+            expired_by_driver: dict[int, int] = defaultdict(int)
+            for lot in lots:
+                expired_by_driver[lot["driver_id"]] += int(lot["points_remaining"])
+            expired = _deduct_balances(cursor, latest, expired_by_driver)
+            record_point_changes(cursor, [
+                {
+                    "sponsor_id": sponsor_id,
+                    "driver_id": driver_id,
+                    "points_changed": -points,
+                    "reason": reason,
+                    "changed_by_user_id": changed_by_user_id,
+                    "date": now,
+                    "skip_lots": True,
+                }
+                for driver_id, points in sorted(expired.items())
+            ])
+
+    last = candidates[-1]
+    new_mark = (last["mark_at"], last["lot_id"])
+    through_col, lot_col = _WATERMARK_COLUMNS[column]
+    cursor.execute(
+        f"""
+        INSERT INTO PointExpirationWatermark (sponsor_id, {through_col}, {lot_col})
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE {through_col} = VALUES({through_col}), {lot_col} = VALUES({lot_col})
+        """,
+        (sponsor_id, new_mark[0], new_mark[1]),
+    )
+    return len(candidates), new_mark, expired
+
+
+def _expire_range(conn, cursor, sponsor_id, column, cutoff, mark, now, reason, changed_by_user_id, chunk_size):
+    details = []
+    while True:
+        scanned, mark, expired = run_with_deadlock_retry(
+            conn,
+            lambda: _expire_chunk(cursor, sponsor_id, column, cutoff, mark, now, reason,
+                                  changed_by_user_id, chunk_size),
+        )
+        details.extend(
+            {"sponsor_id": sponsor_id, "driver_id": driver_id, "points_expired": points}
+            for driver_id, points in sorted(expired.items())
+        )
+        if scanned < chunk_size:
+            return details
+
+
+def run_point_expiration(
+    now: datetime | None = None,
+    changed_by_user_id: int = SYSTEM_USER_ID,
+    chunk_size: int = POINT_EXPIRATION_CHUNK_SIZE,
+) -> list[dict]:
+    """
+    Expire every lot that became expirable since the last run.
+    Returns one {"sponsor_id", "driver_id", "points_expired"} entry per
+    driver deduction made by this run.
+    """
+    now = now or datetime.now()
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            """
+            SELECT sponsor_id, expiration_months
+            FROM point_expiration_settings
+            WHERE auto_expire_enabled = TRUE
+            """
+        )
+        policies = {row["sponsor_id"]: row["expiration_months"] for row in cursor.fetchall()}
+        cursor.execute("SELECT DISTINCT sponsor_id FROM PointLots")
+        sponsor_ids = sorted(row["sponsor_id"] for row in cursor.fetchall())
+        cursor.execute("SELECT * FROM PointExpirationWatermark")
+        marks = {row["sponsor_id"]: row for row in cursor.fetchall()}
+        conn.commit()
+
+        details = []
+        for sponsor_id in sponsor_ids:
+            mark = marks.get(sponsor_id, {})
+            details += _expire_range(
+                conn, cursor, sponsor_id, "expires_at", now,
+                (mark.get("expires_through", _EPOCH), mark.get("expires_lot_id", 0)),
+                now, "Automatic expiration - points reached their expiration date",
+                changed_by_user_id, chunk_size,
+            )
+            months = policies.get(sponsor_id)
+            if months:
+                details += _expire_range(
+                    conn, cursor, sponsor_id, "earned_at", now - timedelta(days=30 * months),
+                    (mark.get("earned_through", _EPOCH), mark.get("earned_lot_id", 0)),
+                    now, f"Automatic expiration - points older than {months} months",
+                    changed_by_user_id, chunk_size,
+                )
+        return details
+    finally:
+        cursor.close()
+        conn.close()
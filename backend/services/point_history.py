@@ -0,0 +1,135 @@
+"""
+point_history.py
+----------------
+Purpose:
+    Driver point history reads: keyset pages on audit_log (date, id)
+    newest-first, and entry counts that lean on PointMonthlyRollup.
+
+A page seeks on idx_audit_driver_category_date (driver_id, category, date),
+whose entries carry the primary key, so reading page 500 of a 100k-entry
+ledger costs the same as page 1. Counts take whole months from the rollup and
+only scan audit_log for the partial months at either end of the range.
+"""
+
+from datetime import datetime
+
+from shared.pagination import encode_cursor, decode_cursor
+from shared.point_ledger import month_start
+
+POINT_HISTORY_MAX_PAGE_SIZE = 500
+POINT_HISTORY_CURSOR = "point_history"
+
+
+def _history_filters(driver_id: int, sponsor_id: int | None, start: datetime | None, end: datetime | None):
+    where = ["category = 'point_change'", "driver_id = %s"]
+    params: list = [driver_id]
+    if sponsor_id is not None:
+        where.append("sponsor_id = %s")
+        params.append(sponsor_id)
+    if start is not None:
+        where.append("date >= %s")
+        params.append(start)
+    if end is not None:
+        where.append("date < %s")
+        params.append(end)
+    return where, params
+
+
+def get_point_history_page(
+    cursor,
+    driver_id: int,
+    limit: int | None,
+    after: str | None = None,
+    sponsor_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    offset: int = 0,
+) -> dict:
+    """
+    Newest-first point changes in [start, end). limit=None returns every
+    entry (legacy callers). offset is only honoured without a cursor, for
+    clients that still page by offset.
+    """
+    where, params = _history_filters(driver_id, sponsor_id, start, end)
+    if after:
+        last_date, last_id = decode_cursor(after, POINT_HISTORY_CURSOR, size=2)
+        where.append("(date, id) < (%s, %s)")
+        params.extend([last_date, last_id])
+
+    sql = f"""
+        SELECT id, date, points_changed, balance_after, reason, changed_by_user_id, expires_at
+        FROM audit_log
+        WHERE {" AND ".join(where)}
+        ORDER BY date DESC, id DESC
+    """
+    if limit is not None:
+        limit = max(1, min(int(limit), POINT_HISTORY_MAX_PAGE_SIZE))
+        sql += " LIMIT %s"
+        params.append(limit + 1)
+        if offset and not after:
+            sql += " OFFSET %s"
+            params.append(int(offset))
+    cursor.execute(sql, tuple(params))
+    rows = cursor.fetchall()
+
+    has_more = limit is not None and len(rows) > limit
+    history = rows[:limit] if limit is not None else rows
+    next_cursor = None
+    if has_more:
+        last = history[-1]
+        next_cursor = encode_cursor(POINT_HISTORY_CURSOR, [last["date"], last["id"]])
+    return {"history": history, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + (value.month == 12), value.month % 12 + 1, 1)
+
+
+def count_point_history(
+    cursor,
+    driver_id: int,
+    sponsor_id: int | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+) -> int:
+    """Number of point changes in [start, end): whole months from the rollup, edges from audit_log."""
+    # Whole months covered by the range: [first_full, last_full)
+    first_full = None
+    if start is not None:
+        first_full = datetime.combine(month_start(start), datetime.min.time())
+        if first_full != start:
+            first_full = _next_month(start)
+    last_full = datetime.combine(month_start(end), datetime.min.time()) if end is not None else None
+
+    if first_full is not None and last_full is not None and first_full >= last_full:
+        # Range sits inside a single month
+        return _count_audit(cursor, driver_id, sponsor_id, start, end)
+
+    where = ["driver_id = %s"]
+    params: list = [driver_id]
+    if sponsor_id is not None:
+        where.append("sponsor_id = %s")
+        params.append(sponsor_id)
+    if first_full is not None:
+        where.append("month_start >= %s")
+        params.append(first_full.date())
+    if last_full is not None:
+        where.append("month_start < %s")
+        params.append(last_full.date())
+    cursor.execute(
+        f"SELECT COALESCE(SUM(transaction_count), 0) AS cnt FROM PointMonthlyRollup WHERE {' AND '.join(where)}",
+        tuple(params),
+    )
+    total = int(cursor.fetchone()["cnt"])
+
+    if start is not None and first_full != start:
+        total += _count_audit(cursor, driver_id, sponsor_id, start, first_full)
+    if end is not None and last_full != end:
+        total += _count_audit(cursor, driver_id, sponsor_id, last_full, end)
+    return total
+
+
+def _count_audit(cursor, driver_id, sponsor_id, start, end) -> int:
+    where, params = _history_filters(driver_id, sponsor_id, start, end)
+    cursor.execute(f"SELECT COUNT(*) AS cnt FROM audit_log WHERE {' AND '.join(where)}", tuple(params))
+    return int(cursor.fetchone()["cnt"])
@@ -0,0 +1,120 @@
+"""
+point_upload.py
+---------------
+Purpose:
+    Apply a parsed username|points|reason upload for one sponsor as a few
+    set-based statements instead of a lookup, update and audit insert per line.
+
+Per chunk of POINT_UPLOAD_CHUNK_SIZE records (all inside the caller's
+transaction):
+    1. prefetch: one Users JOIN SponsorDrivers query for every username in the
+       chunk, locking those balance rows;
+    2. apply: one UPDATE ... JOIN over the per-driver sums, then one ledger
+       batch (shared/point_ledger.py) with an entry per line.
+A username listed on several lines gets one balance update and one ledger
+entry per line, each carrying the running total after that line.
+"""
+
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from shared.point_ledger import record_point_changes
+
+POINT_UPLOAD_CHUNK_SIZE = int(os.getenv("POINT_UPLOAD_CHUNK_SIZE", "1000"))
+
+
+def _prefetch_drivers(cursor, sponsor_id: int, usernames: list[str]) -> dict[str, dict]:
+    """username (case-folded, like the column collation) -> the sponsor's driver row, locked."""
+    cursor.execute(
+        f"""
+        SELECT u.user_id, u.username, sd.total_points
+        FROM Users u
+        JOIN SponsorDrivers sd
+          ON sd.driver_user_id = u.user_id
+        WHERE sd.sponsor_user_id = %s
+          AND u.username IN ({", ".join(["%s"] * len(usernames))})
+        ORDER BY sd.sponsor_driver_id
+        FOR UPDATE
+        """,
+        (sponsor_id, *usernames),
+    )
+    return {row["username"].casefold(): row for row in cursor.fetchall()}
+
+
+def _apply_chunk(cursor, sponsor_id: int, records: list[dict], expires_at: datetime | None,
+                 changed_by_user_id: int, timings: dict) -> tuple[list[dict], list[dict]]:
+    started = time.perf_counter()
+    drivers = _prefetch_drivers(cursor, sponsor_id, sorted({r["username"] for r in records}))
+    prefetched = time.perf_counter()
+
+    changes, errors = [], []
+    running: dict[int, int] = {}
+    added: dict[int, int] = defaultdict(int)
+    for record in records:
+        driver = drivers.get(record["username"].casefold())
+        if not driver:
+            errors.append({
+                "line_number": record["line_number"],
+                "raw_line": record["raw_line"],
+                "reason": f"Driver '{record['username']}' not found for your organization.",
+            })
+            continue
+        driver_id = driver["user_id"]
+        running[driver_id] = running.get(driver_id, int(driver["total_points"])) + record["points"]
+        added[driver_id] += record["points"]
+        changes.append({
+            "sponsor_id": sponsor_id,
+            "driver_id": driver_id,
+            "points_changed": record["points"],
+            "reason": record["reason"],
+            "changed_by_user_id": changed_by_user_id,
+            "expires_at": expires_at,
+            "new_total": running[driver_id],
+        })
+
+    if added:
+        driver_ids = sorted(added)
+        selects = " UNION ALL ".join(["SELECT %s AS driver_user_id, %s AS points"] * len(driver_ids))
+        cursor.execute(
+            f"""
+            UPDATE SponsorDrivers sd
+            JOIN ({selects}) v ON v.driver_user_id = sd.driver_user_id
+            SET sd.total_points = sd.total_points + v.points
+            WHERE sd.sponsor_user_id = %s
+            """,
+            (*(value for driver_id in driver_ids for value in (driver_id, added[driver_id])), sponsor_id),
+        )
+        record_point_changes(cursor, changes)
+    applied = time.perf_counter()
+
+    timings["prefetch"] = timings.get("prefetch", 0.0) + (prefetched - started) * 1000
+    timings["apply"] = timings.get("apply", 0.0) + (applied - prefetched) * 1000
+    return changes, errors
+
+
+def apply_point_upload(
+    cursor,
+    sponsor_id: int,
+    records: list[dict],
+    expires_at: datetime | None,
+    changed_by_user_id: int,
+    timings: dict | None = None,
+    chunk_size: int = POINT_UPLOAD_CHUNK_SIZE,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Add every record's points to the named driver. Does not commit.
+    Returns (changes, errors): one change per applied line, in file order,
+    with the driver's new_total after it; one error per unknown username.
+    Stage times in milliseconds are added to timings when given.
+    """
+    timings = timings if timings is not None else {}
+    changes, errors = [], []
+    for start in range(0, len(records), chunk_size):
+        chunk_changes, chunk_errors = _apply_chunk(
+            cursor, sponsor_id, records[start:start + chunk_size], expires_at, changed_by_user_id, timings,
+        )
+        changes += chunk_changes
+        errors += chunk_errors
+    return changes, errors
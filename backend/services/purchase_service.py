@@ -0,0 +1,498 @@
+"""
+purchase_service.py
+-------------------
+Purpose:
+    Atomic catalog purchases (driver redemptions and sponsor-placed orders).
+
+How it works:
+    - Stock and points are taken with conditional UPDATEs
+      (stock_quantity > 0, total_points >= cost) and a rowcount check, so two
+      buyers can never oversell the last item or overdraw a balance.
+    - LAST_INSERT_ID(expr) hands back the new stock / balance from the UPDATE
+      itself (MySQL has no RETURNING), so nothing is re-read after commit.
+    - Locks are always taken stock first, then points, and deadlocks or lock
+      wait timeouts (1213 / 1205) retry the whole transaction.
+    - An optional Idempotency-Key replays the stored result instead of
+      charging twice when a client retries. The key is stored with a
+      fingerprint of the request; reusing it for a different request is
+      rejected (422) instead of replaying the other request's result.
+"""
+
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from mysql.connector import Error as MySQLError
+
+from shared.db import get_connection
+from shared.point_ledger import record_point_change, record_point_changes, record_order_lots
+from services.catalog.catalog_cache import bump_catalog_version
+
+PURCHASE_MAX_RETRIES = int(os.getenv("PURCHASE_MAX_RETRIES", "3"))
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+RETRYABLE_MYSQL_ERRORS = {1213, 1205}  # ER_LOCK_DEADLOCK, ER_LOCK_WAIT_TIMEOUT
+
+# Orders columns a caller may fill in addition to the core order fields
+ORDER_METADATA_COLUMNS = ("purchase_ip_address", "purchase_device_name", "purchase_browser_name", "purchase_os_name")
+
+
+class PurchaseError(Exception):
+    """Purchase rejected; status_code/detail map straight onto an HTTP error, code says why."""
+
+    def __init__(self, status_code: int, detail: str, code: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.code = code
+
+
+def ensure_purchase_idempotency_table(cursor=None) -> None:
+    own_connection = cursor is None
+    if own_connection:
+        conn = get_connection()
+        cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS PurchaseIdempotency (
+                user_id INT NOT NULL,
+                idempotency_key VARCHAR(128) NOT NULL,
+                request_fingerprint CHAR(64) NULL,
+                response_json TEXT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, idempotency_key),
+                INDEX idx_purchase_idempotency_created (created_at)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PurchaseIdempotency'
+              AND COLUMN_NAME = 'request_fingerprint'
+            """
+        )
+        if cursor.fetchone() is None:
+            cursor.execute("ALTER TABLE PurchaseIdempotency ADD COLUMN request_fingerprint CHAR(64) NULL AFTER idempotency_key")
+        if own_connection:
+            conn.commit()
+    finally:
+        if own_connection:
+            cursor.close()
+            conn.close()
+
+
+def purge_expired_idempotency_keys() -> int:
+    """Scheduler job: drop keys older than IDEMPOTENCY_KEY_TTL_HOURS."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "DELETE FROM PurchaseIdempotency WHERE created_at < %s",
+            (datetime.utcnow() - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),),
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def request_fingerprint(operation: str, **fields) -> str:
+    """Stable hash of what a request asks for, stored next to its Idempotency-Key."""
+    payload = json.dumps({"operation": operation, **fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _claim_idempotency_key(cursor, user_id: int, key: str, fingerprint: str) -> dict | None:
+    """
+    Claim the key inside the purchase transaction. A concurrent request with
+    the same key blocks on the primary key until this one commits (and then
+    replays) or rolls back (and then runs itself). Returns the stored result
+    when the key was already used for the same request; a key already used
+    for a different request (another item, cart or endpoint: the operation
+    is part of the fingerprint) raises a 422.
+    """
+    cursor.execute(
+        "INSERT IGNORE INTO PurchaseIdempotency (user_id, idempotency_key, request_fingerprint) VALUES (%s, %s, %s)",
+        (user_id, key, fingerprint),
+    )
+    if cursor.rowcount:
+        return None
+    cursor.execute(
+        """
+        SELECT request_fingerprint, response_json
+        FROM PurchaseIdempotency
+        WHERE user_id = %s AND idempotency_key = %s
+        """,
+        (user_id, key),
+    )
+    row = cursor.fetchone()
+    if row and row["request_fingerprint"] != fingerprint:
+        raise PurchaseError(
+            422, "This Idempotency-Key was already used for a different request", "idempotency_key_reused",
+        )
+    stored = row["response_json"] if row else None
+    if not stored:
+        raise PurchaseError(409, "A request with this Idempotency-Key is already being processed", "in_progress")
+    return {**json.loads(stored), "replayed": True}
+
+
+def _store_idempotent_result(cursor, user_id: int, key: str, result: dict) -> None:
+    cursor.execute(
+        "UPDATE PurchaseIdempotency SET response_json = %s WHERE user_id = %s AND idempotency_key = %s",
+        (json.dumps(result, default=str), user_id, key),
+    )
+
+
+def _explain_missing_item(cursor, item_id: str, sponsor_id: int) -> PurchaseError:
+    """Only runs on the failure path: say why the stock UPDATE matched nothing."""
+    cursor.execute(
+        """
+        SELECT stock_quantity, is_active, is_published
+        FROM SponsorCatalog
+        WHERE item_id = %s AND sponsor_user_id = %s
+        """,
+        (item_id, sponsor_id),
+    )
+    row = cursor.fetchone()
+    if not row or not row["is_active"] or not row["is_published"]:
+        return PurchaseError(404, "Item not available for purchase", "unavailable")
+    return PurchaseError(400, "This item is out of stock.", "out_of_stock")
+
+
+def _take_stock(cursor, item_id: str, sponsor_id: int) -> dict:
+    """Decrement stock by one; returns the locked item with its new stock."""
+    cursor.execute(
+        """
+        UPDATE SponsorCatalog
+        SET stock_quantity = LAST_INSERT_ID(stock_quantity - 1)
+        WHERE item_id = %s AND sponsor_user_id = %s
+          AND stock_quantity > 0
+          AND is_active = TRUE AND is_published = TRUE
+        """,
+        (item_id, sponsor_id),
+    )
+    if cursor.rowcount != 1:
+        raise _explain_missing_item(cursor, item_id, sponsor_id)
+    remaining_stock = cursor.lastrowid or 0
+    # Row is already X-locked by this transaction, so this read is stable
+    cursor.execute(
+        "SELECT title, points_cost FROM SponsorCatalog WHERE item_id = %s AND sponsor_user_id = %s",
+        (item_id, sponsor_id),
+    )
+    item = cursor.fetchone()
+    return {"item_id": item_id, "title": item["title"], "points_cost": int(item["points_cost"] or 0),
+            "remaining_stock": remaining_stock}
+
+
+def _charge_points(cursor, driver_id: int, sponsor_id: int, item: dict) -> int:
+    """Deduct the item's cost from the driver's latest SponsorDrivers row; returns the new balance."""
+    cost = item["points_cost"]
+    cursor.execute(
+        """
+        UPDATE SponsorDrivers sd
+        JOIN (
+            SELECT MAX(sponsor_driver_id) AS sponsor_driver_id
+            FROM SponsorDrivers
+            WHERE driver_user_id = %s AND sponsor_user_id = %s
+        ) latest ON latest.sponsor_driver_id = sd.sponsor_driver_id
+        SET sd.total_points = LAST_INSERT_ID(sd.total_points - %s)
+        WHERE sd.total_points >= %s
+        """,
+        (driver_id, sponsor_id, cost, cost),
+    )
+    if cursor.rowcount == 1:
+        return cursor.lastrowid or 0
+
+    cursor.execute(
+        """
+        SELECT total_points
+        FROM SponsorDrivers
+        WHERE driver_user_id = %s AND sponsor_user_id = %s
+        ORDER BY sponsor_driver_id DESC
+        LIMIT 1
+        """,
+        (driver_id, sponsor_id),
+    )
+    row = cursor.fetchone()
+    if not row:
+        raise PurchaseError(404, "No sponsor relationship found", "no_relationship")
+    balance = int(row["total_points"] or 0)
+    raise PurchaseError(
+        400, f"Insufficient points. '{item['title']}' costs {cost} pts but the balance is {balance} pts. "
+             f"{cost - balance} more needed.",
+        "insufficient_points",
+    )
+
+
+def _insert_order(cursor, driver_id: int, sponsor_id: int, item: dict, now: datetime, order_metadata: dict) -> int:
+    columns = ["driver_user_id", "sponsor_user_id", "item_id", "item_title", "points_cost",
+               "status", "created_at", "updated_at"]
+    values = [driver_id, sponsor_id, item["item_id"], item["title"], item["points_cost"], "pending", now, now]
+    for column in ORDER_METADATA_COLUMNS:
+        if column in order_metadata:
+            columns.append(column)
+            values.append(order_metadata[column])
+    cursor.execute(
+        f"INSERT INTO Orders ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(values))})",
+        tuple(values),
+    )
+    return cursor.lastrowid
+
+
+def _is_retryable(e: Exception) -> bool:
+    return isinstance(e, MySQLError) and getattr(e, "errno", None) in RETRYABLE_MYSQL_ERRORS
+
+
+def run_with_deadlock_retry(conn, work):
+    """Run work() as one transaction, retrying on deadlock / lock wait timeout."""
+    attempt = 0
+    while True:
+        try:
+            result = work()
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            if not _is_retryable(e) or attempt >= PURCHASE_MAX_RETRIES:
+                raise
+            attempt += 1
+            time.sleep(random.uniform(0, 0.05 * (2 ** attempt)))
+
+
+def purchase_item(
+    driver_id: int,
+    sponsor_id: int,
+    item_id: str,
+    changed_by_user_id: int,
+    reason_prefix: str,
+    idempotency_key: str | None = None,
+    order_metadata: dict | None = None,
+    before_commit=None,
+) -> dict:
+    """
+    Buy one unit of item_id for driver_id from sponsor_id's catalog.
+
+    Returns {"order_id", "item_id", "title", "points_cost", "new_points_balance",
+    "remaining_stock", "replayed"}; raises PurchaseError when the purchase is not
+    possible. before_commit(cursor, result) runs inside the transaction, for
+    writes that must commit together with the order (e.g. a Notification).
+    """
+    order_metadata = order_metadata or {}
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    def work():
+        if idempotency_key:
+            replay = _claim_idempotency_key(
+                cursor, changed_by_user_id, idempotency_key,
+                request_fingerprint("purchase_item", driver_id=driver_id, sponsor_id=sponsor_id, item_id=item_id),
+            )
+            if replay:
+                return replay
+
+        item = _take_stock(cursor, item_id, sponsor_id)
+        new_balance = _charge_points(cursor, driver_id, sponsor_id, item)
+        now = datetime.utcnow()
+        ledger_row = record_point_change(
+            cursor, sponsor_id, driver_id, -item["points_cost"],
+            f"{reason_prefix}{item['title']}", changed_by_user_id, changed_at=now,
+        )
+        order_id = _insert_order(cursor, driver_id, sponsor_id, item, now, order_metadata)
+        record_order_lots(cursor, {order_id: ledger_row.get("consumed_lots", [])})
+        bump_catalog_version(cursor, sponsor_id)
+
+        result = {
+            "order_id": order_id,
+            "item_id": item_id,
+            "title": item["title"],
+            "points_cost": item["points_cost"],
+            "new_points_balance": new_balance,
+            "remaining_stock": item["remaining_stock"],
+            "placed_at": now.strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "replayed": False,
+        }
+        if before_commit:
+            before_commit(cursor, result)
+        if idempotency_key:
+            _store_idempotent_result(cursor, changed_by_user_id, idempotency_key, result)
+        return result
+
+    try:
+        return run_with_deadlock_retry(conn, work)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _lock_cart_items(cursor, sponsor_id: int, quantities: dict[str, int]) -> dict[str, dict]:
+    """FOR UPDATE in item_id order so two overlapping carts always lock in the same sequence."""
+    item_ids = sorted(quantities)
+    cursor.execute(
+        f"""
+        SELECT item_id, title, points_cost, stock_quantity, is_active, is_published
+        FROM SponsorCatalog
+        WHERE sponsor_user_id = %s AND item_id IN ({", ".join(["%s"] * len(item_ids))})
+        ORDER BY item_id
+        FOR UPDATE
+        """,
+        (sponsor_id, *item_ids),
+    )
+    return {row["item_id"]: row for row in cursor.fetchall()}
+
+
+def checkout_cart(
+    driver_id: int,
+    sponsor_id: int,
+    quantities: dict[str, int],
+    idempotency_key: str | None = None,
+    order_metadata: dict | None = None,
+) -> dict:
+    """
+    Buy every cart line in one transaction: all items and the balance are
+    validated together, then stock, points, audit rows and orders are written
+    with one statement each. One Orders row is created per unit, as with
+    single purchases, so each unit can be cancelled on its own.
+    """
+    order_metadata = order_metadata or {}
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    def work():
+        if idempotency_key:
+            replay = _claim_idempotency_key(
+                cursor, driver_id, idempotency_key,
+                request_fingerprint("checkout_cart", driver_id=driver_id, sponsor_id=sponsor_id,
+                                    lines=sorted(quantities.items())),
+            )
+            if replay:
+                return replay
+
+        # Lock order matches purchase_item: stock rows first, then points
+        items = _lock_cart_items(cursor, sponsor_id, quantities)
+        problems = []
+        for item_id in sorted(quantities):
+            item = items.get(item_id)
+            if not item or not item["is_active"] or not item["is_published"]:
+                problems.append(f"'{item_id}' is not available for purchase")
+            elif item["stock_quantity"] < quantities[item_id]:
+                problems.append(f"'{item['title']}' has only {item['stock_quantity']} left in stock")
+        if problems:
+            raise PurchaseError(400, "; ".join(problems), "cart_invalid")
+
+        total_cost = sum(int(items[i]["points_cost"] or 0) * q for i, q in quantities.items())
+        cursor.execute(
+            """
+            SELECT sponsor_driver_id, total_points
+            FROM SponsorDrivers
+            WHERE driver_user_id = %s AND sponsor_user_id = %s
+            ORDER BY sponsor_driver_id DESC
+            LIMIT 1
+            FOR UPDATE
+            """,
+            (driver_id, sponsor_id),
+        )
+        driver_row = cursor.fetchone()
+        if not driver_row:
+            raise PurchaseError(404, "No sponsor relationship found", "no_relationship")
+        balance = int(driver_row["total_points"] or 0)
+        if balance < total_cost:
+            raise PurchaseError(
+                400, f"Insufficient points. Cart total is {total_cost} pts but the balance is {balance} pts. "
+                     f"{total_cost - balance} more needed.",
+                "insufficient_points",
+            )
+
+        lines = sorted(quantities.items())
+        selects = " UNION ALL ".join(["SELECT %s AS item_id, %s AS quantity"] * len(lines))
+        cursor.execute(
+            f"""
+            UPDATE SponsorCatalog sc
+            JOIN ({selects}) v ON v.item_id = sc.item_id
+            SET sc.stock_quantity = sc.stock_quantity - v.quantity
+            WHERE sc.sponsor_user_id = %s
+            """,
+            (*[value for line in lines for value in line], sponsor_id),
+        )
+        cursor.execute(
+            "UPDATE SponsorDrivers SET total_points = total_points - %s WHERE sponsor_driver_id = %s",
+            (total_cost, driver_row["sponsor_driver_id"]),
+        )
+
+        # Whole seconds so the created_at lookup below matches what DATETIME stores
+        now = datetime.utcnow().replace(microsecond=0)
+        units = [items[item_id] for item_id, quantity in lines for _ in range(quantity)]
+        ledger_rows = record_point_changes(cursor, [
+            {
+                "sponsor_id": sponsor_id,
+                "driver_id": driver_id,
+                "points_changed": -int(unit["points_cost"] or 0),
+                "reason": f"Redeemed: {unit['title']}",
+                "changed_by_user_id": driver_id,
+                "date": now,
+            }
+            for unit in units
+        ])
+
+        columns = ["driver_user_id", "sponsor_user_id", "item_id", "item_title", "points_cost",
+                   "status", "created_at", "updated_at"]
+        metadata_columns = [c for c in ORDER_METADATA_COLUMNS if c in order_metadata]
+        columns += metadata_columns
+        row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        cursor.execute(
+            f"INSERT INTO Orders ({', '.join(columns)}) VALUES {', '.join([row_placeholders] * len(units))}",
+            tuple(value for unit in units for value in (
+                driver_id, sponsor_id, unit["item_id"], unit["title"], int(unit["points_cost"] or 0),
+                "pending", now, now, *[order_metadata[c] for c in metadata_columns],
+            )),
+        )
+        first_order_id = cursor.lastrowid
+        cursor.execute(
+            """
+            SELECT order_id, item_id
+            FROM Orders
+            WHERE order_id >= %s AND driver_user_id = %s AND created_at = %s
+            ORDER BY order_id
+            LIMIT %s
+            """,
+            (first_order_id, driver_id, now, len(units)),
+        )
+        order_rows = cursor.fetchall()
+        # Orders were inserted in unit order, so row i paid for order i
+        record_order_lots(cursor, {
+            row["order_id"]: ledger_row.get("consumed_lots", [])
+            for row, ledger_row in zip(order_rows, ledger_rows)
+        })
+        bump_catalog_version(cursor, sponsor_id)
+
+        result = {
+            "order_ids": [row["order_id"] for row in order_rows],
+            "items": [
+                {
+                    "item_id": item_id,
+                    "title": items[item_id]["title"],
+                    "quantity": quantity,
+                    "points_cost": int(items[item_id]["points_cost"] or 0),
+                    "remaining_stock": items[item_id]["stock_quantity"] - quantity,
+                }
+                for item_id, quantity in lines
+            ],
+            "total_points_spent": total_cost,
+            "new_points_balance": balance - total_cost,
+            "placed_at": now.strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "replayed": False,
+        }
+        if idempotency_key:
+            _store_idempotent_result(cursor, driver_id, idempotency_key, result)
+        return result
+
+    try:
+        return run_with_deadlock_retry(conn, work)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,72 @@
+"""
+etag.py
+-------
+Purpose:
+    Conditional GET (ETag / If-None-Match) helpers for read-heavy endpoints.
+
+Responsibilities:
+    - Build weak ETags from data version counters (no body needed) or from
+      the rows an endpoint already fetched
+    - Compare them against the request's If-None-Match header
+    - Produce the 304 response, or stamp the ETag on the normal response
+
+Usage:
+    from shared.etag import etag_from_parts, is_not_modified, not_modified_response
+    etag = etag_from_parts("catalog", sponsor_id, version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag
+"""
+
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Request, Response
+
+# Clients must revalidate every time, but may keep the body and send If-None-Match
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+def _weak(digest_source: bytes) -> str:
+    return f'W/"{hashlib.sha1(digest_source).hexdigest()[:32]}"'
+
+
+def etag_from_parts(*parts) -> str:
+    """ETag from version counters / ids; cheap enough to compute before loading the body."""
+    return _weak("|".join(str(p) for p in parts).encode())
+
+
+def etag_from_rows(rows, *parts) -> str:
+    """ETag from already-fetched rows, for data that has no version counter."""
+    payload = json.dumps([list(parts), rows], default=_default, sort_keys=True, separators=(",", ":"))
+    return _weak(payload.encode())
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110 13.1.2): ignore the W/ prefix on both sides
+    wanted = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == wanted for candidate in header.split(","))
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
@@ -0,0 +1,13 @@
+-- Migration: Add aggregation fields to APIErrorLog
+-- Purpose: Identical eBay failures (sponsor, operation, endpoint template, status)
+-- within one flush window are stored as a single row with a count
+
+USE Team27_DB;
+
+ALTER TABLE APIErrorLog
+    ADD COLUMN occurrence_count INT NOT NULL DEFAULT 1,
+    ADD COLUMN first_seen_at DATETIME NULL,
+    ADD COLUMN last_seen_at DATETIME NULL;
+
+-- endpoint now holds the route template (query string dropped, item ids -> {itemId})
+-- occurred_at is set to last_seen_at so existing ORDER BY occurred_at keeps working
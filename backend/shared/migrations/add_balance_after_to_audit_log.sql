@@ -0,0 +1,45 @@
+-- Migration: Add running balance_after to point ledger entries
+-- Purpose: Each 'point_change' row records the driver's total_points with that
+-- sponsor right after the change, so as-of balances are a single index probe
+-- and reconciliation only checks entries written since its last run
+
+USE Team27_DB;
+
+ALTER TABLE audit_log
+    ADD COLUMN balance_after INT DEFAULT NULL;
+
+CREATE INDEX idx_audit_pair_category_date ON audit_log (driver_id, sponsor_id, category, date);
+
+-- Optional backfill (MySQL 8.0+): anchor existing history to today's totals,
+-- stepping back through later changes. The application also works without it.
+UPDATE audit_log a
+JOIN (
+    SELECT al.id,
+           sd.total_points
+             - (SUM(al.points_changed) OVER (
+                    PARTITION BY al.sponsor_id, al.driver_id
+                    ORDER BY al.date DESC, al.id DESC
+                ) - al.points_changed) AS balance_after
+    FROM audit_log al
+    JOIN SponsorDrivers sd
+      ON sd.sponsor_user_id = al.sponsor_id AND sd.driver_user_id = al.driver_id
+    WHERE al.category = 'point_change'
+) running ON running.id = a.id
+SET a.balance_after = running.balance_after;
+
+CREATE TABLE IF NOT EXISTS PointBalanceCheckpoint (
+    sponsor_id    INT NOT NULL,
+    driver_id     INT NOT NULL,
+    last_audit_id BIGINT NOT NULL,
+    balance_after INT NOT NULL,
+    PRIMARY KEY (sponsor_id, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS PointReconcileState (
+    id            TINYINT PRIMARY KEY,
+    last_audit_id BIGINT NOT NULL DEFAULT 0,
+    checked_at    DATETIME DEFAULT NULL
+);
+
+-- No state row here: the first reconciliation run recomputes every total from
+-- the ledger, then creates it and checks incrementally from there on.
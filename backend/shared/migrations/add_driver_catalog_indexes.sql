@@ -0,0 +1,13 @@
+-- Migration: Indexes for paginated driver catalog browsing
+-- Purpose: Every sort offered by /api/driver/catalog seeks on
+-- (sponsor, published, active, <sort column>, item_id) instead of sorting
+-- the sponsor's whole catalog per page
+
+USE Team27_DB;
+
+CREATE INDEX idx_sc_driver_title   ON SponsorCatalog (sponsor_user_id, is_published, is_active, title, item_id);
+CREATE INDEX idx_sc_driver_points  ON SponsorCatalog (sponsor_user_id, is_published, is_active, points_cost, item_id);
+CREATE INDEX idx_sc_driver_rating  ON SponsorCatalog (sponsor_user_id, is_published, is_active, rating, item_id);
+CREATE INDEX idx_sc_driver_newest  ON SponsorCatalog (sponsor_user_id, is_published, is_active, created_at, item_id);
+
+-- saved_only probes SavedProducts through the existing uq_driver_item (driver_user_id, item_id) key
@@ -0,0 +1,12 @@
+-- Migration: Composite indexes for paginated order history
+-- Purpose: Driver and sponsor order pages seek on (created_at, order_id)
+-- newest-first, optionally within one status, and the summary endpoints count
+-- by status, all without scanning a long-tenured account's full history.
+-- InnoDB appends the primary key (order_id) to every secondary index.
+
+USE Team27_DB;
+
+CREATE INDEX idx_orders_driver_created  ON Orders (driver_user_id, created_at);
+CREATE INDEX idx_orders_driver_status   ON Orders (driver_user_id, status, created_at);
+CREATE INDEX idx_orders_sponsor_created ON Orders (sponsor_user_id, created_at);
+CREATE INDEX idx_orders_sponsor_status  ON Orders (sponsor_user_id, status, created_at);
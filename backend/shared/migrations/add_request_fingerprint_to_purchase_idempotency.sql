@@ -0,0 +1,9 @@
+-- Migration: Add request_fingerprint to PurchaseIdempotency
+-- Purpose: Remember what each Idempotency-Key was used for, so a key reused
+-- for a different driver, item or cart is rejected instead of replaying the
+-- first request's result
+
+USE Team27_DB;
+
+ALTER TABLE PurchaseIdempotency
+    ADD COLUMN request_fingerprint CHAR(64) NULL AFTER idempotency_key;  -- sha256 of the request (services/purchase_service.py)
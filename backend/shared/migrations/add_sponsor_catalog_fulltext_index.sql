@@ -0,0 +1,7 @@
+-- Migration: FULLTEXT index for driver catalog search
+-- Purpose: /api/driver/catalog/search ranks SponsorCatalog titles with
+-- MATCH ... AGAINST (BOOLEAN MODE) instead of drivers filtering the full list client-side
+
+USE Team27_DB;
+
+ALTER TABLE SponsorCatalog ADD FULLTEXT INDEX ft_sc_title (title);
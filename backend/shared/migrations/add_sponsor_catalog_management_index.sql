@@ -0,0 +1,7 @@
+-- Migration: Index for the paged sponsor catalog management API
+-- Purpose: GET /api/sponsor/catalog/items seeks on (created_at, item_id) newest-first
+-- within one sponsor instead of sorting the whole catalog
+
+USE Team27_DB;
+
+CREATE INDEX idx_sc_sponsor_created ON SponsorCatalog (sponsor_user_id, created_at, item_id);
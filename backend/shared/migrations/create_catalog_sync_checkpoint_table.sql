@@ -0,0 +1,15 @@
+-- Migration: Create CatalogSyncCheckpoint table
+-- Purpose: Remember where the background SponsorCatalog/eBay sync stopped
+-- so large catalogs are refreshed incrementally across scheduler runs
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS CatalogSyncCheckpoint (
+    checkpoint_id        TINYINT PRIMARY KEY,              -- single row (1)
+    last_sponsor_user_id INT NOT NULL DEFAULT 0,           -- keyset position: (sponsor_user_id, item_id)
+    last_item_id         VARCHAR(64) NOT NULL DEFAULT '',
+    passes_completed     INT NOT NULL DEFAULT 0,
+    updated_at           TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO CatalogSyncCheckpoint (checkpoint_id) VALUES (1);
@@ -0,0 +1,22 @@
+-- Migration: Create PointLeaderboardBuckets table
+-- Purpose: How many of a period's drivers have a score in each 50-point band
+-- (LEADERBOARD_BUCKET_POINTS in shared/point_ledger.py), so services/leaderboard.py
+-- ranks a driver from the bucket counts above them plus their own bucket
+-- instead of counting every entry ahead of them
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PointLeaderboardBuckets (
+    sponsor_id    INT NOT NULL,
+    period_type   VARCHAR(5) NOT NULL,
+    period_start  DATE NOT NULL,
+    bucket        INT NOT NULL,          -- points_earned DIV 50
+    drivers       INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sponsor_id, period_type, period_start, bucket)
+);
+
+-- One-time backfill from PointLeaderboard
+INSERT INTO PointLeaderboardBuckets (sponsor_id, period_type, period_start, bucket, drivers)
+SELECT sponsor_id, period_type, period_start, points_earned DIV 50, COUNT(*)
+FROM PointLeaderboard
+GROUP BY sponsor_id, period_type, period_start, points_earned DIV 50;
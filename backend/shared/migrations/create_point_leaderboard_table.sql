@@ -0,0 +1,42 @@
+-- Migration: Create PointLeaderboard table
+-- Purpose: Points earned per (sponsor, period, driver) for week / month / all-time
+-- periods, maintained alongside every 'point_change' audit_log insert
+-- (shared/point_ledger.py) and indexed by score so services/leaderboard.py can
+-- read top-K, a driver's rank and their neighbors with index seeks
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PointLeaderboard (
+    sponsor_id    INT NOT NULL,
+    period_type   VARCHAR(5) NOT NULL,   -- 'week' (Monday start), 'month', 'all'
+    period_start  DATE NOT NULL,         -- 1970-01-01 for 'all'
+    driver_id     INT NOT NULL,
+    points_earned BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (sponsor_id, period_type, period_start, driver_id),
+    INDEX idx_leaderboard_rank (sponsor_id, period_type, period_start, points_earned, driver_id)
+);
+
+-- One-time backfill from existing history (credits only; order refunds are not earned)
+INSERT INTO PointLeaderboard (sponsor_id, period_type, period_start, driver_id, points_earned)
+SELECT sponsor_id, period_type, period_start, driver_id, SUM(points)
+FROM (
+    SELECT COALESCE(sponsor_id, 0) AS sponsor_id, 'week' AS period_type,
+           DATE(DATE_SUB(date, INTERVAL WEEKDAY(date) DAY)) AS period_start,
+           driver_id, points_changed AS points
+    FROM audit_log
+    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+      AND COALESCE(reason, '') NOT LIKE 'Cancelled order #%'
+    UNION ALL
+    SELECT COALESCE(sponsor_id, 0), 'month',
+           DATE(DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)),
+           driver_id, points_changed
+    FROM audit_log
+    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+      AND COALESCE(reason, '') NOT LIKE 'Cancelled order #%'
+    UNION ALL
+    SELECT COALESCE(sponsor_id, 0), 'all', '1970-01-01', driver_id, points_changed
+    FROM audit_log
+    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+      AND COALESCE(reason, '') NOT LIKE 'Cancelled order #%'
+) earned
+GROUP BY sponsor_id, period_type, period_start, driver_id;
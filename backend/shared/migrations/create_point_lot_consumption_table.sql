@@ -0,0 +1,13 @@
+-- Migration: Create PointLotConsumption table
+-- Purpose: Which PointLots each order was paid from (shared/point_ledger.py),
+-- so cancelling an order refills those lots with their original earned_at /
+-- expires_at instead of opening a fresh lot that restarts the expiration clock
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PointLotConsumption (
+    order_id BIGINT NOT NULL,
+    lot_id   BIGINT NOT NULL,
+    points   INT NOT NULL,
+    PRIMARY KEY (order_id, lot_id)
+);
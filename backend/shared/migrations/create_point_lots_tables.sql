@@ -0,0 +1,73 @@
+-- Migration: Create PointLots and PointExpirationWatermark tables
+-- Purpose: FIFO point lots for the expiration engine (services/point_expiration.py).
+-- Every credit opens a lot, debits consume open lots oldest-first, and the
+-- per-sponsor watermark lets each expiration run skip lots it already handled
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PointLots (
+    lot_id           BIGINT AUTO_INCREMENT PRIMARY KEY,
+    sponsor_id       INT NOT NULL,
+    driver_id        INT NOT NULL,
+    earned_at        DATETIME NOT NULL,
+    points_awarded   INT NOT NULL,
+    points_remaining INT NOT NULL,
+    is_open          TINYINT(1) NOT NULL DEFAULT 1,
+    expires_at       DATETIME DEFAULT NULL,
+    INDEX idx_lots_fifo (sponsor_id, driver_id, is_open, earned_at, lot_id),
+    INDEX idx_lots_expires (sponsor_id, expires_at, lot_id),
+    INDEX idx_lots_earned (sponsor_id, earned_at, lot_id)
+);
+
+-- Existing balances (MySQL 8.0+, after add_expires_at_to_audit_log.sql): lots
+-- are spent oldest-first, so each balance is the newest credits that add up to
+-- it. Those credits become lots with their own date and expires_at; the oldest
+-- of them keeps only its unspent part.
+INSERT INTO PointLots (sponsor_id, driver_id, earned_at, points_awarded, points_remaining, expires_at)
+SELECT sponsor_id, driver_id, date, kept, kept, expires_at
+FROM (
+    SELECT al.sponsor_id, al.driver_id, al.date, al.expires_at,
+           LEAST(al.points_changed,
+                 sd.total_points - (SUM(al.points_changed) OVER (
+                     PARTITION BY al.sponsor_id, al.driver_id
+                     ORDER BY al.date DESC, al.id DESC
+                 ) - al.points_changed)) AS kept
+    FROM audit_log al
+    JOIN SponsorDrivers sd
+      ON sd.sponsor_user_id = al.sponsor_id AND sd.driver_user_id = al.driver_id
+    JOIN (
+        SELECT MAX(sponsor_driver_id) AS sponsor_driver_id
+        FROM SponsorDrivers
+        GROUP BY sponsor_user_id, driver_user_id
+    ) latest ON latest.sponsor_driver_id = sd.sponsor_driver_id
+    WHERE al.category = 'point_change' AND al.points_changed > 0 AND sd.total_points > 0
+) credits
+WHERE kept > 0
+ORDER BY sponsor_id, driver_id, date;
+
+-- Balance the ledger does not explain: one lot dated at the pair's oldest credit
+INSERT INTO PointLots (sponsor_id, driver_id, earned_at, points_awarded, points_remaining)
+SELECT sd.sponsor_user_id, sd.driver_user_id, COALESCE(c.oldest, NOW()),
+       sd.total_points - COALESCE(c.credited, 0), sd.total_points - COALESCE(c.credited, 0)
+FROM SponsorDrivers sd
+JOIN (
+    SELECT MAX(sponsor_driver_id) AS sponsor_driver_id
+    FROM SponsorDrivers
+    GROUP BY sponsor_user_id, driver_user_id
+) latest ON latest.sponsor_driver_id = sd.sponsor_driver_id
+LEFT JOIN (
+    SELECT sponsor_id, driver_id, MIN(date) AS oldest, SUM(points_changed) AS credited
+    FROM audit_log
+    WHERE category = 'point_change' AND points_changed > 0
+    GROUP BY sponsor_id, driver_id
+) c ON c.sponsor_id = sd.sponsor_user_id AND c.driver_id = sd.driver_user_id
+WHERE sd.total_points > COALESCE(c.credited, 0);
+
+CREATE TABLE IF NOT EXISTS PointExpirationWatermark (
+    sponsor_id      INT PRIMARY KEY,
+    expires_through DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00',
+    expires_lot_id  BIGINT NOT NULL DEFAULT 0,
+    earned_through  DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00',
+    earned_lot_id   BIGINT NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
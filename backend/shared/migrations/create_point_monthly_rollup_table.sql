@@ -0,0 +1,34 @@
+-- Migration: Create PointMonthlyRollup table
+-- Purpose: Per-(driver, sponsor, month) point totals maintained alongside every
+-- 'point_change' audit_log insert (shared/point_ledger.py), so monthly point
+-- history is read from a few rollup rows instead of aggregating audit_log
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PointMonthlyRollup (
+    driver_id         INT NOT NULL,
+    sponsor_id        INT NOT NULL,
+    month_start       DATE NOT NULL,
+    points_earned     BIGINT NOT NULL DEFAULT 0,
+    points_deducted   BIGINT NOT NULL DEFAULT 0,
+    net_change        BIGINT NOT NULL DEFAULT 0,
+    transaction_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (driver_id, sponsor_id, month_start)
+);
+
+-- One-time backfill from existing history
+INSERT INTO PointMonthlyRollup
+    (driver_id, sponsor_id, month_start, points_earned, points_deducted, net_change, transaction_count)
+SELECT driver_id,
+       COALESCE(sponsor_id, 0),
+       DATE(DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)),
+       SUM(GREATEST(points_changed, 0)),
+       SUM(GREATEST(-points_changed, 0)),
+       SUM(points_changed),
+       COUNT(*)
+FROM audit_log
+WHERE category = 'point_change' AND driver_id IS NOT NULL
+GROUP BY 1, 2, 3;
+
+-- Month detail reads a date range for one driver
+CREATE INDEX idx_audit_driver_category_date ON audit_log (driver_id, category, date);
@@ -0,0 +1,14 @@
+-- Migration: Create PurchaseIdempotency table
+-- Purpose: Let purchase requests carry an Idempotency-Key so a client retry
+-- replays the original result instead of charging points twice
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS PurchaseIdempotency (
+    user_id         INT NOT NULL,                  -- the buyer (driver, or sponsor placing the order)
+    idempotency_key VARCHAR(128) NOT NULL,
+    response_json   TEXT NULL,                     -- stored purchase result, set in the same transaction
+    created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, idempotency_key),
+    INDEX idx_purchase_idempotency_created (created_at)
+);
@@ -0,0 +1,11 @@
+-- Migration: Create SponsorCatalogVersion table
+-- Purpose: Per-sponsor counter bumped by every SponsorCatalog change so the
+-- driver catalog cache can tell when its shared snapshot is out of date
+
+USE Team27_DB;
+
+CREATE TABLE IF NOT EXISTS SponsorCatalogVersion (
+    sponsor_user_id INT PRIMARY KEY,
+    version         BIGINT NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
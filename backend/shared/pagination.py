@@ -0,0 +1,52 @@
+"""
+pagination.py
+-------------
+Purpose:
+    Opaque cursors for keyset ("seek") pagination.
+
+Responsibilities:
+    - Encode the sort key of the last row on a page into a URL-safe token
+    - Decode it back, rejecting tokens that were tampered with or belong to
+      a different sort order
+
+Usage:
+    from shared.pagination import encode_cursor, decode_cursor
+    next_cursor = encode_cursor("points_asc", [row["points_cost"], row["item_id"]])
+    values = decode_cursor(token, "points_asc")   # raises InvalidCursorError
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+
+class InvalidCursorError(ValueError):
+    """Cursor could not be decoded or was issued for another sort order."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(kind: str, values: list) -> str:
+    payload = json.dumps({"k": kind, "v": [_encode_value(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, kind: str, size: int | None = None) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values = payload["v"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if payload.get("k") != kind or not isinstance(values, list) or (size is not None and len(values) != size):
+        raise InvalidCursorError("Cursor does not match the requested sort")
+    return values
@@ -0,0 +1,730 @@
+"""
+point_ledger.py
+---------------
+Purpose:
+    Single write path for driver point changes.
+
+Responsibilities:
+    - Insert the 'point_change' audit_log row(s), each stamped with
+      balance_after: the driver's SponsorDrivers.total_points with that
+      sponsor once the change is applied
+    - Keep PointMonthlyRollup (earned / deducted / net / count per driver,
+      sponsor and calendar month) current in the same transaction, so the
+      monthly history never has to re-aggregate audit_log
+    - Keep PointLots current: every credit opens a lot, every debit consumes
+      the driver's open lots oldest-first (FIFO); services/point_expiration.py
+      expires whatever is left in a lot. Orders remember the lots they were
+      paid from (PointLotConsumption) and a cancellation refills those lots
+    - Keep PointLeaderboard current: points earned per driver, sponsor and
+      week / month / all-time period, indexed by score for
+      services/leaderboard.py, plus PointLeaderboardBuckets: how many of a
+      period's drivers have a score in each LEADERBOARD_BUCKET_POINTS band
+
+Usage (always after the SponsorDrivers update, in the same transaction):
+    from shared.point_ledger import record_point_change
+    cursor.execute("UPDATE SponsorDrivers SET total_points = total_points + %s ...")
+    record_point_change(cursor, sponsor_id, driver_id, 25, "Safe week", changed_by_user_id)
+    conn.commit()
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from shared.db import get_connection
+
+# Rows per multi-row INSERT; keeps statements well under max_allowed_packet
+LEDGER_INSERT_CHUNK = 500
+
+LEADERBOARD_PERIODS = ("week", "month", "all")
+# period_start of the single all-time period
+ALL_TIME_START = date(1970, 1, 1)
+# Score width of a PointLeaderboardBuckets bucket; a rank lookup scans at most one bucket's drivers
+LEADERBOARD_BUCKET_POINTS = 50
+# Reason prefix of order refunds (app.py cancel_driver_order); not points earned
+ORDER_REFUND_REASON_PREFIX = "Cancelled order #"
+
+
+def ensure_point_ledger_schema() -> None:
+    """
+    Create, when missing:
+        - PointMonthlyRollup and PointLeaderboard, backfilled from audit_log
+        - PointLeaderboardBuckets, counted from PointLeaderboard
+        - PointLots, seeded from the credits behind each current balance
+        - PointLotConsumption
+        - audit_log.balance_after and the audit_log indexes the history and
+          as-of queries use
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PointMonthlyRollup'
+            """
+        )
+        exists = cursor.fetchone() is not None
+        if not exists:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS PointMonthlyRollup (
+                    driver_id INT NOT NULL,
+                    sponsor_id INT NOT NULL,
+                    month_start DATE NOT NULL,
+                    points_earned BIGINT NOT NULL DEFAULT 0,
+                    points_deducted BIGINT NOT NULL DEFAULT 0,
+                    net_change BIGINT NOT NULL DEFAULT 0,
+                    transaction_count INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (driver_id, sponsor_id, month_start)
+                )
+                """
+            )
+            cursor.execute(
+                """
+                INSERT INTO PointMonthlyRollup
+                    (driver_id, sponsor_id, month_start, points_earned, points_deducted, net_change, transaction_count)
+                SELECT driver_id,
+                       COALESCE(sponsor_id, 0),
+                       DATE(DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)),
+                       SUM(GREATEST(points_changed, 0)),
+                       SUM(GREATEST(-points_changed, 0)),
+                       SUM(points_changed),
+                       COUNT(*)
+                FROM audit_log
+                WHERE category = 'point_change' AND driver_id IS NOT NULL
+                GROUP BY 1, 2, 3
+                """
+            )
+            conn.commit()
+
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PointLeaderboard'
+            """
+        )
+        if cursor.fetchone() is None:
+            refunds = ORDER_REFUND_REASON_PREFIX + "%"
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS PointLeaderboard (
+                    sponsor_id INT NOT NULL,
+                    period_type VARCHAR(5) NOT NULL,
+                    period_start DATE NOT NULL,
+                    driver_id INT NOT NULL,
+                    points_earned BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (sponsor_id, period_type, period_start, driver_id),
+                    INDEX idx_leaderboard_rank (sponsor_id, period_type, period_start, points_earned, driver_id)
+                )
+                """
+            )
+            cursor.execute(
+                """
+                INSERT INTO PointLeaderboard (sponsor_id, period_type, period_start, driver_id, points_earned)
+                SELECT sponsor_id, period_type, period_start, driver_id, SUM(points)
+                FROM (
+                    SELECT COALESCE(sponsor_id, 0) AS sponsor_id, 'week' AS period_type,
+                           DATE(DATE_SUB(date, INTERVAL WEEKDAY(date) DAY)) AS period_start,
+                           driver_id, points_changed AS points
+                    FROM audit_log
+                    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+                      AND COALESCE(reason, '') NOT LIKE %s
+                    UNION ALL
+                    SELECT COALESCE(sponsor_id, 0), 'month',
+                           DATE(DATE_SUB(date, INTERVAL DAYOFMONTH(date) - 1 DAY)),
+                           driver_id, points_changed
+                    FROM audit_log
+                    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+                      AND COALESCE(reason, '') NOT LIKE %s
+                    UNION ALL
+                    SELECT COALESCE(sponsor_id, 0), 'all', %s, driver_id, points_changed
+                    FROM audit_log
+                    WHERE category = 'point_change' AND driver_id IS NOT NULL AND points_changed > 0
+                      AND COALESCE(reason, '') NOT LIKE %s
+                ) earned
+                GROUP BY sponsor_id, period_type, period_start, driver_id
+                """,
+                (refunds, refunds, ALL_TIME_START, refunds),
+            )
+            conn.commit()
+
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PointLeaderboardBuckets'
+            """
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS PointLeaderboardBuckets (
+                    sponsor_id INT NOT NULL,
+                    period_type VARCHAR(5) NOT NULL,
+                    period_start DATE NOT NULL,
+                    bucket INT NOT NULL,
+                    drivers INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (sponsor_id, period_type, period_start, bucket)
+                )
+                """
+            )
+            cursor.execute(
+                """
+                INSERT INTO PointLeaderboardBuckets (sponsor_id, period_type, period_start, bucket, drivers)
+                SELECT sponsor_id, period_type, period_start, points_earned DIV %s, COUNT(*)
+                FROM PointLeaderboard
+                GROUP BY sponsor_id, period_type, period_start, points_earned DIV %s
+                """,
+                (LEADERBOARD_BUCKET_POINTS, LEADERBOARD_BUCKET_POINTS),
+            )
+            conn.commit()
+
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'PointLots'
+            """
+        )
+        if cursor.fetchone() is None:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS PointLots (
+                    lot_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    sponsor_id INT NOT NULL,
+                    driver_id INT NOT NULL,
+                    earned_at DATETIME NOT NULL,
+                    points_awarded INT NOT NULL,
+                    points_remaining INT NOT NULL,
+                    is_open TINYINT(1) NOT NULL DEFAULT 1,
+                    expires_at DATETIME DEFAULT NULL,
+                    INDEX idx_lots_fifo (sponsor_id, driver_id, is_open, earned_at, lot_id),
+                    INDEX idx_lots_expires (sponsor_id, expires_at, lot_id),
+                    INDEX idx_lots_earned (sponsor_id, earned_at, lot_id)
+                )
+                """
+            )
+            _seed_lots_from_ledger(cursor)
+            conn.commit()
+
+        # Which lots each order's points came from, so a cancellation can put them back
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS PointLotConsumption (
+                order_id BIGINT NOT NULL,
+                lot_id BIGINT NOT NULL,
+                points INT NOT NULL,
+                PRIMARY KEY (order_id, lot_id)
+            )
+            """
+        )
+
+        cursor.execute(
+            """
+            SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log' AND COLUMN_NAME = 'balance_after'
+            """
+        )
+        if cursor.fetchone() is None:
+            # Older entries stay NULL; services/point_balances.py works around them
+            cursor.execute("ALTER TABLE audit_log ADD COLUMN balance_after INT DEFAULT NULL")
+
+        for index_name, columns in (
+            ("idx_audit_driver_category_date", "driver_id, category, date"),
+            ("idx_audit_pair_category_date", "driver_id, sponsor_id, category, date"),
+        ):
+            cursor.execute(
+                """
+                SELECT 1 FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE()
+                  AND TABLE_NAME = 'audit_log'
+                  AND INDEX_NAME = %s
+                LIMIT 1
+                """,
+                (index_name,),
+            )
+            if not cursor.fetchone():
+                cursor.execute(f"CREATE INDEX {index_name} ON audit_log ({columns})")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def week_start(value: date) -> date:
+    """Monday of value's week."""
+    day = value.date() if isinstance(value, datetime) else value
+    return day - timedelta(days=day.weekday())
+
+
+def period_start(period: str, value: date) -> date:
+    """First day of the leaderboard period ('week', 'month' or 'all') containing value."""
+    if period == "week":
+        return week_start(value)
+    if period == "month":
+        return month_start(value)
+    if period == "all":
+        return ALL_TIME_START
+    raise ValueError(f"period must be one of {', '.join(LEADERBOARD_PERIODS)}")
+
+
+def leaderboard_bucket(points: int) -> int:
+    """PointLeaderboardBuckets.bucket of a score."""
+    return int(points) // LEADERBOARD_BUCKET_POINTS
+
+
+def _attach_balances(cursor, rows: list[dict]) -> None:
+    """
+    Set balance_after on each row from the (already updated, row-locked)
+    SponsorDrivers totals: the last row for a pair gets the current total and
+    earlier rows in the same batch step back through their changes.
+    """
+    pairs = sorted({(int(r["sponsor_id"] or 0), int(r["driver_id"])) for r in rows})
+    balances = {}
+    for start in range(0, len(pairs), LEDGER_INSERT_CHUNK):
+        chunk = pairs[start:start + LEDGER_INSERT_CHUNK]
+        cursor.execute(
+            f"""
+            SELECT sponsor_user_id, driver_user_id, total_points
+            FROM SponsorDrivers
+            WHERE (sponsor_user_id, driver_user_id) IN ({", ".join(["(%s, %s)"] * len(chunk))})
+            ORDER BY sponsor_driver_id
+            """,
+            tuple(value for pair in chunk for value in pair),
+        )
+        # Latest relationship row wins, as everywhere else
+        for r in cursor.fetchall():
+            balances[(r["sponsor_user_id"], r["driver_user_id"])] = int(r["total_points"])
+    for r in reversed(rows):
+        key = (int(r["sponsor_id"] or 0), int(r["driver_id"]))
+        balance = balances.get(key)
+        r["balance_after"] = balance
+        if balance is not None:
+            balances[key] = balance - int(r["points_changed"])
+
+
+def _insert_audit_rows(cursor, rows: list[dict]) -> None:
+    with_expiry = any(r.get("expires_at") for r in rows)
+    columns = "category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id, balance_after"
+    placeholder = "('point_change', %s, %s, %s, %s, %s, %s, %s"
+    if with_expiry:
+        columns += ", expires_at"
+        placeholder += ", %s"
+    placeholder += ")"
+
+    def values(include_expiry: bool) -> tuple:
+        flat = []
+        for r in rows:
+            flat.extend((r["date"], r["sponsor_id"], r["driver_id"], r["points_changed"],
+                         r["reason"], r["changed_by_user_id"], r["balance_after"]))
+            if include_expiry:
+                flat.append(r.get("expires_at"))
+        return tuple(flat)
+
+    try:
+        cursor.execute(
+            f"INSERT INTO audit_log ({columns}) VALUES {', '.join([placeholder] * len(rows))}",
+            values(with_expiry),
+        )
+    except Exception as e:
+        # Databases that predate add_expires_at_to_audit_log.sql
+        if not with_expiry or "unknown column" not in str(e).lower():
+            raise
+        placeholder = "('point_change', %s, %s, %s, %s, %s, %s, %s)"
+        cursor.execute(
+            "INSERT INTO audit_log (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id, balance_after) "
+            f"VALUES {', '.join([placeholder] * len(rows))}",
+            values(False),
+        )
+
+
+def _seed_lots_from_ledger(cursor) -> None:
+    """
+    Open lots for balances that predate lot tracking. Lots are spent
+    oldest-first, so a balance of B is taken to be the newest credits that
+    add up to B: those credits become lots with their own date and
+    expires_at, the oldest of them holding only the part still unspent.
+    Balance the ledger does not explain becomes one lot dated at the pair's
+    oldest credit (now when there is none).
+    """
+    cursor.execute(
+        """
+        SELECT sd.sponsor_user_id, sd.driver_user_id, sd.total_points
+        FROM SponsorDrivers sd
+        JOIN (
+            SELECT MAX(sponsor_driver_id) AS sponsor_driver_id
+            FROM SponsorDrivers
+            GROUP BY sponsor_user_id, driver_user_id
+        ) latest ON latest.sponsor_driver_id = sd.sponsor_driver_id
+        WHERE sd.total_points > 0
+        """
+    )
+    balances = {(sponsor_id, driver_id): int(total) for sponsor_id, driver_id, total in cursor.fetchall()}
+    if not balances:
+        return
+
+    cursor.execute(
+        """
+        SELECT 1 FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'audit_log' AND COLUMN_NAME = 'expires_at'
+        """
+    )
+    expires_column = "expires_at" if cursor.fetchone() is not None else "NULL"
+
+    now = datetime.now()
+    pairs_by_driver: dict[int, list[tuple]] = defaultdict(list)
+    for pair in sorted(balances):
+        pairs_by_driver[pair[1]].append(pair)
+    driver_ids = sorted(pairs_by_driver)
+    for start in range(0, len(driver_ids), LEDGER_INSERT_CHUNK):
+        chunk = driver_ids[start:start + LEDGER_INSERT_CHUNK]
+        cursor.execute(
+            f"""
+            SELECT sponsor_id, driver_id, date, points_changed, {expires_column}
+            FROM audit_log
+            WHERE driver_id IN ({", ".join(["%s"] * len(chunk))})
+              AND category = 'point_change' AND points_changed > 0
+            ORDER BY driver_id, sponsor_id, date DESC, id DESC
+            """,
+            chunk,
+        )
+        lots: dict[tuple, list[tuple]] = defaultdict(list)
+        remaining = {}
+        oldest = {}
+        for sponsor_id, driver_id, earned_at, points, expires_at in cursor.fetchall():
+            pair = (sponsor_id, driver_id)
+            if pair not in balances:
+                continue
+            oldest[pair] = earned_at
+            left = remaining.setdefault(pair, balances[pair])
+            if left > 0:
+                taken = min(int(points), left)
+                remaining[pair] = left - taken
+                lots[pair].append((earned_at, taken, expires_at))
+
+        rows = []
+        for driver_id in chunk:
+            for pair in pairs_by_driver[driver_id]:
+                unexplained = remaining.get(pair, balances[pair])
+                if unexplained > 0:
+                    lots[pair].append((oldest.get(pair, now), unexplained, None))
+                # Oldest first, so lot_id follows earned order
+                rows += [(*pair, earned_at, points, points, expires_at)
+                         for earned_at, points, expires_at in reversed(lots[pair])]
+        for offset in range(0, len(rows), LEDGER_INSERT_CHUNK):
+            batch = rows[offset:offset + LEDGER_INSERT_CHUNK]
+            cursor.execute(
+                "INSERT INTO PointLots (sponsor_id, driver_id, earned_at, points_awarded, points_remaining, expires_at) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))}",
+                [value for row in batch for value in row],
+            )
+
+
+def _apply_rollup(cursor, rows: list[dict]) -> None:
+    totals: dict[tuple, list[int]] = defaultdict(lambda: [0, 0, 0, 0])
+    for r in rows:
+        key = (int(r["driver_id"]), int(r["sponsor_id"] or 0), month_start(r["date"]))
+        points = int(r["points_changed"])
+        bucket = totals[key]
+        bucket[0] += max(points, 0)
+        bucket[1] += max(-points, 0)
+        bucket[2] += points
+        bucket[3] += 1
+
+    # Sorted keys give concurrent writers the same lock order on the rollup rows
+    keys = sorted(totals)
+    cursor.execute(
+        f"""
+        INSERT INTO PointMonthlyRollup
+            (driver_id, sponsor_id, month_start, points_earned, points_deducted, net_change, transaction_count)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(keys))}
+        ON DUPLICATE KEY UPDATE
+            points_earned = points_earned + VALUES(points_earned),
+            points_deducted = points_deducted + VALUES(points_deducted),
+            net_change = net_change + VALUES(net_change),
+            transaction_count = transaction_count + VALUES(transaction_count)
+        """,
+        tuple(value for key in keys for value in (*key, *totals[key])),
+    )
+
+
+def _apply_leaderboard(cursor, rows: list[dict]) -> None:
+    earned: dict[tuple, int] = defaultdict(int)
+    for r in rows:
+        points = int(r["points_changed"])
+        if points <= 0 or not r.get("earned", not r.get("restores_order_id")):
+            continue  # the leaderboard ranks points earned; spending does not lower it, refunds do not raise it
+        for period in LEADERBOARD_PERIODS:
+            earned[(int(r["sponsor_id"] or 0), period, period_start(period, r["date"]), int(r["driver_id"]))] += points
+    if not earned:
+        return
+    keys = sorted(earned)
+    cursor.execute(
+        f"""
+        INSERT INTO PointLeaderboard (sponsor_id, period_type, period_start, driver_id, points_earned)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(keys))}
+        ON DUPLICATE KEY UPDATE points_earned = points_earned + VALUES(points_earned)
+        """,
+        tuple(value for key in keys for value in (*key, earned[key])),
+    )
+
+    # Move each driver into the bucket of their new score (the rows are locked by the upsert above)
+    cursor.execute(
+        f"""
+        SELECT sponsor_id, period_type, period_start, driver_id, points_earned
+        FROM PointLeaderboard
+        WHERE (sponsor_id, period_type, period_start, driver_id) IN ({", ".join(["(%s, %s, %s, %s)"] * len(keys))})
+        FOR UPDATE
+        """,
+        tuple(value for key in keys for value in key),
+    )
+    moves: dict[tuple, int] = defaultdict(int)
+    for row in cursor.fetchall():
+        key = (row["sponsor_id"], row["period_type"], row["period_start"], row["driver_id"])
+        new_bucket = leaderboard_bucket(row["points_earned"])
+        old_points = int(row["points_earned"]) - earned[key]
+        if old_points > 0:
+            old_bucket = leaderboard_bucket(old_points)
+            if old_bucket == new_bucket:
+                continue
+            moves[(*key[:3], old_bucket)] -= 1
+        moves[(*key[:3], new_bucket)] += 1
+    if moves:
+        buckets = sorted(moves)
+        cursor.execute(
+            f"""
+            INSERT INTO PointLeaderboardBuckets (sponsor_id, period_type, period_start, bucket, drivers)
+            VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(buckets))}
+            ON DUPLICATE KEY UPDATE drivers = drivers + VALUES(drivers)
+            """,
+            tuple(value for bucket in buckets for value in (*bucket, moves[bucket])),
+        )
+
+
+def _open_lots(cursor, rows: list[dict]) -> None:
+    credits = [r for r in rows if int(r["points_changed"]) > 0]
+    if not credits:
+        return
+    cursor.execute(
+        f"""
+        INSERT INTO PointLots (sponsor_id, driver_id, earned_at, points_awarded, points_remaining, expires_at)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(credits))}
+        """,
+        tuple(value for r in credits for value in (
+            int(r["sponsor_id"] or 0), r["driver_id"], r.get("earned_at") or r["date"],
+            int(r["points_changed"]), int(r["points_changed"]), r.get("expires_at"),
+        )),
+    )
+
+
+def consume_lots(cursor, sponsor_id: int, driver_id: int, points: int) -> list[tuple[int, int]]:
+    """
+    Take points from the driver's open lots with this sponsor, oldest first.
+    A debit larger than the open lots (e.g. an allowed negative balance)
+    simply empties them. Returns [(lot_id, points_taken)] in FIFO order.
+    """
+    cursor.execute(
+        """
+        SELECT lot_id, points_remaining
+        FROM PointLots
+        WHERE sponsor_id = %s AND driver_id = %s AND is_open = 1
+        ORDER BY earned_at, lot_id
+        FOR UPDATE
+        """,
+        (sponsor_id, driver_id),
+    )
+    updates = []
+    taken = []
+    for lot in cursor.fetchall():
+        if points <= 0:
+            break
+        take = min(points, int(lot["points_remaining"]))
+        updates.append((lot["lot_id"], int(lot["points_remaining"]) - take))
+        taken.append((lot["lot_id"], take))
+        points -= take
+    if not updates:
+        return taken
+    selects = " UNION ALL ".join(["SELECT %s AS lot_id, %s AS points_remaining"] * len(updates))
+    cursor.execute(
+        f"""
+        UPDATE PointLots l
+        JOIN ({selects}) v ON v.lot_id = l.lot_id
+        SET l.points_remaining = v.points_remaining,
+            l.is_open = v.points_remaining > 0
+        """,
+        tuple(value for update in updates for value in update),
+    )
+    return taken
+
+
+def _split_consumption(taken: list[tuple[int, int]], debit_rows: list[dict]) -> None:
+    """Hand the FIFO-consumed lots out to the pair's debit rows in row order (row["consumed_lots"])."""
+    queue = list(taken)
+    for r in debit_rows:
+        need = -int(r["points_changed"])
+        consumed = []
+        while need > 0 and queue:
+            lot_id, available = queue[0]
+            take = min(need, available)
+            consumed.append((lot_id, take))
+            need -= take
+            if take == available:
+                queue.pop(0)
+            else:
+                queue[0] = (lot_id, available - take)
+        r["consumed_lots"] = consumed
+
+
+def record_order_lots(cursor, order_lots: dict[int, list[tuple[int, int]]]) -> None:
+    """Remember which lots each order was paid from (consumed_lots of its ledger row)."""
+    values = [(order_id, lot_id, points) for order_id, lots in sorted(order_lots.items()) for lot_id, points in lots]
+    if not values:
+        return
+    cursor.execute(
+        f"""
+        INSERT INTO PointLotConsumption (order_id, lot_id, points)
+        VALUES {", ".join(["(%s, %s, %s)"] * len(values))}
+        ON DUPLICATE KEY UPDATE points = points + VALUES(points)
+        """,
+        tuple(value for row in values for value in row),
+    )
+
+
+def _rewind_expiration_watermark(cursor, sponsor_id: int, lots: list[dict]) -> None:
+    """
+    Lots reopened (or opened with a past earned_at) may sit behind the
+    expiration watermark; move it back so the next run sees them.
+    """
+    for column, through_col, lot_col in (("expires_at", "expires_through", "expires_lot_id"),
+                                         ("earned_at", "earned_through", "earned_lot_id")):
+        marks = [(lot[column], int(lot["lot_id"]) - 1) for lot in lots if lot.get(column) is not None]
+        if not marks:
+            continue
+        mark = min(marks)
+        cursor.execute(
+            f"""
+            UPDATE PointExpirationWatermark
+            SET {through_col} = %s, {lot_col} = %s
+            WHERE sponsor_id = %s AND ({through_col}, {lot_col}) > (%s, %s)
+            """,
+            (mark[0], mark[1], sponsor_id, mark[0], mark[1]),
+        )
+
+
+def _restore_order_lots(cursor, r: dict) -> None:
+    """
+    Refund of a cancelled order: put the points back into the lots the order
+    consumed, keeping their earned_at / expires_at. Points with no recorded
+    lots (orders placed before consumption tracking) get one lot dated
+    r["earned_at"] (the order's time) instead.
+    """
+    sponsor_id, driver_id = int(r["sponsor_id"] or 0), int(r["driver_id"])
+    cursor.execute(
+        """
+        SELECT c.lot_id, c.points, l.earned_at, l.expires_at
+        FROM PointLotConsumption c
+        JOIN PointLots l ON l.lot_id = c.lot_id
+        WHERE c.order_id = %s
+        ORDER BY l.earned_at, l.lot_id
+        FOR UPDATE
+        """,
+        (r["restores_order_id"],),
+    )
+    consumed = cursor.fetchall()
+    remaining = int(r["points_changed"])
+    restored = []
+    for row in consumed:
+        if remaining <= 0:
+            break
+        points = min(remaining, int(row["points"]))
+        restored.append({**row, "points": points})
+        remaining -= points
+    if restored:
+        selects = " UNION ALL ".join(["SELECT %s AS lot_id, %s AS points"] * len(restored))
+        cursor.execute(
+            f"""
+            UPDATE PointLots l
+            JOIN ({selects}) v ON v.lot_id = l.lot_id
+            SET l.points_remaining = l.points_remaining + v.points,
+                l.is_open = 1
+            """,
+            tuple(value for row in restored for value in (row["lot_id"], row["points"])),
+        )
+    cursor.execute("DELETE FROM PointLotConsumption WHERE order_id = %s", (r["restores_order_id"],))
+    if remaining > 0:
+        _open_lots(cursor, [{**r, "points_changed": remaining, "expires_at": None}])
+        cursor.execute("SELECT LAST_INSERT_ID() AS lot_id")
+        restored.append({"lot_id": cursor.fetchone()["lot_id"], "earned_at": r.get("earned_at") or r["date"],
+                         "expires_at": None})
+    _rewind_expiration_watermark(cursor, sponsor_id, restored)
+
+
+def _apply_lots(cursor, rows: list[dict]) -> None:
+    tracked = [r for r in rows if not r.get("skip_lots")]
+    _open_lots(cursor, [r for r in tracked if not r.get("restores_order_id")])
+    for r in tracked:
+        if r.get("restores_order_id") and int(r["points_changed"]) > 0:
+            _restore_order_lots(cursor, r)
+    debits: dict[tuple, list[dict]] = defaultdict(list)
+    for r in tracked:
+        if int(r["points_changed"]) < 0:
+            debits[(int(r["sponsor_id"] or 0), int(r["driver_id"]))].append(r)
+    # Same sorted lock order as the rollup
+    for (sponsor_id, driver_id), debit_rows in sorted(debits.items()):
+        taken = consume_lots(cursor, sponsor_id, driver_id, sum(-int(r["points_changed"]) for r in debit_rows))
+        _split_consumption(taken, debit_rows)
+
+
+def record_point_changes(cursor, changes: list[dict]) -> None:
+    """
+    Record many point changes with one audit_log insert and one rollup upsert
+    per chunk. Each change is a dict with sponsor_id, driver_id,
+    points_changed, reason, changed_by_user_id and optional date / expires_at.
+    skip_lots=True leaves PointLots alone, for callers that already adjusted
+    the lots themselves (expiration). A credit with restores_order_id (an
+    order refund) refills the lots that order consumed instead of opening a
+    new one; earned_at dates any lot it has to open. earned=False keeps a
+    credit that gives back points (a refund or any other reversal) off the
+    leaderboard; restores_order_id implies it. Runs on the caller's
+    dictionary cursor; the caller commits.
+
+    Returns the recorded rows, in order; debits carry consumed_lots
+    [(lot_id, points)] for record_order_lots.
+    """
+    if not changes:
+        return []
+    now = datetime.now()
+    rows = [{**c, "date": c.get("date") or now} for c in changes]
+    _attach_balances(cursor, rows)
+    for start in range(0, len(rows), LEDGER_INSERT_CHUNK):
+        chunk = rows[start:start + LEDGER_INSERT_CHUNK]
+        _insert_audit_rows(cursor, chunk)
+        _apply_rollup(cursor, chunk)
+        _apply_leaderboard(cursor, chunk)
+        _apply_lots(cursor, chunk)
+    return rows
+
+
+def record_point_change(
+    cursor,
+    sponsor_id: int,
+    driver_id: int,
+    points_changed: int,
+    reason: str,
+    changed_by_user_id: int,
+    changed_at: datetime | None = None,
+    expires_at: datetime | None = None,
+    **extra,
+) -> dict:
+    """One change; extra keys as for record_point_changes. Returns the recorded row."""
+    return record_point_changes(cursor, [{
+        "sponsor_id": sponsor_id,
+        "driver_id": driver_id,
+        "points_changed": points_changed,
+        "reason": reason,
+        "changed_by_user_id": changed_by_user_id,
+        "date": changed_at,
+        "expires_at": expires_at,
+        **extra,
+    }])[0]
@@ -2,6 +2,12 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
 from shared.db import get_connection
 from users.email_service import send_order_success_email
+from services.catalog.catalog_sync import sync_sponsor_catalog, CATALOG_SYNC_INTERVAL_MINUTES
+from services.purchase_service import purge_expired_idempotency_keys
+from shared.point_ledger import record_point_changes
+from services.point_expiration import run_point_expiration
+from services.point_balances import reconcile_point_balances
+from services.admin_metrics import refresh_system_metrics, ADMIN_METRICS_REFRESH_SECONDS
 
 scheduler = BackgroundScheduler()
 
@@ -28,6 +34,7 @@ def award_daily_points():
         """)
         drivers = cursor.fetchall()
 
+        awards = []
         for d in drivers:
             earn_rate = float(d.get("earn_rate") or 1.0)
             daily_points = max(int(round(10 * earn_rate)), 0)
@@ -42,20 +49,15 @@ def award_daily_points():
                 """,
                 (daily_points, d["sponsor_driver_id"])
             )
-
-            cursor.execute("""
-                INSERT INTO audit_log
-                (category, date, sponsor_id, driver_id, points_changed, reason, changed_by_user_id)
-                VALUES ('point_change', %s, %s, %s, %s, %s, %s)
-            """, (
-                datetime.now(),
-                d["sponsor_user_id"],
-                d["driver_user_id"],
-                daily_points,
-                "Daily recurring points",
-                0  # system user
-            ))
-
+            awards.append({
+                "sponsor_id": d["sponsor_user_id"],
+                "driver_id": d["driver_user_id"],
+                "points_changed": daily_points,
+                "reason": "Daily recurring points",
+                "changed_by_user_id": 0,  # system user
+            })
+
+        record_point_changes(cursor, awards)
         conn.commit()
     finally:
         cursor.close()
@@ -181,3 +183,10 @@ def check_low_stock_saved_products():
 scheduler.add_job(award_daily_points, 'interval', days=1)
 scheduler.add_job(notify_successful_orders, 'interval', minutes=1)
 scheduler.add_job(check_low_stock_saved_products, 'interval', minutes=5)
+scheduler.add_job(sync_sponsor_catalog, 'interval', minutes=CATALOG_SYNC_INTERVAL_MINUTES, max_instances=1)
+scheduler.add_job(purge_expired_idempotency_keys, 'interval', hours=1)
+# Nightly; each run only touches lots that became expirable since the last one
+scheduler.add_job(run_point_expiration, 'cron', hour=3, max_instances=1)
+scheduler.add_job(reconcile_point_balances, 'interval', hours=1, max_instances=1)
+# Admin dashboard reads the snapshot this keeps warm
+scheduler.add_job(refresh_system_metrics, 'interval', seconds=ADMIN_METRICS_REFRESH_SECONDS, max_instances=1)
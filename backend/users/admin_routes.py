@@ -32,6 +32,8 @@ from users.email_service import (
     send_sponsor_account_banned_email,
 )
 from shared.services import get_user_by_id
+from services.ebay.browse import get_ebay_usage
+from services.admin_metrics import system_metrics_cache
 from users.users import create_user
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -78,79 +80,14 @@ def ensure_account_appeals_table(cursor) -> None:
     )
 
 @router.get("/metrics", response_model=SystemMetricsResponse)
-def get_system_metrics(current_user: dict = Depends(require_role("admin"))):
-    """Return a live snapshot of key system metrics for the admin dashboard."""
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # User counts by role
-        cursor.execute(
-            """
-            SELECT
-                COUNT(*) AS total_users,
-                SUM(CASE WHEN role = 'driver'  THEN 1 ELSE 0 END) AS total_drivers,
-                SUM(CASE WHEN role = 'sponsor' THEN 1 ELSE 0 END) AS total_sponsors,
-                SUM(CASE WHEN role = 'admin'   THEN 1 ELSE 0 END) AS total_admins
-            FROM Users
-            """
-        )
-        user_row = cursor.fetchone()
-
-        # All-time order totals
-        cursor.execute(
-            """
-            SELECT
-                COUNT(*) AS total_orders,
-                SUM(CASE WHEN status = 'pending'   THEN 1 ELSE 0 END) AS pending_orders,
-                SUM(CASE WHEN status = 'shipped'   THEN 1 ELSE 0 END) AS shipped_orders,
-                SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) AS cancelled_orders
-            FROM Orders
-            """
-        )
-        order_row = cursor.fetchone()
-
-        # All-time points awarded (positive entries in audit_log)
-        cursor.execute(
-            "SELECT COALESCE(SUM(points_changed), 0) AS pts FROM audit_log WHERE points_changed > 0"
-        )
-        pts_awarded = int((cursor.fetchone() or {}).get("pts", 0))
-
-        # All-time points redeemed via non-cancelled orders
-        cursor.execute(
-            "SELECT COALESCE(SUM(points_cost), 0) AS pts FROM Orders WHERE status != 'cancelled'"
-        )
-        pts_redeemed = int((cursor.fetchone() or {}).get("pts", 0))
-
-        # Login activity in the last 24 hours
-        cursor.execute(
-            """
-            SELECT
-                COUNT(*) AS total_logins,
-                SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) AS failed_logins
-            FROM LoginAudit
-            WHERE login_time >= NOW() - INTERVAL 24 HOUR
-            """
-        )
-        login_row = cursor.fetchone()
-
-        return {
-            "fetched_at": datetime.utcnow().isoformat(),
-            "total_users":   int(user_row.get("total_users")   or 0),
-            "total_drivers": int(user_row.get("total_drivers") or 0),
-            "total_sponsors":int(user_row.get("total_sponsors")or 0),
-            "total_admins":  int(user_row.get("total_admins")  or 0),
-            "total_orders":    int(order_row.get("total_orders")    or 0),
-            "pending_orders":  int(order_row.get("pending_orders")  or 0),
-            "shipped_orders":  int(order_row.get("shipped_orders")  or 0),
-            "cancelled_orders":int(order_row.get("cancelled_orders")or 0),
-            "total_points_awarded":  pts_awarded,
-            "total_points_redeemed": pts_redeemed,
-            "logins_last_24h":        int(login_row.get("total_logins")  or 0),
-            "failed_logins_last_24h": int(login_row.get("failed_logins") or 0),
-        }
-    finally:
-        cursor.close()
-        conn.close()
+def get_system_metrics(refresh: bool = False, current_user: dict = Depends(require_role("admin"))):
+    """Return the cached snapshot of key system metrics for the admin dashboard; refresh=true collects a new one."""
+    snapshot, age = system_metrics_cache.get(force_refresh=refresh)
+    return {
+        **snapshot,
+        "snapshot_age_seconds": round(age, 1),
+        "ebay_api_usage": get_ebay_usage(),
+    }
 
 # Allows admin to see big picture
 @router.get("/users")
@@ -0,0 +1,66 @@
+# users/email_queue.py
+"""
+Background delivery for notification emails.
+
+Bulk point endpoints used to call SendGrid inline, once per driver, inside
+the request. They now enqueue the send and return; one daemon thread works
+through the queue in order. Emails still queued at shutdown get up to
+EMAIL_QUEUE_DRAIN_SECONDS to go out before the process exits.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+EMAIL_QUEUE_DRAIN_SECONDS = float(os.getenv("EMAIL_QUEUE_DRAIN_SECONDS", "10"))
+
+
+class EmailQueue:
+    def __init__(self, drain_seconds: float):
+        self.drain_seconds = drain_seconds
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.sent = 0
+        self.failed = 0
+
+    def enqueue(self, send, **kwargs) -> None:
+        """Queue send(**kwargs), e.g. enqueue(send_points_notification, to_email=..., ...)."""
+        self._queue.put((send, kwargs))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="email-queue", daemon=True)
+                self._thread.start()
+
+    def _deliver(self, send, kwargs) -> None:
+        try:
+            if send(**kwargs) is False:
+                self.failed += 1
+            else:
+                self.sent += 1
+        except Exception as e:
+            self.failed += 1
+            print(f"[EMAIL QUEUE ERROR] {getattr(send, '__name__', send)}: {e}")  # never let one email stop the queue
+
+    def _run(self) -> None:
+        while True:
+            send, kwargs = self._queue.get()
+            try:
+                self._deliver(send, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def shutdown(self) -> None:
+        """Give queued emails a bounded chance to go out."""
+        deadline = time.monotonic() + self.drain_seconds
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+email_queue = EmailQueue(EMAIL_QUEUE_DRAIN_SECONDS)
+atexit.register(email_queue.shutdown)
@@ -43,11 +43,17 @@ export function CheckoutPage() {
     setError(null);
 
     try {
-      // Place each item as a purchase
+      // One checkout (one transaction, one confirmation email) per sponsor in the cart
+      const bySponsor = new Map<number, { item_id: string; quantity: number }[]>();
       for (const item of items) {
-        await api.post('/api/driver/catalog/purchase', {
-          item_id: item.item_id,
-          sponsor_user_id: item.sponsor_user_id,
+        const lines = bySponsor.get(item.sponsor_user_id) ?? [];
+        lines.push({ item_id: item.item_id, quantity: item.quantity });
+        bySponsor.set(item.sponsor_user_id, lines);
+      }
+      for (const [sponsorUserId, lines] of bySponsor) {
+        await api.post('/api/driver/catalog/checkout', {
+          sponsor_user_id: sponsorUserId,
+          items: lines,
         });
       }
       await refreshSponsors();